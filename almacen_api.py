@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# almacen_api.py
+"""Almacén de trabajos (consultas y lotes) en memoria o en SQLite"""
+
+import json
+import time
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import ALMACEN_BACKEND, ALMACEN_DB, ALMACEN_TTL_SEGUNDOS
+
+
+CONSULTA = "consulta"
+LOTE = "lote"
+ESTADOS_FINALES = ("completado", "error")
+
+# Cada cuánto (segundos) se desalojan los trabajos terminados vencidos
+INTERVALO_PURGA = 60
+
+
+class _Suscripcion:
+    """Versión de un trabajo seguido por uno o más streams de eventos"""
+
+    def __init__(self, lock):
+        self.condicion = threading.Condition(lock)
+        self.version = 0
+        self.suscriptores = 0
+
+    def esperar_cambio(self, version, timeout):
+        """
+        Espera a que la versión supere la indicada o a que pase el timeout
+
+        Returns:
+            int: Versión actual
+        """
+        with self.condicion:
+            self.condicion.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+
+class _AvisosCambios:
+    """
+    Aviso entre hilos de que un trabajo cambió (para los streams de eventos)
+
+    Cada stream se suscribe a su trabajo; una escritura solo incrementa la
+    versión y despierta a los suscritos a ese trabajo, no a todos los streams
+    abiertos. Los cambios hechos por otros procesos no avisan: quien espera
+    debe volver a leer cuando se agota el timeout.
+    """
+
+    def __init__(self):
+        self._avisos_lock = threading.Lock()
+        self._suscripciones = {}  # (tipo, trabajo_id) -> _Suscripcion
+
+    def _avisar(self, tipo, trabajo_id):
+        with self._avisos_lock:
+            suscripcion = self._suscripciones.get((tipo, trabajo_id))
+            if suscripcion is not None:
+                suscripcion.version += 1
+                suscripcion.condicion.notify_all()
+
+    @contextmanager
+    def suscribir(self, tipo, trabajo_id):
+        """
+        Sigue los cambios de un trabajo mientras dura el bloque
+
+        Yields:
+            _Suscripcion: Con version y esperar_cambio(version, timeout)
+        """
+        clave = (tipo, trabajo_id)
+        with self._avisos_lock:
+            suscripcion = self._suscripciones.get(clave)
+            if suscripcion is None:
+                suscripcion = self._suscripciones[clave] = _Suscripcion(self._avisos_lock)
+            suscripcion.suscriptores += 1
+        try:
+            yield suscripcion
+        finally:
+            with self._avisos_lock:
+                suscripcion.suscriptores -= 1
+                if not suscripcion.suscriptores:
+                    del self._suscripciones[clave]
+
+
+class _ResultadosLote:
+    """
+    Resultados de un lote indexados por fila y por secuencia
+
+    Las filas se mantienen ordenadas y cada escritura se anota en un registro
+    de secuencias crecientes, así pedir lo nuevo desde una secuencia es una
+    búsqueda binaria más los resultados posteriores, sin recorrer el lote.
+    """
+
+    def __init__(self):
+        self.secuencia = 0
+        self.por_fila = {}        # fila -> (secuencia, resultado)
+        self.filas = []           # filas ordenadas
+        self._secuencias = []     # secuencia de cada escritura (creciente)
+        self._filas_escritas = [] # fila de cada escritura
+
+    def agregar(self, fila, resultado):
+        self.secuencia += 1
+        if fila not in self.por_fila:
+            bisect.insort(self.filas, fila)
+        self.por_fila[fila] = (self.secuencia, resultado)
+        self._secuencias.append(self.secuencia)
+        self._filas_escritas.append(fila)
+        # Las filas reemplazadas dejan escrituras obsoletas en el registro
+        if len(self._secuencias) > 2 * len(self.por_fila) + 1024:
+            vigentes = sorted((secuencia, fila) for fila, (secuencia, _) in self.por_fila.items())
+            self._secuencias = [secuencia for secuencia, _ in vigentes]
+            self._filas_escritas = [fila for _, fila in vigentes]
+
+    def desde(self, desde):
+        """[(fila, secuencia, resultado)] en orden de fila con secuencia > desde"""
+        if desde <= 0:
+            filas = self.filas
+        else:
+            inicio = bisect.bisect_right(self._secuencias, desde)
+            filas = sorted({
+                fila for secuencia, fila in zip(self._secuencias[inicio:], self._filas_escritas[inicio:])
+                if self.por_fila[fila][0] == secuencia
+            })
+        return [(fila,) + self.por_fila[fila] for fila in filas]
+
+
+class AlmacenMemoria(_AvisosCambios):
+    """
+    Estado de trabajos en diccionarios del proceso, protegido por un lock
+
+    Sirve para un solo proceso; el estado se pierde al reiniciar.
+    """
+
+    def __init__(self, ttl=ALMACEN_TTL_SEGUNDOS):
+        super().__init__()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._trabajos = {}
+        self._resultados = {}
+        self._ultima_purga = time.time()
+        self._stats = {"escrituras": 0, "desalojados": 0}
+
+    def guardar(self, tipo, trabajo_id, estado):
+        """Reemplaza el estado completo de un trabajo"""
+        with self._lock:
+            self._trabajos[(tipo, trabajo_id)] = (time.time(), dict(estado))
+            self._stats["escrituras"] += 1
+        self._avisar(tipo, trabajo_id)
+        self._quizas_purgar()
+
+    def actualizar(self, tipo, trabajo_id, **campos):
+        """
+        Mezcla campos en el estado de un trabajo de forma atómica
+
+        Returns:
+            dict or None: Estado resultante o None si el trabajo no existe
+        """
+        with self._lock:
+            entrada = self._trabajos.get((tipo, trabajo_id))
+            if entrada is None:
+                return None
+            estado = dict(entrada[1], **campos)
+            self._trabajos[(tipo, trabajo_id)] = (time.time(), estado)
+            self._stats["escrituras"] += 1
+        self._avisar(tipo, trabajo_id)
+        return dict(estado)
+
+    def obtener(self, tipo, trabajo_id):
+        """Copia del estado de un trabajo o None"""
+        with self._lock:
+            entrada = self._trabajos.get((tipo, trabajo_id))
+            return dict(entrada[1]) if entrada else None
+
+    def eliminar(self, tipo, trabajo_id):
+        with self._lock:
+            self._trabajos.pop((tipo, trabajo_id), None)
+            if tipo == LOTE:
+                self._resultados.pop(trabajo_id, None)
+        self._avisar(tipo, trabajo_id)
+
+    def contar_activos(self, tipo):
+        """Trabajos de un tipo que aún no terminan"""
+        with self._lock:
+            return sum(
+                1 for (tipo_trabajo, _), (_, estado) in self._trabajos.items()
+                if tipo_trabajo == tipo and estado.get("estado") not in ESTADOS_FINALES
+            )
+
+    def agregar_resultados(self, lote_id, filas):
+        """
+        Guarda (o reemplaza) resultados de filas de un lote
+
+        Args:
+            lote_id: ID del lote
+            filas: Iterable de (fila, resultado)
+
+        Returns:
+            int: Última secuencia asignada (creciente dentro del lote)
+        """
+        with self._lock:
+            guardados = self._resultados.get(lote_id)
+            if guardados is None:
+                guardados = self._resultados[lote_id] = _ResultadosLote()
+            for fila, resultado in filas:
+                guardados.agregar(fila, dict(resultado))
+            secuencia = guardados.secuencia
+        self._avisar(LOTE, lote_id)
+        return secuencia
+
+    def resultados(self, lote_id, desde=0):
+        """
+        Resultados de un lote en el orden del archivo
+
+        Args:
+            lote_id: ID del lote
+            desde: Solo los registrados con secuencia mayor a este valor
+
+        Returns:
+            list: Resultados (cada uno con "fila" y "secuencia")
+        """
+        with self._lock:
+            guardados = self._resultados.get(lote_id)
+            if guardados is None:
+                return []
+            return [
+                dict(resultado, fila=fila, secuencia=secuencia)
+                for fila, secuencia, resultado in guardados.desde(desde)
+            ]
+
+    def purgar(self):
+        """Desaloja los trabajos terminados hace más de ttl segundos"""
+        limite = time.time() - self.ttl
+        with self._lock:
+            vencidos = [
+                clave for clave, (actualizado, estado) in self._trabajos.items()
+                if actualizado < limite and estado.get("estado") in ESTADOS_FINALES
+            ]
+            for tipo, trabajo_id in vencidos:
+                del self._trabajos[(tipo, trabajo_id)]
+                if tipo == LOTE:
+                    self._resultados.pop(trabajo_id, None)
+            self._stats["desalojados"] += len(vencidos)
+            self._ultima_purga = time.time()
+            return len(vencidos)
+
+    def _quizas_purgar(self):
+        if time.time() - self._ultima_purga >= INTERVALO_PURGA:
+            self.purgar()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["trabajos"] = len(self._trabajos)
+        stats["backend"] = "memoria"
+        stats["ttl_segundos"] = self.ttl
+        return stats
+
+
+class AlmacenSQLite(_AvisosCambios):
+    """
+    Estado de trabajos en una base SQLite en modo WAL
+
+    Varios procesos del servidor pueden compartir el mismo archivo: las
+    actualizaciones se hacen dentro de una transacción IMMEDIATE y el
+    estado sobrevive a reinicios (permite reanudar lotes).
+    """
+
+    def __init__(self, ruta=ALMACEN_DB, ttl=ALMACEN_TTL_SEGUNDOS):
+        super().__init__()
+        self.ruta = ruta
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ultima_purga = time.time()
+        self._stats = {"escrituras": 0, "desalojados": 0}
+
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, timeout=30,
+                                         isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS trabajos (
+                tipo TEXT NOT NULL,
+                trabajo_id TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                actualizado REAL NOT NULL,
+                datos TEXT NOT NULL,
+                PRIMARY KEY (tipo, trabajo_id)
+            );
+            CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (tipo, estado, actualizado);
+            CREATE TABLE IF NOT EXISTS resultados_lote (
+                lote_id TEXT NOT NULL,
+                fila INTEGER NOT NULL,
+                secuencia INTEGER NOT NULL,
+                datos TEXT NOT NULL,
+                PRIMARY KEY (lote_id, fila)
+            );
+            CREATE INDEX IF NOT EXISTS resultados_lote_secuencia ON resultados_lote (lote_id, secuencia);
+            """
+        )
+
+    def _transaccion(self, funcion, tipo=None, trabajo_id=None):
+        """
+        Ejecuta funcion(cursor) dentro de BEGIN IMMEDIATE ... COMMIT y avisa
+        a los suscritos al trabajo (tipo, trabajo_id) si se indica
+        """
+        with self._lock:
+            cursor = self._conexion.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                valor = funcion(cursor)
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+        if tipo is not None:
+            self._avisar(tipo, trabajo_id)
+        return valor
+
+    def guardar(self, tipo, trabajo_id, estado):
+        """Reemplaza el estado completo de un trabajo"""
+        datos = json.dumps(estado, ensure_ascii=False)
+
+        def _guardar(cursor):
+            cursor.execute(
+                "INSERT OR REPLACE INTO trabajos (tipo, trabajo_id, estado, actualizado, datos) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (tipo, trabajo_id, estado.get("estado", ""), time.time(), datos),
+            )
+            self._stats["escrituras"] += 1
+
+        self._transaccion(_guardar, tipo, trabajo_id)
+        self._quizas_purgar()
+
+    def actualizar(self, tipo, trabajo_id, **campos):
+        """
+        Mezcla campos en el estado de un trabajo de forma atómica
+
+        Returns:
+            dict or None: Estado resultante o None si el trabajo no existe
+        """
+        def _actualizar(cursor):
+            fila = cursor.execute(
+                "SELECT datos FROM trabajos WHERE tipo = ? AND trabajo_id = ?", (tipo, trabajo_id)
+            ).fetchone()
+            if fila is None:
+                return None
+            estado = dict(json.loads(fila[0]), **campos)
+            cursor.execute(
+                "UPDATE trabajos SET estado = ?, actualizado = ?, datos = ? "
+                "WHERE tipo = ? AND trabajo_id = ?",
+                (estado.get("estado", ""), time.time(), json.dumps(estado, ensure_ascii=False),
+                 tipo, trabajo_id),
+            )
+            self._stats["escrituras"] += 1
+            return estado
+
+        return self._transaccion(_actualizar, tipo, trabajo_id)
+
+    def obtener(self, tipo, trabajo_id):
+        """Copia del estado de un trabajo o None"""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT datos FROM trabajos WHERE tipo = ? AND trabajo_id = ?", (tipo, trabajo_id)
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def eliminar(self, tipo, trabajo_id):
+        def _eliminar(cursor):
+            cursor.execute("DELETE FROM trabajos WHERE tipo = ? AND trabajo_id = ?", (tipo, trabajo_id))
+            if tipo == LOTE:
+                cursor.execute("DELETE FROM resultados_lote WHERE lote_id = ?", (trabajo_id,))
+
+        self._transaccion(_eliminar, tipo, trabajo_id)
+
+    def contar_activos(self, tipo):
+        """Trabajos de un tipo que aún no terminan"""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE tipo = ? AND estado NOT IN (?, ?)",
+                (tipo,) + ESTADOS_FINALES,
+            ).fetchone()
+        return fila[0]
+
+    def agregar_resultados(self, lote_id, filas):
+        """
+        Guarda (o reemplaza) resultados de filas de un lote en una transacción
+
+        Args:
+            lote_id: ID del lote
+            filas: Iterable de (fila, resultado)
+
+        Returns:
+            int: Última secuencia asignada (creciente dentro del lote)
+        """
+        datos = [(fila, json.dumps(resultado, ensure_ascii=False)) for fila, resultado in filas]
+
+        def _agregar(cursor):
+            secuencia = cursor.execute(
+                "SELECT COALESCE(MAX(secuencia), 0) FROM resultados_lote WHERE lote_id = ?",
+                (lote_id,),
+            ).fetchone()[0]
+            cursor.executemany(
+                "INSERT OR REPLACE INTO resultados_lote (lote_id, fila, secuencia, datos) "
+                "VALUES (?, ?, ?, ?)",
+                [(lote_id, fila, secuencia + i, texto) for i, (fila, texto) in enumerate(datos, 1)],
+            )
+            return secuencia + len(datos)
+
+        return self._transaccion(_agregar, LOTE, lote_id)
+
+    def resultados(self, lote_id, desde=0):
+        """
+        Resultados de un lote en el orden del archivo
+
+        Args:
+            lote_id: ID del lote
+            desde: Solo los registrados con secuencia mayor a este valor
+
+        Returns:
+            list: Resultados (cada uno con "fila" y "secuencia")
+        """
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT fila, secuencia, datos FROM resultados_lote "
+                "WHERE lote_id = ? AND secuencia > ? ORDER BY fila",
+                (lote_id, desde),
+            ).fetchall()
+        return [dict(json.loads(datos), fila=fila, secuencia=secuencia) for fila, secuencia, datos in filas]
+
+    def purgar(self):
+        """Desaloja los trabajos terminados hace más de ttl segundos"""
+        limite = time.time() - self.ttl
+
+        def _purgar(cursor):
+            cursor.execute(
+                "DELETE FROM resultados_lote WHERE lote_id IN ("
+                "SELECT trabajo_id FROM trabajos WHERE tipo = ? AND estado IN (?, ?) AND actualizado < ?)",
+                (LOTE,) + ESTADOS_FINALES + (limite,),
+            )
+            cursor.execute(
+                "DELETE FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?",
+                ESTADOS_FINALES + (limite,),
+            )
+            self._stats["desalojados"] += cursor.rowcount
+            return cursor.rowcount
+
+        eliminados = self._transaccion(_purgar)
+        self._ultima_purga = time.time()
+        return eliminados
+
+    def _quizas_purgar(self):
+        if time.time() - self._ultima_purga >= INTERVALO_PURGA:
+            self.purgar()
+
+    def estadisticas(self):
+        with self._lock:
+            trabajos = self._conexion.execute("SELECT COUNT(*) FROM trabajos").fetchone()[0]
+            stats = dict(self._stats)
+        stats["trabajos"] = trabajos
+        stats["backend"] = "sqlite"
+        stats["ttl_segundos"] = self.ttl
+        return stats
+
+
+BACKENDS = {"memoria": AlmacenMemoria, "sqlite": AlmacenSQLite}
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacen():
+    """Devuelve el almacén global según ALMACEN_BACKEND (se crea al primer uso)"""
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None:
+            if ALMACEN_BACKEND not in BACKENDS:
+                raise ValueError(
+                    f"Almacén desconocido '{ALMACEN_BACKEND}'. Valores permitidos: {list(BACKENDS)}"
+                )
+            _almacen = BACKENDS[ALMACEN_BACKEND]()
+        return _almacen
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# anticaptcha_api.py
+"""Cliente concurrente de Anti-Captcha: tareas en paralelo con futuros"""
+
+import time
+import base64
+import heapq
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    ANTICAPTCHA_API_KEY,
+    ANTICAPTCHA_URL,
+    CAPTCHA_TIMEOUT,
+    CAPTCHA_WORKERS,
+    CAPTCHA_TIEMPO_INICIAL,
+    CAPTCHA_INTERVALO_MIN,
+    CAPTCHA_INTERVALO_MAX,
+)
+
+
+class ClienteAntiCaptcha:
+    """
+    Resuelve CAPTCHAs de imagen sin bloquear al llamador
+
+    enviar() crea la tarea en segundo plano y devuelve un Future. Un único hilo
+    de sondeo consulta getTaskResult de todas las tareas pendientes sobre la
+    misma sesión HTTP (keep-alive), con un intervalo adaptativo: la primera
+    consulta se hace cerca del tiempo medio de resolución observado y luego el
+    intervalo crece de forma exponencial hasta intervalo_max.
+    """
+
+    def __init__(self, api_key=ANTICAPTCHA_API_KEY, url_base=ANTICAPTCHA_URL,
+                 timeout=CAPTCHA_TIMEOUT, workers=CAPTCHA_WORKERS,
+                 intervalo_min=CAPTCHA_INTERVALO_MIN, intervalo_max=CAPTCHA_INTERVALO_MAX,
+                 tiempo_inicial=CAPTCHA_TIEMPO_INICIAL):
+        self.api_key = api_key
+        self.url_base = url_base.rstrip("/")
+        self.timeout = timeout
+        self.intervalo_min = intervalo_min
+        self.intervalo_max = intervalo_max
+
+        self._sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max(2, workers))
+        self._sesion.mount("http://", adaptador)
+        self._sesion.mount("https://", adaptador)
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="captcha")
+        self._condicion = threading.Condition()
+        self._agenda = []  # heap de (proximo_sondeo, task_id)
+        self._pendientes = {}
+        self._hilo = None
+
+        # Tiempo medio de resolución (media móvil exponencial) y su semilla
+        self._tiempo_medio = tiempo_inicial
+        self._stats = {"creadas": 0, "resueltas": 0, "fallidas": 0, "sondeos": 0}
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+    def enviar(self, imagen):
+        """
+        Envía una imagen a resolver
+
+        Args:
+            imagen: Bytes de la imagen del CAPTCHA
+
+        Returns:
+            Future: Se completa con el texto resuelto o None si falla
+        """
+        futuro = Future()
+        futuro.set_running_or_notify_cancel()
+        self._executor.submit(self._crear_tarea, imagen, futuro)
+        return futuro
+
+    def resolver(self, imagen, timeout=None):
+        """Versión bloqueante de enviar(): devuelve el texto o None"""
+        try:
+            return self.enviar(imagen).result(timeout or self.timeout + 5)
+        except Exception:
+            return None
+
+    def estadisticas(self):
+        """Resumen de tareas creadas, resueltas, pendientes y sondeos"""
+        with self._condicion:
+            stats = dict(self._stats)
+            stats["pendientes"] = len(self._pendientes)
+            stats["tiempo_medio_segundos"] = round(self._tiempo_medio, 2)
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+    def _post(self, metodo, datos, timeout):
+        datos = dict(datos, clientKey=self.api_key)
+        respuesta = self._sesion.post(f"{self.url_base}/{metodo}", json=datos, timeout=timeout)
+        return respuesta.json()
+
+    def _terminar(self, futuro, valor, exito):
+        with self._condicion:
+            self._stats["resueltas" if exito else "fallidas"] += 1
+        if not futuro.done():
+            futuro.set_result(valor)
+
+    def _crear_tarea(self, imagen, futuro):
+        tarea = {
+            "type": "ImageToTextTask",
+            "body": base64.b64encode(imagen).decode("utf-8"),
+            "phrase": False,
+            "case": False,
+            "numeric": 1,  # Solo números
+            "math": False,
+            "minLength": 0,
+            "maxLength": 0,
+        }
+        try:
+            resultado = self._post("createTask", {"task": tarea}, timeout=30)
+        except Exception as e:
+            print(f"[!] Excepción al crear tarea en Anti-Captcha: {e}")
+            self._terminar(futuro, None, False)
+            return
+
+        if resultado.get("errorId") != 0:
+            print(f"[!] Error al crear tarea: {resultado.get('errorDescription')}")
+            self._terminar(futuro, None, False)
+            return
+
+        task_id = resultado.get("taskId")
+        ahora = time.time()
+        with self._condicion:
+            self._stats["creadas"] += 1
+            primera_espera = max(self.intervalo_min, self._tiempo_medio * 0.8)
+            self._pendientes[task_id] = {
+                "futuro": futuro,
+                "creada": ahora,
+                "limite": ahora + self.timeout,
+                "intervalo": self.intervalo_min,
+            }
+            heapq.heappush(self._agenda, (ahora + primera_espera, task_id))
+            self._asegurar_hilo()
+            self._condicion.notify()
+        print(f"[+] Tarea de CAPTCHA creada con ID: {task_id}")
+
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle_sondeo, daemon=True)
+            self._hilo.start()
+
+    def _tareas_vencidas(self):
+        """Espera hasta que haya tareas para sondear y las saca de la agenda"""
+        with self._condicion:
+            while True:
+                ahora = time.time()
+                if self._agenda and self._agenda[0][0] <= ahora:
+                    break
+                espera = self._agenda[0][0] - ahora if self._agenda else None
+                self._condicion.wait(espera)
+
+            vencidas = []
+            while self._agenda and self._agenda[0][0] <= ahora:
+                _, task_id = heapq.heappop(self._agenda)
+                if task_id in self._pendientes:
+                    vencidas.append(task_id)
+            return vencidas
+
+    def _bucle_sondeo(self):
+        while True:
+            vencidas = self._tareas_vencidas()
+            # Todas las consultas comparten la misma sesión keep-alive
+            for task_id in vencidas:
+                self._sondear(task_id)
+
+    def _sondear(self, task_id):
+        with self._condicion:
+            pendiente = self._pendientes.get(task_id)
+            self._stats["sondeos"] += 1
+        if pendiente is None:
+            return
+
+        try:
+            resultado = self._post("getTaskResult", {"taskId": task_id}, timeout=10)
+        except Exception as e:
+            print(f"[!] Error consultando tarea {task_id}: {e}")
+            resultado = {"errorId": 0, "status": "processing"}
+
+        ahora = time.time()
+        if resultado.get("errorId") != 0:
+            print(f"[!] Tarea {task_id} falló: {resultado.get('errorDescription')}")
+            self._finalizar_tarea(task_id, None, False)
+            return
+
+        if resultado.get("status") == "ready":
+            texto = (resultado.get("solution") or {}).get("text")
+            with self._condicion:
+                duracion = ahora - pendiente["creada"]
+                self._tiempo_medio = 0.8 * self._tiempo_medio + 0.2 * duracion
+            if texto:
+                print(f"[+] ✓ CAPTCHA resuelto automáticamente: {texto}")
+            self._finalizar_tarea(task_id, texto or None, bool(texto))
+            return
+
+        if ahora >= pendiente["limite"]:
+            print(f"[!] Timeout esperando resultado del CAPTCHA (tarea {task_id})")
+            self._finalizar_tarea(task_id, None, False)
+            return
+
+        with self._condicion:
+            pendiente["intervalo"] = min(pendiente["intervalo"] * 1.5, self.intervalo_max)
+            heapq.heappush(self._agenda, (ahora + pendiente["intervalo"], task_id))
+
+    def _finalizar_tarea(self, task_id, valor, exito):
+        with self._condicion:
+            pendiente = self._pendientes.pop(task_id, None)
+        if pendiente:
+            self._terminar(pendiente["futuro"], valor, exito)
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente_captcha():
+    """Devuelve el cliente Anti-Captcha global (una sesión por proceso)"""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            _cliente = ClienteAntiCaptcha()
+        return _cliente
+
+
+def estadisticas_captcha():
+    """Estadísticas del cliente global sin forzar su creación"""
+    with _cliente_lock:
+        if _cliente is None:
+            return {"iniciado": False}
+        stats = _cliente.estadisticas()
+    stats["iniciado"] = True
+    return stats
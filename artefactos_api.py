@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# artefactos_api.py
+"""Almacén de artefactos direccionado por contenido con índice SQLite"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from config import ARTEFACTOS_DIR, ARTEFACTOS_DB
+
+
+class AlmacenArtefactos:
+    """
+    Guarda cada artefacto una sola vez, nombrado por el SHA-256 de su contenido
+
+    Los objetos se reparten en subdirectorios por los primeros caracteres del
+    hash (objetos/ab/cd/abcd...html) para no acumular decenas de miles de
+    archivos en una carpeta. El índice relaciona cada consulta
+    (nombre_archivo, tipo_doc, numero_doc, marca de tiempo) con el hash de
+    cada artefacto; las páginas idénticas comparten el mismo objeto.
+    """
+
+    def __init__(self, raiz=ARTEFACTOS_DIR, ruta_db=ARTEFACTOS_DB):
+        self.raiz = raiz
+        self.ruta_db = ruta_db
+        self._lock = threading.Lock()
+
+        self._conexion = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS artefactos (
+                nombre_archivo TEXT NOT NULL,
+                tipo_doc TEXT,
+                numero_doc TEXT,
+                tipo TEXT NOT NULL,
+                marca REAL NOT NULL,
+                hash TEXT NOT NULL,
+                ruta TEXT NOT NULL,
+                codificacion TEXT NOT NULL DEFAULT '',
+                bytes INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artefactos_nombre ON artefactos (nombre_archivo, tipo, marca);
+            CREATE INDEX IF NOT EXISTS artefactos_documento ON artefactos (tipo_doc, numero_doc, marca);
+            CREATE INDEX IF NOT EXISTS artefactos_hash ON artefactos (hash);
+            """
+        )
+        self._conexion.commit()
+
+    @staticmethod
+    def calcular_hash(datos):
+        """SHA-256 (hex) del contenido sin comprimir"""
+        if isinstance(datos, str):
+            datos = datos.encode("utf-8")
+        return hashlib.sha256(datos).hexdigest()
+
+    def ruta_objeto(self, hash_contenido, extension):
+        """Ruta absoluta del objeto: objetos/<2>/<2>/<hash><extension>"""
+        return os.path.join(
+            self.raiz, "objetos", hash_contenido[:2], hash_contenido[2:4], hash_contenido + extension
+        )
+
+    def registrar(self, nombre_archivo, tipo, hash_contenido, extension, bytes_contenido,
+                  tipo_doc=None, numero_doc=None, codificacion="", marca=None):
+        """
+        Agrega al índice el artefacto de una consulta
+
+        Args:
+            nombre_archivo: Nombre base de la consulta (ej. "CC_1234567890")
+            tipo: Tipo de artefacto (html, json, txt, screenshot)
+            hash_contenido: Hash devuelto por calcular_hash
+            extension: Extensión del objeto (ej. ".html.gz")
+            bytes_contenido: Tamaño del contenido sin comprimir
+            tipo_doc, numero_doc: Documento consultado
+            codificacion: "gzip"/"zstd" si el objeto está comprimido
+            marca: Momento de la consulta (por defecto, ahora)
+
+        Returns:
+            str: Ruta absoluta del objeto
+        """
+        ruta = self.ruta_objeto(hash_contenido, extension)
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO artefactos (nombre_archivo, tipo_doc, numero_doc, tipo, marca, hash, ruta, "
+                "codificacion, bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (nombre_archivo, tipo_doc, numero_doc, tipo, marca or time.time(), hash_contenido,
+                 os.path.relpath(ruta, self.raiz), codificacion, bytes_contenido),
+            )
+            self._conexion.commit()
+        return ruta
+
+    def resolver(self, nombre_archivo, tipo, marca=None):
+        """
+        Busca el artefacto más reciente de una consulta (o el de una marca)
+
+        Returns:
+            dict or None: ruta (absoluta), codificacion, hash y marca
+        """
+        consulta = (
+            "SELECT ruta, codificacion, hash, marca FROM artefactos "
+            "WHERE nombre_archivo = ? AND tipo = ?"
+        )
+        parametros = [nombre_archivo, tipo]
+        if marca is not None:
+            consulta += " AND marca <= ?"
+            parametros.append(marca)
+        consulta += " ORDER BY marca DESC LIMIT 1"
+
+        with self._lock:
+            fila = self._conexion.execute(consulta, parametros).fetchone()
+        if not fila:
+            return None
+        return {
+            "ruta": os.path.join(self.raiz, fila[0]),
+            "codificacion": fila[1],
+            "hash": fila[2],
+            "marca": fila[3],
+        }
+
+    def versiones(self, tipo_doc, numero_doc):
+        """
+        Historial de consultas de un documento
+
+        Returns:
+            list: [{"marca", "tipo", "hash"}] de la más reciente a la más antigua
+        """
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT marca, tipo, hash FROM artefactos WHERE tipo_doc = ? AND numero_doc = ? "
+                "ORDER BY marca DESC",
+                (tipo_doc, numero_doc),
+            ).fetchall()
+        return [{"marca": marca, "tipo": tipo, "hash": hash_contenido} for marca, tipo, hash_contenido in filas]
+
+    def estadisticas(self):
+        with self._lock:
+            referencias, objetos, logicos = self._conexion.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT hash), COALESCE(SUM(bytes), 0) FROM artefactos"
+            ).fetchone()
+        return {
+            "referencias": referencias,
+            "objetos": objetos,
+            "deduplicados": referencias - objetos,
+            "bytes_logicos": logicos,
+        }
+
+
+_artefactos = None
+_artefactos_lock = threading.Lock()
+
+
+def obtener_artefactos():
+    """Devuelve el almacén de artefactos global (se crea al primer uso)"""
+    global _artefactos
+    with _artefactos_lock:
+        if _artefactos is None:
+            _artefactos = AlmacenArtefactos()
+        return _artefactos
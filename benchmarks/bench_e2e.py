@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# benchmarks/bench_e2e.py
+"""Rendimiento de extremo a extremo contra réplicas locales de ADRES y Anti-Captcha
+
+Uso:
+    python benchmarks/bench_e2e.py                                # selenium, concurrencias 1,2,4
+    python benchmarks/bench_e2e.py --motor http --concurrencias 1,4,8 --consultas 40
+    python benchmarks/bench_e2e.py --latencia 1.0 --jitter 0.3 --tasa-error 0.05 --salida bench.json
+
+Levanta mocks/adres_mock.py y mocks/anticaptcha_mock.py en este proceso y,
+por cada modo (consultas individuales con ejecutar_consulta_async y lote con
+ejecutar_consulta_masiva_async) y nivel de concurrencia, corre las consultas
+en un subproceso aislado: directorio de trabajo propio (caché, almacén y
+artefactos vacíos), pool y planificador del tamaño del nivel y limitador sin
+tope efectivo. El cliente Anti-Captcha de cada subproceso arranca con la
+semilla de tiempo de resolución igual a la demora del mock (y un intervalo
+mínimo de sondeo corto) para no medir su arranque en frío; ambos valores y
+las estadísticas del cliente quedan en el reporte. El resultado es un JSON
+con consultas/minuto, latencias p50/p95/p99, tiempo medio por etapa y RSS
+de Chrome por navegador, junto con el commit, para comparar corridas entre
+commits.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "mocks"))
+
+try:
+    import psutil
+except ImportError:  # psutil es opcional: sin él se lee /proc (solo Linux)
+    psutil = None
+
+
+MODOS = ("individual", "lote")
+# Procesos que cuentan como "Chrome" al medir memoria
+PROCESOS_CHROME = ("chrome", "chromium", "chromedriver", "headless_shell")
+
+
+def percentiles(valores):
+    """p50/p95/p99 (rango más cercano), media y máximo en milisegundos"""
+    if not valores:
+        return {"p50": None, "p95": None, "p99": None, "media": None, "maximo": None}
+    ordenados = sorted(valores)
+
+    def _rango(p):
+        indice = max(0, min(len(ordenados) - 1, -(-len(ordenados) * p // 100) - 1))
+        return round(ordenados[int(indice)] * 1000, 1)
+
+    return {
+        "p50": _rango(50),
+        "p95": _rango(95),
+        "p99": _rango(99),
+        "media": round(sum(ordenados) / len(ordenados) * 1000, 1),
+        "maximo": round(ordenados[-1] * 1000, 1),
+    }
+
+
+# ----------------------------------------------------------------------
+# Memoria de Chrome
+# ----------------------------------------------------------------------
+def _procesos_proc():
+    """[(pid, ppid, nombre, rss_bytes)] leyendo /proc"""
+    pagina = os.sysconf("SC_PAGE_SIZE")
+    procesos = []
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entrada}/statm") as f:
+                rss = int(f.read().split()[1]) * pagina
+        except (OSError, IndexError, ValueError):
+            continue
+        # El nombre va entre paréntesis y puede tener espacios
+        nombre = stat[stat.find("(") + 1:stat.rfind(")")]
+        campos = stat[stat.rfind(")") + 2:].split()
+        procesos.append((int(entrada), int(campos[1]), nombre, rss))
+    return procesos
+
+
+def rss_chrome(raiz=None):
+    """
+    RSS total (bytes) de los procesos Chrome/chromedriver descendientes de raiz
+
+    Returns:
+        int or None: Bytes, o None si no se puede medir en esta plataforma
+    """
+    raiz = raiz or os.getpid()
+    if psutil is not None:
+        try:
+            hijos = psutil.Process(raiz).children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for proceso in hijos:
+            try:
+                if any(clave in proceso.name().lower() for clave in PROCESOS_CHROME):
+                    total += proceso.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    if not os.path.isdir("/proc"):
+        return None
+    procesos = _procesos_proc()
+    hijos = {}
+    for pid, ppid, nombre, rss in procesos:
+        hijos.setdefault(ppid, []).append((pid, nombre, rss))
+    total = 0
+    pendientes = [raiz]
+    while pendientes:
+        for pid, nombre, rss in hijos.get(pendientes.pop(), []):
+            if any(clave in nombre.lower() for clave in PROCESOS_CHROME):
+                total += rss
+            pendientes.append(pid)
+    return total
+
+
+class MuestreoRSS:
+    """Hilo que mide periódicamente la memoria de Chrome y guarda máximo y media"""
+
+    def __init__(self, intervalo=0.5):
+        self.intervalo = intervalo
+        self._muestras = []
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._medir, daemon=True)
+
+    def _medir(self):
+        while not self._detener.is_set():
+            valor = rss_chrome()
+            if valor is not None:
+                self._muestras.append(valor)
+            self._detener.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+
+    def resumen(self, navegadores):
+        """MB totales y por navegador (máximo y media de las muestras)"""
+        if not self._muestras:
+            return None
+        megas = 1024 * 1024
+        maximo = max(self._muestras) / megas
+        media = sum(self._muestras) / len(self._muestras) / megas
+        navegadores = max(1, navegadores)
+        return {
+            "total_maximo_mb": round(maximo, 1),
+            "total_medio_mb": round(media, 1),
+            "por_navegador_maximo_mb": round(maximo / navegadores, 1),
+            "por_navegador_medio_mb": round(media / navegadores, 1),
+            "muestras": len(self._muestras),
+        }
+
+
+# ----------------------------------------------------------------------
+# Subproceso: un modo y un nivel de concurrencia
+# ----------------------------------------------------------------------
+def _etapas_medias(estados):
+    """Segundos medios por etapa sobre los estados que la registraron"""
+    acumulado = {}
+    for estado in estados:
+        for etapa, segundos in ((estado or {}).get("etapas") or {}).items():
+            suma, cantidad = acumulado.get(etapa, (0.0, 0))
+            acumulado[etapa] = (suma + segundos, cantidad + 1)
+    return {etapa: round(suma / cantidad, 3) for etapa, (suma, cantidad) in acumulado.items()}
+
+
+def ejecutar_nivel(modo, concurrencia, consultas, motor, primer_documento):
+    """
+    Corre las consultas de un nivel dentro de este proceso (llamado en el
+    subproceso, con la configuración ya puesta en el entorno)
+
+    Returns:
+        dict: Métricas del nivel
+    """
+    import server
+    from almacen_api import LOTE
+
+    arranque = 0.0
+    if motor == "selenium":
+        # Los navegadores se crean antes de medir: el arranque se reporta aparte
+        inicio = time.perf_counter()
+        pool = server.obtener_pool()
+        pool.precalentar()
+        # obtener_pool() también precalienta en segundo plano: esperar a todos
+        while pool.estadisticas()["libres"] < pool.tamano:
+            if pool.estadisticas()["fallos"]:
+                raise RuntimeError("No se pudo iniciar Chrome para el pool")
+            time.sleep(0.1)
+        arranque = time.perf_counter() - inicio
+
+    documentos = [str(primer_documento + indice) for indice in range(consultas)]
+    duraciones = []
+    estados = []
+    lock = threading.Lock()
+
+    consultar_original = server.ejecutar_consulta_async
+
+    def _cronometrado(*args, **kwargs):
+        inicio = time.perf_counter()
+        estado = consultar_original(*args, **kwargs)
+        with lock:
+            duraciones.append(time.perf_counter() - inicio)
+            estados.append(estado)
+        return estado
+
+    # El lote busca la función por nombre en el módulo al consultar cada fila
+    server.ejecutar_consulta_async = _cronometrado
+
+    with MuestreoRSS() as muestreo:
+        inicio = time.perf_counter()
+        if modo == "individual":
+            with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                futuros = [
+                    executor.submit(_cronometrado, numero, "CC", f"bench-{numero}", motor, True)
+                    for numero in documentos
+                ]
+                for futuro in futuros:
+                    futuro.result()
+        else:
+            ruta = os.path.abspath("lote_bench.csv")
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write("tipo_identificacion,numero_identificacion\n")
+                f.writelines(f"CC,{numero}\n" for numero in documentos)
+            server.ejecutar_consulta_masiva_async(ruta, "bench", concurrencia, motor, True)
+            estado_lote = server.almacen.obtener(LOTE, "bench") or {}
+            if estado_lote.get("estado") == "error":
+                raise RuntimeError(estado_lote.get("mensaje"))
+        duracion = time.perf_counter() - inicio
+
+    server.obtener_escritor().esperar()
+    exitosas = sum(
+        1 for estado in estados
+        if (estado or {}).get("estado") == "completado" and ((estado or {}).get("datos") or {}).get("exito")
+    )
+    return {
+        "modo": modo,
+        "motor": motor,
+        "concurrencia": concurrencia,
+        "consultas": len(duraciones),
+        "exitosas": exitosas,
+        "fallidas": len(duraciones) - exitosas,
+        "duracion_s": round(duracion, 3),
+        "consultas_por_minuto": round(len(duraciones) / duracion * 60, 2) if duracion else None,
+        "arranque_pool_s": round(arranque, 3),
+        "latencia_ms": percentiles(duraciones),
+        "etapas_media_s": _etapas_medias(estados),
+        "chrome_rss": muestreo.resumen(concurrencia) if motor == "selenium" else None,
+        "limitador": server.limitador.estadisticas(),
+        "captcha": server.estadisticas_captcha(),
+    }
+
+
+# ----------------------------------------------------------------------
+# Proceso principal: réplicas y orquestación
+# ----------------------------------------------------------------------
+class _PeticionSilenciosa(WSGIRequestHandler):
+    """Sin una línea de log por petición a las réplicas"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _iniciar_servidor(app):
+    """Sirve una app Flask en un puerto libre en segundo plano"""
+    servidor = make_server("127.0.0.1", 0, app, threaded=True, request_handler=_PeticionSilenciosa)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, servidor.server_port
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _entorno(args, concurrencia, url_adres, url_captcha):
+    """Variables de entorno del subproceso de un nivel"""
+    entorno = dict(os.environ)
+    entorno.update({
+        "PYTHONUNBUFFERED": "1",
+        "ADRES_URL": f"{url_adres}/consulte-su-eps",
+        "ADRES_URL_FORMULARIO": f"{url_adres}/bdua_internet/Pages/ConsultarAfiliadoWeb.aspx",
+        "ANTICAPTCHA_URL": url_captcha,
+        "ANTICAPTCHA_API_KEY": "bench",
+        "ADRES_MOTOR": args.motor,
+        "ADRES_POOL_NAVEGADORES": str(concurrencia),
+        "ADRES_PLANIFICADOR_TRABAJADORES": str(concurrencia),
+        "ADRES_LOTE_CONCURRENCIA": str(concurrencia),
+        "ADRES_CAPTCHA_WORKERS": str(max(4, concurrencia)),
+        # Cada nivel es un proceso nuevo: sin semilla ajustada, el cliente
+        # sondearía el primer CAPTCHA a los 4s aunque el mock tarde menos
+        "ADRES_CAPTCHA_TIEMPO_INICIAL": str(args.captcha_tiempo_inicial),
+        "ADRES_CAPTCHA_INTERVALO_MIN": str(args.captcha_intervalo_min),
+        "ADRES_ALMACEN": "memoria",
+        # El limitador no debe ser el cuello de botella que se mide
+        "ADRES_LIMITADOR_TASA": str(args.tasa),
+        "ADRES_LIMITADOR_TASA_MAXIMA": str(args.tasa),
+        "ADRES_LIMITADOR_RAFAGA": str(concurrencia),
+    })
+    return entorno
+
+
+def _stats_mock(url):
+    import requests
+
+    try:
+        return requests.get(f"{url}/stats", timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return {}
+
+
+def _diferencia(antes, despues):
+    return {
+        clave: valor - antes.get(clave, 0)
+        for clave, valor in despues.items() if isinstance(valor, (int, float))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo (réplicas locales)")
+    parser.add_argument("--motor", choices=("selenium", "http"), default="selenium")
+    parser.add_argument("--modos", default=",".join(MODOS), help="individual, lote o ambos")
+    parser.add_argument("--concurrencias", default="1,2,4")
+    parser.add_argument("--consultas", type=int, default=20, help="Consultas por modo y nivel")
+    parser.add_argument("--latencia", type=float, default=0.5, help="Segundos de respuesta de ADRES")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--latencia-pagina", type=float, default=0.0)
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--tasa-sin-datos", type=float, default=0.0)
+    parser.add_argument("--demora-captcha", type=float, default=1.0, help="Segundos de Anti-Captcha")
+    parser.add_argument("--jitter-captcha", type=float, default=0.2)
+    parser.add_argument("--captcha-tiempo-inicial", type=float,
+                        help="Semilla del tiempo de resolución del cliente (por defecto, --demora-captcha)")
+    parser.add_argument("--captcha-intervalo-min", type=float, default=0.1,
+                        help="Intervalo mínimo de sondeo del cliente Anti-Captcha")
+    parser.add_argument("--tasa", type=float, default=100000, help="Consultas/minuto del limitador")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, stdout)")
+    parser.add_argument("--detalle", action="store_true", help="Mostrar la salida de cada subproceso")
+    # Uso interno: un nivel en un subproceso
+    parser.add_argument("--interno", nargs=2, metavar=("MODO", "CONCURRENCIA"), help=argparse.SUPPRESS)
+    parser.add_argument("--primer-documento", type=int, default=1000000000, help=argparse.SUPPRESS)
+    parser.add_argument("--resultado-interno", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.captcha_tiempo_inicial is None:
+        args.captcha_tiempo_inicial = args.demora_captcha
+
+    if args.interno:
+        modo, concurrencia = args.interno[0], int(args.interno[1])
+        resultado = ejecutar_nivel(modo, concurrencia, args.consultas, args.motor, args.primer_documento)
+        with open(args.resultado_interno, "w", encoding="utf-8") as f:
+            json.dump(resultado, f)
+        return
+
+    import adres_mock
+    import anticaptcha_mock
+
+    servidor_adres, puerto_adres = _iniciar_servidor(adres_mock.crear_app(
+        latencia=args.latencia, jitter=args.jitter, latencia_pagina=args.latencia_pagina,
+        tasa_error=args.tasa_error, tasa_sin_datos=args.tasa_sin_datos, semilla=args.semilla,
+    ))
+    servidor_captcha, puerto_captcha = _iniciar_servidor(anticaptcha_mock.crear_app(
+        demora=args.demora_captcha, jitter=args.jitter_captcha,
+    ))
+    url_adres = f"http://127.0.0.1:{puerto_adres}"
+    url_captcha = f"http://127.0.0.1:{puerto_captcha}"
+
+    modos = [modo.strip() for modo in args.modos.split(",") if modo.strip()]
+    concurrencias = [int(valor) for valor in args.concurrencias.split(",") if valor.strip()]
+    niveles = []
+    primer_documento = args.primer_documento
+
+    try:
+        for modo in modos:
+            for concurrencia in concurrencias:
+                print(f"[+] {modo}, concurrencia {concurrencia}: {args.consultas} consultas...", file=sys.stderr)
+                directorio = tempfile.mkdtemp(prefix="bench_e2e_")
+                ruta_resultado = os.path.join(directorio, "resultado.json")
+                antes = _stats_mock(url_adres)
+                try:
+                    proceso = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__),
+                         "--interno", modo, str(concurrencia),
+                         "--consultas", str(args.consultas), "--motor", args.motor,
+                         "--primer-documento", str(primer_documento),
+                         "--resultado-interno", ruta_resultado],
+                        cwd=directorio,
+                        env=_entorno(args, concurrencia, url_adres, url_captcha),
+                        stdout=None if args.detalle else subprocess.PIPE,
+                        stderr=None if args.detalle else subprocess.STDOUT,
+                        text=True,
+                    )
+                    if proceso.returncode != 0 or not os.path.exists(ruta_resultado):
+                        print(f"[!] El nivel {modo}/{concurrencia} falló", file=sys.stderr)
+                        if proceso.stdout:
+                            print(proceso.stdout[-4000:], file=sys.stderr)
+                        niveles.append({"modo": modo, "concurrencia": concurrencia, "error": proceso.returncode})
+                        continue
+                    with open(ruta_resultado, encoding="utf-8") as f:
+                        nivel = json.load(f)
+                finally:
+                    shutil.rmtree(directorio, ignore_errors=True)
+
+                nivel["adres_mock"] = _diferencia(antes, _stats_mock(url_adres))
+                niveles.append(nivel)
+                # Documentos nuevos en cada nivel: nada se sirve de una corrida anterior
+                primer_documento += args.consultas
+                print(
+                    f"    {nivel['consultas_por_minuto']} consultas/min, "
+                    f"p50 {nivel['latencia_ms']['p50']} ms, p95 {nivel['latencia_ms']['p95']} ms, "
+                    f"{nivel['exitosas']}/{nivel['consultas']} exitosas",
+                    file=sys.stderr,
+                )
+    finally:
+        servidor_adres.shutdown()
+        servidor_captcha.shutdown()
+
+    reporte = {
+        "commit": _commit(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            clave: valor for clave, valor in vars(args).items()
+            if clave not in ("interno", "resultado_interno", "salida", "detalle")
+        },
+        "niveles": niveles,
+    }
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+        print(f"[+] Resultados en {args.salida}", file=sys.stderr)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# benchmarks/bench_parser.py
+"""Rendimiento de parsear_html_a_json sobre páginas de resultado guardadas
+
+Uso:
+    python benchmarks/bench_parser.py                      # HTML del almacén de artefactos
+    python benchmarks/bench_parser.py --dir /ruta/corpus --repeticiones 20
+    python benchmarks/bench_parser.py --sinteticas 500     # sin corpus: páginas del mock
+
+Compara el parser actual con la implementación anterior (una búsqueda por
+campo) y verifica que ambos produzcan exactamente el mismo JSON.
+"""
+
+import os
+import re
+import sys
+import glob
+import gzip
+import time
+import base64
+import random
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "mocks"))
+
+from config import ARTEFACTOS_DIR  # noqa: E402
+from results_api import parsear_html_a_json  # noqa: E402
+
+
+def parsear_referencia(html_content):
+    """Parser anterior (nueve re.search + un finditer sin precompilar)"""
+    resultado = {"exito": False, "informacion_basica": {}, "datos_afiliacion": [], "metadatos": {}}
+
+    tipo_id_match = re.search(r'TIPO DE IDENTIFICACIÓN</td><td>([^<]+)</td>', html_content)
+    numero_id_match = re.search(r'NÚMERO DE IDENTIFICACION</td><td>([^<]+)</td>', html_content)
+    nombres_match = re.search(r'NOMBRES</td><td>([^<]+)</td>', html_content)
+    apellidos_match = re.search(r'APELLIDOS</td><td>([^<]+)</td>', html_content)
+    fecha_nac_match = re.search(r'FECHA DE NACIMIENTO</td><td>([^<]+)</td>', html_content)
+    departamento_match = re.search(r'DEPARTAMENTO</td><td>([^<]+)</td>', html_content)
+    municipio_match = re.search(r'MUNICIPIO</td><td>([^<]+)</td>', html_content)
+
+    if tipo_id_match and numero_id_match:
+        resultado["exito"] = True
+        resultado["informacion_basica"] = {
+            "tipo_identificacion": tipo_id_match.group(1).strip(),
+            "numero_identificacion": numero_id_match.group(1).strip(),
+            "nombres": nombres_match.group(1).strip() if nombres_match else "",
+            "apellidos": apellidos_match.group(1).strip() if apellidos_match else "",
+            "fecha_nacimiento": fecha_nac_match.group(1).strip() if fecha_nac_match else "",
+            "departamento": departamento_match.group(1).strip() if departamento_match else "",
+            "municipio": municipio_match.group(1).strip() if municipio_match else ""
+        }
+
+    afiliacion_pattern = r'<tr class="DataGrid_(?:Item|AlternatingItem)" align="center">\s*<td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td>'
+    for match in re.finditer(afiliacion_pattern, html_content):
+        resultado["datos_afiliacion"].append({
+            "estado": match.group(1).strip(),
+            "entidad": match.group(2).strip(),
+            "regimen": match.group(3).strip(),
+            "fecha_afiliacion": match.group(4).strip(),
+            "fecha_finalizacion": match.group(5).strip(),
+            "tipo_afiliado": match.group(6).strip()
+        })
+
+    fecha_impresion_match = re.search(r'Fecha de Impresión:.*?<span[^>]*>([^<]+)</span>', html_content)
+    estacion_match = re.search(r'Estación de origen:.*?<span[^>]*>([^<]+)</span>', html_content)
+    resultado["metadatos"] = {
+        "fecha_consulta": fecha_impresion_match.group(1).strip() if fecha_impresion_match else "",
+        "estacion": estacion_match.group(1).strip() if estacion_match else ""
+    }
+    return resultado
+
+
+def cargar_corpus(directorio):
+    """
+    Lee las páginas del directorio: resultado_*.html (archivos planos) y los
+    objetos .html / .html.gz del almacén de artefactos
+    """
+    rutas = glob.glob(os.path.join(directorio, "resultado_*.html"))
+    rutas += glob.glob(os.path.join(directorio, "objetos", "*", "*", "*.html"))
+    rutas += glob.glob(os.path.join(directorio, "objetos", "*", "*", "*.html.gz"))
+
+    paginas = []
+    for ruta in sorted(rutas):
+        abrir = gzip.open if ruta.endswith(".gz") else open
+        with abrir(ruta, "rt", encoding="utf-8", errors="replace") as f:
+            paginas.append((os.path.basename(ruta), f.read()))
+    return paginas
+
+
+def generar_corpus(cantidad, semilla=0):
+    """
+    Páginas del mock de ADRES con el peso de una respuesta ASP.NET real
+    (__VIEWSTATE en base64, estilos y scripts antes de las tablas)
+    """
+    from adres_mock import _pagina_resultado
+
+    generador = random.Random(semilla)
+    paginas = []
+    for indice in range(cantidad):
+        pagina = _pagina_resultado("CC", str(1000000000 + indice))
+        viewstate = base64.b64encode(generador.randbytes(30000)).decode()
+        relleno = (
+            f'<form><input type="hidden" name="__VIEWSTATE" value="{viewstate}" /></form>'
+            + "<style>" + "td{font-family:Arial;color:#333} " * 400 + "</style>"
+            + "<script>function f(){return 1;}</script>\n" * 150
+        )
+        paginas.append((f"sintetica_{indice}", pagina.replace("<body>", "<body>" + relleno, 1)))
+    return paginas
+
+
+def medir(funcion, paginas, repeticiones):
+    """Devuelve (páginas/seg, MB/seg) del mejor de varias pasadas"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _, contenido in paginas:
+            funcion(contenido)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    megas = sum(len(contenido.encode("utf-8")) for _, contenido in paginas) / 1e6
+    return len(paginas) / mejor, megas / mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del parser de resultados ADRES")
+    parser.add_argument("--dir", default=ARTEFACTOS_DIR,
+                        help="Almacén de artefactos o directorio con resultado_*.html")
+    parser.add_argument("--sinteticas", type=int, default=0,
+                        help="Páginas sintéticas a generar si no hay corpus (o adicionales)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    paginas = cargar_corpus(args.dir)
+    if args.sinteticas or not paginas:
+        paginas += generar_corpus(args.sinteticas or 200)
+
+    diferencias = [nombre for nombre, contenido in paginas
+                   if parsear_html_a_json(contenido) != parsear_referencia(contenido)]
+    if diferencias:
+        print(f"[!] {len(diferencias)} páginas con salida distinta: {diferencias[:5]}")
+        sys.exit(1)
+
+    tamano_medio = sum(len(contenido) for _, contenido in paginas) / len(paginas) / 1024
+    print(f"Corpus: {len(paginas)} páginas, {tamano_medio:.1f} KB de media (salida idéntica)")
+
+    for nombre, funcion in (("referencia", parsear_referencia), ("actual", parsear_html_a_json)):
+        por_segundo, megas = medir(funcion, paginas, args.repeticiones)
+        print(f"{nombre:>10}: {por_segundo:10.1f} páginas/s  {megas:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
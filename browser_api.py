@@ -3,9 +3,17 @@
 """API para manejo del navegador Selenium"""
 
 import time
+from functools import lru_cache
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
+from espera_api import esperar_nueva_ventana
+
+
+@lru_cache(maxsize=1)
+def _ruta_chromedriver():
+    """Resuelve la ruta de chromedriver una sola vez por proceso"""
+    return ChromeDriverManager().install()
 
 
 def iniciar_navegador(headless=False):
@@ -23,12 +31,13 @@ def iniciar_navegador(headless=False):
     
     if headless:
         options.add_argument("--headless")
+        options.add_argument("--window-size=1920,1080")
     
     # Reducir detección de automatización
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
     
-    service = Service(ChromeDriverManager().install())
+    service = Service(_ruta_chromedriver())
     driver = webdriver.Chrome(service=service, options=options)
     
     return driver
@@ -54,6 +63,34 @@ def cerrar_navegador(driver, delay=8):
             pass
 
 
+def reiniciar_navegador(driver, url):
+    """
+    Deja un navegador existente listo para una nueva consulta
+    
+    Cierra las ventanas adicionales (popups de resultados), borra las cookies
+    de todos los dominios y vuelve a cargar la URL del formulario.
+    
+    Args:
+        driver: Instancia del WebDriver
+        url: URL a cargar después de limpiar
+    """
+    handles = driver.window_handles
+    principal = handles[0]
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(principal)
+    driver.switch_to.default_content()
+    
+    try:
+        # Borra también las cookies del iframe (otro dominio)
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    except Exception:
+        driver.delete_all_cookies()
+    
+    driver.get(url)
+
+
 def guardar_debug(driver, prefix, debug_folder):
     """
     Guarda screenshot y código fuente para depuración
@@ -79,7 +116,7 @@ def guardar_debug(driver, prefix, debug_folder):
     return screenshot_path, html_path
 
 
-def cambiar_a_nueva_ventana(driver, ventanas_anteriores, timeout=20):
+def cambiar_a_nueva_ventana(driver, ventanas_anteriores, timeout=20, tiempos=None):
     """
     Detecta y cambia a una nueva ventana del navegador
     
@@ -87,26 +124,19 @@ def cambiar_a_nueva_ventana(driver, ventanas_anteriores, timeout=20):
         driver: Instancia del WebDriver
         ventanas_anteriores: Lista de handles de ventanas antes de la acción
         timeout: Segundos máximos a esperar
+        tiempos: Diccionario etapa -> segundos de la consulta (opcional)
     
     Returns:
         bool: True si se encontró una nueva ventana, False si no
     """
-    waited = 0
-    while waited < timeout:
-        time.sleep(1)
-        waited += 1
-        try:
-            if len(driver.window_handles) > len(ventanas_anteriores):
-                # Cambiar a la nueva ventana
-                for h in driver.window_handles:
-                    if h not in ventanas_anteriores:
-                        driver.switch_to.window(h)
-                        print(f"[+] Cambiado a nueva ventana después de {waited} segundos")
-                        return True
-        except Exception as e:
-            print(f"[!] Error al verificar ventanas: {e}")
-            continue
-    return False
+    inicio = time.perf_counter()
+    handle = esperar_nueva_ventana(driver, ventanas_anteriores, timeout, tiempos)
+    if not handle:
+        return False
+    
+    driver.switch_to.window(handle)
+    print(f"[+] Cambiado a nueva ventana después de {time.perf_counter() - inicio:.2f} segundos")
+    return True
 
 
 def buscar_iframe_con_contenido(driver, min_text_length=20):
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# cache_api.py
+"""Caché persistente de resultados por (tipo_doc, numero_doc) con TTL"""
+
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from config import CACHE_DB, CACHE_TTL_SEGUNDOS, CACHE_LRU_CAPACIDAD
+
+
+# Cada cuánto (segundos) se borran del disco las entradas vencidas
+INTERVALO_PURGA = 600
+
+class CacheResultados:
+    """
+    Caché de dos niveles: LRU en memoria delante de una tabla SQLite
+
+    Solo se guardan consultas exitosas; las entradas vencen a los
+    ttl segundos de haberse guardado y se borran del disco, como mucho cada
+    INTERVALO_PURGA segundos, al guardar una nueva.
+    """
+
+    def __init__(self, ruta=CACHE_DB, ttl=CACHE_TTL_SEGUNDOS, capacidad=CACHE_LRU_CAPACIDAD):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.capacidad = max(1, capacidad)
+
+        self._lock = threading.Lock()
+        self._memoria = OrderedDict()
+        self._stats = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "guardados": 0, "purgados": 0}
+        self._ultima_purga = time.time()
+
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resultados (
+                tipo_doc TEXT NOT NULL,
+                numero_doc TEXT NOT NULL,
+                guardado REAL NOT NULL,
+                estado TEXT NOT NULL,
+                PRIMARY KEY (tipo_doc, numero_doc)
+            )
+            """
+        )
+        self._conexion.commit()
+
+    def _vigente(self, guardado):
+        return time.time() - guardado < self.ttl
+
+    def _recordar(self, clave, guardado, estado):
+        """Inserta en la LRU en memoria desalojando la entrada más antigua"""
+        self._memoria[clave] = (guardado, estado)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.capacidad:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, tipo_doc, numero_doc):
+        """
+        Busca un resultado vigente en la caché
+
+        Args:
+            tipo_doc: Código del tipo de documento
+            numero_doc: Número de documento normalizado
+
+        Returns:
+            dict or None: Estado final guardado (con "cacheado_en") o None
+        """
+        clave = (tipo_doc, numero_doc)
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada and self._vigente(entrada[0]):
+                self._memoria.move_to_end(clave)
+                self._stats["hits_memoria"] += 1
+                return dict(entrada[1], cacheado_en=entrada[0])
+            if entrada:
+                del self._memoria[clave]
+
+            fila = self._conexion.execute(
+                "SELECT guardado, estado FROM resultados WHERE tipo_doc = ? AND numero_doc = ?",
+                clave,
+            ).fetchone()
+            if fila and self._vigente(fila[0]):
+                estado = json.loads(fila[1])
+                self._recordar(clave, fila[0], estado)
+                self._stats["hits_disco"] += 1
+                return dict(estado, cacheado_en=fila[0])
+
+            self._stats["misses"] += 1
+            return None
+
+    def guardar(self, tipo_doc, numero_doc, estado):
+        """
+        Guarda el estado final de una consulta exitosa
+
+        Args:
+            tipo_doc: Código del tipo de documento
+            numero_doc: Número de documento normalizado
+            estado: Estado final (con "datos" de parsear_html_a_json)
+        """
+        clave = (tipo_doc, numero_doc)
+        guardado = time.time()
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO resultados (tipo_doc, numero_doc, guardado, estado) VALUES (?, ?, ?, ?)",
+                (tipo_doc, numero_doc, guardado, json.dumps(estado, ensure_ascii=False)),
+            )
+            self._conexion.commit()
+            self._recordar(clave, guardado, estado)
+            self._stats["guardados"] += 1
+        self._quizas_purgar()
+
+    def invalidar(self, tipo_doc, numero_doc):
+        """Elimina una entrada de ambos niveles"""
+        clave = (tipo_doc, numero_doc)
+        with self._lock:
+            self._memoria.pop(clave, None)
+            self._conexion.execute(
+                "DELETE FROM resultados WHERE tipo_doc = ? AND numero_doc = ?", clave
+            )
+            self._conexion.commit()
+
+    def purgar(self):
+        """Borra del disco las entradas vencidas; devuelve cuántas se eliminaron"""
+        with self._lock:
+            cursor = self._conexion.execute(
+                "DELETE FROM resultados WHERE guardado < ?", (time.time() - self.ttl,)
+            )
+            self._conexion.commit()
+            self._stats["purgados"] += cursor.rowcount
+            self._ultima_purga = time.time()
+            return cursor.rowcount
+
+    def _quizas_purgar(self):
+        if time.time() - self._ultima_purga >= INTERVALO_PURGA:
+            self.purgar()
+
+    def estadisticas(self):
+        """Contadores de aciertos y fallos de la caché"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entradas_memoria"] = len(self._memoria)
+        hits = stats["hits_memoria"] + stats["hits_disco"]
+        consultas = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["tasa_aciertos"] = round(hits / consultas, 3) if consultas else 0.0
+        stats["ttl_segundos"] = self.ttl
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache():
+    """Devuelve la caché global (se crea al primer uso)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheResultados()
+        return _cache
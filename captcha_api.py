@@ -2,106 +2,43 @@
 # captcha_api.py
 """API para captura y resolución de CAPTCHA"""
 
-import io
 import os
-import base64
-import requests
-from PIL import Image
-from config import ANTICAPTCHA_API_KEY, OUTPUT_DIR
+import uuid
+from config import OUTPUT_DIR, CAPTCHA_TIMEOUT
 from gui import CaptchaGUI
+from anticaptcha_api import obtener_cliente_captcha
 
 
-def capturar_captcha(driver, element, save_path):
+def resolver_captcha_automatico(captcha_path):
     """
-    Captura un elemento CAPTCHA como imagen
+    Intenta resolver el CAPTCHA usando Anti-Captcha API directamente
     
     Args:
-        driver: WebDriver de Selenium
-        element: Elemento web que contiene el CAPTCHA
-        save_path: Ruta donde guardar la imagen
+        captcha_path: Ruta de la imagen del CAPTCHA
     
     Returns:
-        str: Ruta del archivo guardado
+        str or None: Texto del CAPTCHA resuelto o None si falla
     """
-    png = element.screenshot_as_png
-    image = Image.open(io.BytesIO(png))
-    image.save(save_path)
-    return save_path
+    try:
+        with open(captcha_path, 'rb') as image_file:
+            return resolver_captcha_bytes(image_file.read())
+    except OSError as e:
+        print(f"[!] No se pudo leer la imagen del CAPTCHA: {e}")
+        return None
 
 
-def resolver_captcha_automatico(captcha_path):
+def resolver_captcha_bytes(imagen):
     """
-    Intenta resolver el CAPTCHA usando Anti-Captcha API directamente
+    Resuelve con Anti-Captcha una imagen de CAPTCHA ya cargada en memoria
     
     Args:
-        captcha_path: Ruta de la imagen del CAPTCHA
+        imagen: Bytes de la imagen del CAPTCHA
     
     Returns:
         str or None: Texto del CAPTCHA resuelto o None si falla
     """
-    try:
-        # Leer imagen y convertir a base64
-        with open(captcha_path, 'rb') as image_file:
-            image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        # Crear tarea en Anti-Captcha
-        create_task_url = "https://api.anti-captcha.com/createTask"
-        
-        task_data = {
-            "clientKey": ANTICAPTCHA_API_KEY,
-            "task": {
-                "type": "ImageToTextTask",
-                "body": image_base64,
-                "phrase": False,
-                "case": False,
-                "numeric": 1,  # Solo números
-                "math": False,
-                "minLength": 0,
-                "maxLength": 0
-            }
-        }
-        
-        # Enviar solicitud
-        print("[+] Enviando CAPTCHA a Anti-Captcha API...")
-        response = requests.post(create_task_url, json=task_data, timeout=30)
-        result = response.json()
-        
-        if result.get("errorId") != 0:
-            print(f"[!] Error al crear tarea: {result.get('errorDescription')}")
-            return None
-        
-        task_id = result.get("taskId")
-        print(f"[+] Tarea creada con ID: {task_id}")
-        
-        # Esperar resultado
-        get_result_url = "https://api.anti-captcha.com/getTaskResult"
-        
-        import time
-        for i in range(30):  # Intentar por 30 segundos
-            time.sleep(2)
-            
-            result_data = {
-                "clientKey": ANTICAPTCHA_API_KEY,
-                "taskId": task_id
-            }
-            
-            response = requests.post(get_result_url, json=result_data, timeout=10)
-            result = response.json()
-            
-            if result.get("status") == "ready":
-                captcha_text = result.get("solution", {}).get("text")
-                if captcha_text:
-                    print(f"[+] ✓ CAPTCHA resuelto automáticamente: {captcha_text}")
-                    return captcha_text
-            
-            print(f"[*] Esperando resultado... ({i+1}/30)")
-        
-        print("[!] Timeout esperando resultado del CAPTCHA")
-        return None
-            
-    except Exception as e:
-        print(f"[!] Excepción al usar Anti-Captcha: {e}")
-        return None
+    print("[+] Enviando CAPTCHA a Anti-Captcha API...")
+    return obtener_cliente_captcha().resolver(imagen)
 
 
 def resolver_captcha_manual(captcha_path):
@@ -125,6 +62,67 @@ def resolver_captcha_manual(captcha_path):
     return captcha_value_container["value"]
 
 
+def solicitar_captcha(driver, captcha_element_id="Capcha_CaptchaImageUP", tiempos=None):
+    """
+    Captura la imagen del CAPTCHA y la envía a resolver sin esperar la respuesta
+    
+    Permite prellenar tipo y número (form_api.prellenar_formulario) mientras
+    Anti-Captcha trabaja. Deja el driver dentro del iframe que contiene el
+    CAPTCHA.
+    
+    Args:
+        driver: WebDriver de Selenium
+        captcha_element_id: ID del elemento CAPTCHA
+        tiempos: Diccionario etapa -> segundos de la consulta (opcional)
+    
+    Returns:
+        tuple: (Future con el texto o None, bytes de la imagen)
+    """
+    from selenium.webdriver.common.by import By
+    from form_api import encontrar_elemento_con_localizadores
+    from espera_api import esperar_imagen_cargada
+    
+    captcha_img = encontrar_elemento_con_localizadores(
+        driver,
+        [(By.ID, captcha_element_id)],
+        timeout=15,
+        campo=captcha_element_id,
+    )
+    if captcha_img is None:
+        raise RuntimeError("No se encontró la imagen del CAPTCHA")
+    
+    # Capturar antes de que termine de descargar daría una imagen vacía
+    if not esperar_imagen_cargada(driver, captcha_img, timeout=10, tiempos=tiempos):
+        print("[!] La imagen del CAPTCHA no terminó de cargar; se captura igual")
+    
+    imagen = captcha_img.screenshot_as_png
+    print("[+] CAPTCHA capturado, enviando a Anti-Captcha API...")
+    return obtener_cliente_captcha().enviar(imagen), imagen
+
+
+def esperar_captcha(futuro, imagen):
+    """
+    Espera el resultado de solicitar_captcha(); si falla, pide ayuda al operador
+    
+    Args:
+        futuro: Future devuelto por solicitar_captcha()
+        imagen: Bytes de la imagen (para la resolución manual)
+    
+    Returns:
+        str or None: Texto del CAPTCHA resuelto o None si se cancela
+    """
+    try:
+        captcha_value = futuro.result(CAPTCHA_TIMEOUT + 5)
+    except Exception as e:
+        print(f"[!] Excepción esperando el CAPTCHA: {e}")
+        captcha_value = None
+    
+    if not captcha_value:
+        captcha_value = _resolver_manual_desde_bytes(imagen)
+    
+    return captcha_value
+
+
 def resolver_captcha(driver, captcha_element_id="Capcha_CaptchaImageUP"):
     """
     Resuelve el CAPTCHA (automático o manual)
@@ -136,25 +134,41 @@ def resolver_captcha(driver, captcha_element_id="Capcha_CaptchaImageUP"):
     Returns:
         str or None: Texto del CAPTCHA resuelto o None si se cancela
     """
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    
-    wait = WebDriverWait(driver, 15)
+    futuro, imagen = solicitar_captcha(driver, captcha_element_id)
+    return esperar_captcha(futuro, imagen)
+
+
+def resolver_captcha_imagen(imagen):
+    """
+    Resuelve el CAPTCHA a partir de los bytes de la imagen (automático o manual)
     
-    # Capturar imagen del CAPTCHA
-    captcha_img = wait.until(EC.presence_of_element_located((By.ID, captcha_element_id)))
-    captcha_path = os.path.join(OUTPUT_DIR, "captcha_temp.png")
-    capturar_captcha(driver, captcha_img, captcha_path)
-    print(f"[+] CAPTCHA guardado en: {captcha_path}")
+    Args:
+        imagen: Bytes de la imagen del CAPTCHA
     
-    # Intentar resolver automáticamente
-    captcha_value = resolver_captcha_automatico(captcha_path)
+    Returns:
+        str or None: Texto del CAPTCHA resuelto o None si se cancela
+    """
+    captcha_value = resolver_captcha_bytes(imagen)
     
-    # Si falla, resolver manualmente
     if not captcha_value:
-        print("[!] Resolución automática falló. Mostrando GUI...")
+        captcha_value = _resolver_manual_desde_bytes(imagen)
+    
+    return captcha_value
+
+
+def _resolver_manual_desde_bytes(imagen):
+    """Muestra la GUI manual con una copia temporal (única por consulta) de la imagen"""
+    print("[!] Resolución automática falló. Mostrando GUI...")
+    captcha_path = os.path.join(OUTPUT_DIR, f"captcha_temp_{uuid.uuid4().hex}.png")
+    with open(captcha_path, "wb") as f:
+        f.write(imagen)
+    try:
         captcha_value = resolver_captcha_manual(captcha_path)
+    finally:
+        try:
+            os.remove(captcha_path)
+        except OSError:
+            pass
     
     if captcha_value is None:
         print("[!] Operador canceló la resolución del CAPTCHA.")
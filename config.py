@@ -9,15 +9,113 @@ OUTPUT_DIR = os.path.join(os.getcwd(), "adres_output")
 DEBUG_DIR = os.path.join(os.getcwd(), "debug")
 
 # URLs
-URL = "https://www.adres.gov.co/consulte-su-eps"
+URL = os.environ.get("ADRES_URL", "https://www.adres.gov.co/consulte-su-eps")
+# Formulario ASP.NET que la página de ADRES embebe en un iframe
+URL_FORMULARIO = os.environ.get(
+    "ADRES_URL_FORMULARIO",
+    "https://aplicaciones.adres.gov.co/bdua_internet/Pages/ConsultarAfiliadoWeb.aspx",
+)
 
 # Anti-Captcha API Key
-ANTICAPTCHA_API_KEY = "d057f1ebb8c4334baf6441dffb519a10"  # Reemplaza con tu API Key
+ANTICAPTCHA_API_KEY = os.environ.get("ANTICAPTCHA_API_KEY", "d057f1ebb8c4334baf6441dffb519a10")  # Reemplaza con tu API Key
+ANTICAPTCHA_URL = os.environ.get("ANTICAPTCHA_URL", "https://api.anti-captcha.com")
+CAPTCHA_TIMEOUT = int(os.environ.get("ADRES_CAPTCHA_TIMEOUT", "60"))
+CAPTCHA_WORKERS = int(os.environ.get("ADRES_CAPTCHA_WORKERS", "4"))
+# Sondeo de getTaskResult: tiempo de resolución supuesto antes de observar
+# alguno (el primer sondeo va al 80%) e intervalos mínimo y máximo (segundos)
+CAPTCHA_TIEMPO_INICIAL = float(os.environ.get("ADRES_CAPTCHA_TIEMPO_INICIAL", "5"))
+CAPTCHA_INTERVALO_MIN = float(os.environ.get("ADRES_CAPTCHA_INTERVALO_MIN", "0.5"))
+CAPTCHA_INTERVALO_MAX = float(os.environ.get("ADRES_CAPTCHA_INTERVALO_MAX", "5"))
 
 # Configuración por defecto
 DEFAULT_CEDULA = ""
 DEFAULT_TIMEOUT = 15
 
+# Esperas por eventos (WebDriverWait) en lugar de pausas fijas
+ESPERA_INTERVALO = float(os.environ.get("ADRES_ESPERA_INTERVALO", "0.1"))
+
+# Pool de navegadores reutilizables
+POOL_NAVEGADORES = int(os.environ.get("ADRES_POOL_NAVEGADORES", "2"))
+POOL_MAX_USOS = int(os.environ.get("ADRES_POOL_MAX_USOS", "25"))
+POOL_HEADLESS = os.environ.get("ADRES_POOL_HEADLESS", "1") != "0"
+POOL_TIMEOUT_PRESTAMO = int(os.environ.get("ADRES_POOL_TIMEOUT_PRESTAMO", "120"))
+
+# Escritura en el formulario: estadísticas por método (persisten entre reinicios)
+ESCRITURA_STATS_PATH = os.environ.get(
+    "ADRES_ESCRITURA_STATS", os.path.join(OUTPUT_DIR, "estadisticas_escritura.json")
+)
+# Segundos entre escrituras a disco de esas estadísticas (y una al salir)
+ESCRITURA_STATS_INTERVALO = float(os.environ.get("ADRES_ESCRITURA_STATS_INTERVALO", "30"))
+# En navegadores headless se escribe solo por JavaScript (sin eventos de teclado)
+ESCRITURA_SOLO_JS = os.environ.get("ADRES_ESCRITURA_SOLO_JS", "1" if POOL_HEADLESS else "0") != "0"
+
+# Motor de consulta: "selenium" (navegador) o "http" (requests sin navegador)
+MOTORES_CONSULTA = ("selenium", "http")
+MOTOR_CONSULTA = os.environ.get("ADRES_MOTOR", "selenium")
+HTTP_TIMEOUT = int(os.environ.get("ADRES_HTTP_TIMEOUT", "30"))
+HTTP_POOL_CONEXIONES = int(os.environ.get("ADRES_HTTP_POOL_CONEXIONES", "10"))
+
+# Caché de resultados (SQLite + LRU en memoria)
+CACHE_DB = os.environ.get("ADRES_CACHE_DB", os.path.join(OUTPUT_DIR, "cache_resultados.sqlite3"))
+CACHE_TTL_SEGUNDOS = int(os.environ.get("ADRES_CACHE_TTL", str(6 * 3600)))
+CACHE_LRU_CAPACIDAD = int(os.environ.get("ADRES_CACHE_LRU", "1000"))
+
+# Almacén de trabajos (estado de consultas y lotes): "sqlite" o "memoria"
+ALMACEN_BACKEND = os.environ.get("ADRES_ALMACEN", "sqlite")
+ALMACEN_DB = os.environ.get("ADRES_ALMACEN_DB", os.path.join(OUTPUT_DIR, "trabajos.sqlite3"))
+# Segundos que se conservan los trabajos terminados antes de desalojarlos
+ALMACEN_TTL_SEGUNDOS = int(os.environ.get("ADRES_ALMACEN_TTL", str(24 * 3600)))
+
+# Planificador: consultas simultáneas (por defecto, una por navegador del
+# pool) y tareas en espera por prioridad antes de responder 429
+PLANIFICADOR_TRABAJADORES = int(os.environ.get("ADRES_PLANIFICADOR_TRABAJADORES", str(POOL_NAVEGADORES)))
+PLANIFICADOR_COLA_MAX = int(os.environ.get("ADRES_PLANIFICADOR_COLA_MAX", "50"))
+
+# Limitador de tasa hacia ADRES (consultas por minuto, compartido por los
+# motores): aumento aditivo con cada éxito, reducción multiplicativa ante fallas
+LIMITADOR_TASA_INICIAL = float(os.environ.get("ADRES_LIMITADOR_TASA", "30"))
+LIMITADOR_TASA_MINIMA = float(os.environ.get("ADRES_LIMITADOR_TASA_MINIMA", "2"))
+LIMITADOR_TASA_MAXIMA = float(os.environ.get("ADRES_LIMITADOR_TASA_MAXIMA", "120"))
+LIMITADOR_INCREMENTO = float(os.environ.get("ADRES_LIMITADOR_INCREMENTO", "1"))
+LIMITADOR_FACTOR = float(os.environ.get("ADRES_LIMITADOR_FACTOR", "0.5"))
+LIMITADOR_RAFAGA = float(os.environ.get("ADRES_LIMITADOR_RAFAGA", str(POOL_NAVEGADORES)))
+LIMITADOR_ENFRIAMIENTO = float(os.environ.get("ADRES_LIMITADOR_ENFRIAMIENTO", "10"))
+
+# Almacén de artefactos direccionado por contenido (objetos + índice SQLite)
+ARTEFACTOS_DIR = os.environ.get("ADRES_ARTEFACTOS_DIR", os.path.join(OUTPUT_DIR, "artefactos"))
+ARTEFACTOS_DB = os.environ.get("ADRES_ARTEFACTOS_DB", os.path.join(ARTEFACTOS_DIR, "indice.sqlite3"))
+# Artefactos por consulta: "json-only", "json+html.gz" o "full" (json, html,
+# txt y screenshot). Compresión del HTML: "", "gzip" o "zstd" (requiere
+# zstandard); el perfil json+html.gz usa gzip si no se indica otra
+ARTEFACTOS_PERFIL = os.environ.get("ADRES_ARTEFACTOS", "full")
+ARTEFACTOS_COMPRESION = os.environ.get("ADRES_ARTEFACTOS_COMPRESION", "")
+ARTEFACTOS_NIVEL_COMPRESION = int(os.environ.get("ADRES_ARTEFACTOS_NIVEL", "6"))
+# Escrituras pendientes antes de que las consultas esperen al disco
+ARTEFACTOS_COLA_MAX = int(os.environ.get("ADRES_ARTEFACTOS_COLA_MAX", "64"))
+
+# Server-Sent Events: relectura del almacén (cambios de otros procesos),
+# comentario keep-alive y espera a que aparezca el trabajo (segundos)
+EVENTOS_ESPERA = float(os.environ.get("ADRES_EVENTOS_ESPERA", "1.0"))
+EVENTOS_PING = float(os.environ.get("ADRES_EVENTOS_PING", "15"))
+EVENTOS_ESPERA_INICIAL = float(os.environ.get("ADRES_EVENTOS_ESPERA_INICIAL", "10"))
+
+# Métricas: límites (segundos) de los buckets de los histogramas por etapa
+METRICAS_BUCKETS = [
+    float(limite) for limite in
+    os.environ.get("ADRES_METRICAS_BUCKETS", "0.05,0.1,0.25,0.5,1,2.5,5,10,20,30,60,120").split(",")
+    if limite.strip()
+]
+
+# Consultas masivas
+LOTE_CONCURRENCIA = int(os.environ.get("ADRES_LOTE_CONCURRENCIA", str(POOL_NAVEGADORES)))
+MAX_UPLOAD_MB = int(os.environ.get("ADRES_MAX_UPLOAD_MB", "256"))
+# Filas por bloque en la validación vectorizada previa al despacho
+VALIDACION_BLOQUE = int(os.environ.get("ADRES_VALIDACION_BLOQUE", "20000"))
+# Bitácoras append-only (NDJSON) por lote para reanudar tras una caída
+LOTE_BITACORA_DIR = os.environ.get("ADRES_LOTE_BITACORA_DIR", os.path.join(OUTPUT_DIR, "bitacoras"))
+
 # Crear directorios si no existen
 os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(DEBUG_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(DEBUG_DIR, exist_ok=True)
+os.makedirs(LOTE_BITACORA_DIR, exist_ok=True)
+os.makedirs(ARTEFACTOS_DIR, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# escritor_api.py
+"""Escritura de artefactos de resultados en segundo plano (cola acotada y compresión)"""
+
+import os
+import gzip
+import time
+import queue
+import atexit
+import threading
+
+from config import ARTEFACTOS_COLA_MAX, ARTEFACTOS_NIVEL_COMPRESION, ARTEFACTOS_COMPRESION
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete se usa gzip
+    zstandard = None
+
+
+EXTENSIONES_COMPRESION = {"gzip": ".gz", "zstd": ".zst"}
+
+_aviso_zstd = threading.Event()
+
+
+def compresion_disponible(compresion):
+    """
+    Devuelve la compresión utilizable ("zstd" cae a "gzip" si falta el
+    paquete; el aviso se muestra una sola vez)
+    """
+    if compresion == "zstd" and zstandard is None:
+        if not _aviso_zstd.is_set():
+            _aviso_zstd.set()
+            print("[!] zstandard no está instalado; se usa gzip")
+        return "gzip"
+    return compresion if compresion in EXTENSIONES_COMPRESION else ""
+
+
+# Compresión configurada (ADRES_ARTEFACTOS_COMPRESION), resuelta al importar
+COMPRESION_ARTEFACTOS = compresion_disponible(ARTEFACTOS_COMPRESION)
+
+
+def comprimir(datos, compresion, nivel=ARTEFACTOS_NIVEL_COMPRESION):
+    """Comprime bytes con gzip o zstd (sin compresión si compresion es vacío)"""
+    if compresion == "gzip":
+        # mtime fijo: el mismo contenido produce el mismo archivo
+        return gzip.compress(datos, compresslevel=nivel, mtime=0)
+    if compresion == "zstd":
+        return zstandard.ZstdCompressor(level=nivel).compress(datos)
+    return datos
+
+
+class EscritorArtefactos:
+    """
+    Hilo que escribe en disco los artefactos de cada consulta
+
+    La consulta entrega los datos ya en memoria (HTML, JSON, PNG) y sigue;
+    si la cola se llena, quien encola espera (así el disco lento frena a las
+    consultas en lugar de acumular memoria). Si la ruta ya existe no se
+    reescribe: en el almacén por contenido es el mismo objeto. Lleva bytes
+    escritos y latencia por tipo de artefacto.
+    """
+
+    def __init__(self, capacidad=ARTEFACTOS_COLA_MAX):
+        self._cola = queue.Queue(maxsize=max(1, capacidad))
+        self._condicion = threading.Condition()
+        self._pendientes = {}
+        self._stats = {}
+
+        self._hilo = threading.Thread(target=self._trabajar, name="escritor-artefactos", daemon=True)
+        self._hilo.start()
+
+    def escribir(self, tipo, ruta, datos, compresion=""):
+        """
+        Encola la escritura de un artefacto
+
+        Args:
+            tipo: Tipo de artefacto para las estadísticas (html, json, ...)
+            ruta: Ruta final del archivo (con la extensión de la compresión)
+            datos: Contenido en str (se guarda en UTF-8) o bytes
+            compresion: "", "gzip" o "zstd"
+        """
+        with self._condicion:
+            self._pendientes[ruta] = self._pendientes.get(ruta, 0) + 1
+        self._cola.put((tipo, ruta, datos, compresion, time.perf_counter()))
+
+    def _trabajar(self):
+        while True:
+            tipo, ruta, datos, compresion, encolado = self._cola.get()
+            inicio = time.perf_counter()
+            error = False
+            existente = os.path.exists(ruta)
+            try:
+                if not existente:
+                    if isinstance(datos, str):
+                        datos = datos.encode("utf-8")
+                    datos = comprimir(datos, compresion)
+                    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                    temporal = f"{ruta}.{threading.get_ident()}.tmp"
+                    with open(temporal, "wb") as f:
+                        f.write(datos)
+                    # Nunca se sirve un archivo a medio escribir
+                    os.replace(temporal, ruta)
+            except Exception as e:
+                error = True
+                print(f"[!] No se pudo escribir {ruta}: {e}")
+            finally:
+                fin = time.perf_counter()
+                with self._condicion:
+                    stats = self._stats.setdefault(tipo, {
+                        "archivos": 0, "errores": 0, "deduplicados": 0, "bytes": 0,
+                        "escritura_total": 0.0, "escritura_maxima": 0.0, "cola_total": 0.0,
+                    })
+                    if error:
+                        stats["errores"] += 1
+                    elif existente:
+                        stats["deduplicados"] += 1
+                    else:
+                        stats["archivos"] += 1
+                        stats["bytes"] += len(datos)
+                    stats["escritura_total"] += fin - inicio
+                    stats["escritura_maxima"] = max(stats["escritura_maxima"], fin - inicio)
+                    stats["cola_total"] += inicio - encolado
+
+                    restantes = self._pendientes.get(ruta, 1) - 1
+                    if restantes:
+                        self._pendientes[ruta] = restantes
+                    else:
+                        self._pendientes.pop(ruta, None)
+                    self._condicion.notify_all()
+                self._cola.task_done()
+
+    def esperar_archivo(self, ruta, timeout=10):
+        """
+        Espera a que no queden escrituras pendientes de una ruta
+
+        Returns:
+            bool: True si la ruta ya no tiene escrituras pendientes
+        """
+        with self._condicion:
+            return self._condicion.wait_for(lambda: ruta not in self._pendientes, timeout)
+
+    def esperar(self):
+        """Bloquea hasta vaciar la cola (ej. antes de terminar el proceso)"""
+        self._cola.join()
+
+    def estadisticas(self):
+        """Archivos, bytes y latencias (ms) de escritura por tipo de artefacto"""
+        with self._condicion:
+            copia = {tipo: dict(stats) for tipo, stats in self._stats.items()}
+            pendientes = sum(self._pendientes.values())
+
+        por_tipo = {}
+        for tipo, stats in copia.items():
+            escritos = max(stats["archivos"] + stats["errores"] + stats["deduplicados"], 1)
+            por_tipo[tipo] = {
+                "archivos": stats["archivos"],
+                "errores": stats["errores"],
+                "deduplicados": stats["deduplicados"],
+                "bytes": stats["bytes"],
+                "bytes_medio": round(stats["bytes"] / max(stats["archivos"], 1)),
+                "escritura_media_ms": round(stats["escritura_total"] * 1000 / escritos, 2),
+                "escritura_maxima_ms": round(stats["escritura_maxima"] * 1000, 2),
+                "cola_media_ms": round(stats["cola_total"] * 1000 / escritos, 2),
+            }
+        return {"pendientes": pendientes, "por_tipo": por_tipo}
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def obtener_escritor():
+    """Devuelve el escritor global (se crea al primer uso y se vacía al salir)"""
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None:
+            _escritor = EscritorArtefactos()
+            atexit.register(_escritor.esperar)
+        return _escritor
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# espera_api.py
+"""Esperas por eventos del navegador (WebDriverWait) con tiempos por etapa"""
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+
+from config import ESPERA_INTERVALO, DEFAULT_TIMEOUT
+from metricas_api import medir_etapa
+
+
+FILAS_DATAGRID = "tr.DataGrid_Item, tr.DataGrid_AlternatingItem"
+
+
+def _esperar(driver, condicion, timeout):
+    return WebDriverWait(
+        driver,
+        timeout,
+        poll_frequency=ESPERA_INTERVALO,
+        ignored_exceptions=(StaleElementReferenceException,),
+    ).until(condicion)
+
+
+def esperar_condicion(driver, condicion, etapa, timeout=DEFAULT_TIMEOUT, tiempos=None):
+    """
+    Espera una condición arbitraria sin lanzar excepción por timeout
+
+    Args:
+        driver: WebDriver de Selenium
+        condicion: Callable(driver) que devuelve un valor verdadero al cumplirse
+        etapa: Nombre de la espera; se mide como la etapa "espera_<etapa>"
+        timeout: Segundos máximos de espera
+        tiempos: Diccionario de tiempos por etapa de la consulta (opcional)
+
+    Returns:
+        El valor devuelto por la condición, o None si se agotó el tiempo
+    """
+    with medir_etapa(f"espera_{etapa}", tiempos):
+        try:
+            return _esperar(driver, condicion, timeout)
+        except TimeoutException:
+            return None
+
+
+def _documento_completo(driver):
+    try:
+        return driver.execute_script("return document.readyState") == "complete"
+    except Exception:
+        return False
+
+
+def esperar_documento_listo(driver, timeout=DEFAULT_TIMEOUT, tiempos=None, etapa="documento_listo"):
+    """Espera a que document.readyState sea 'complete' en el contexto actual"""
+    return bool(esperar_condicion(driver, _documento_completo, etapa, timeout, tiempos))
+
+
+def esperar_nueva_ventana(driver, ventanas_anteriores, timeout=DEFAULT_TIMEOUT, tiempos=None):
+    """
+    Espera a que se abra una ventana que no estaba en ventanas_anteriores
+
+    Returns:
+        str or None: Handle de la ventana nueva o None si no apareció
+    """
+    def _ventana_nueva(driver):
+        for handle in driver.window_handles:
+            if handle not in ventanas_anteriores:
+                return handle
+        return None
+
+    return esperar_condicion(driver, _ventana_nueva, "nueva_ventana", timeout, tiempos)
+
+
+def esperar_resultados(driver, timeout=10, tiempos=None):
+    """
+    Espera a que la página de resultados esté lista
+
+    Termina en cuanto aparece una fila del DataGrid de afiliación o, si la
+    persona no tiene afiliaciones, cuando el documento terminó de cargar y ya
+    tiene alguna tabla.
+
+    Returns:
+        bool: True si la página quedó lista antes del timeout
+    """
+    def _resultados_listos(driver):
+        if driver.find_elements(By.CSS_SELECTOR, FILAS_DATAGRID):
+            return True
+        return _documento_completo(driver) and bool(driver.find_elements(By.TAG_NAME, "table"))
+
+    return bool(esperar_condicion(driver, _resultados_listos, "resultados", timeout, tiempos))
+
+
+def esperar_imagen_cargada(driver, elemento, timeout=DEFAULT_TIMEOUT, tiempos=None):
+    """Espera a que una <img> termine de descargarse (complete y con ancho)"""
+    def _imagen_cargada(driver):
+        return driver.execute_script(
+            "return arguments[0].complete && arguments[0].naturalWidth > 0;", elemento
+        )
+
+    return bool(esperar_condicion(driver, _imagen_cargada, "imagen_captcha", timeout, tiempos))
+
+
+def esperar_valor(driver, elemento, valor, etapa, timeout=5, tiempos=None):
+    """Espera a que el value de un input (o select) sea exactamente valor"""
+    def _valor_aplicado(driver):
+        actual = driver.execute_script("return arguments[0].value;", elemento)
+        return str(actual).strip() == str(valor)
+
+    return bool(esperar_condicion(driver, _valor_aplicado, etapa, timeout, tiempos))
+
+
+def esperar_clicable(driver, elemento, timeout=5, tiempos=None):
+    """Espera a que un elemento sea visible y esté habilitado para hacer click"""
+    return esperar_condicion(driver, EC.element_to_be_clickable(elemento), "clicable", timeout, tiempos)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# eventos_api.py
+"""Streams de Server-Sent Events con el avance de consultas y lotes"""
+
+import json
+import time
+
+from almacen_api import CONSULTA, LOTE, ESTADOS_FINALES
+from config import EVENTOS_ESPERA, EVENTOS_PING, EVENTOS_ESPERA_INICIAL
+
+
+def formatear_evento(evento, datos, evento_id=None):
+    """Arma un mensaje SSE (event/id/data) terminado en línea vacía"""
+    lineas = [f"event: {evento}"]
+    if evento_id is not None:
+        lineas.append(f"id: {evento_id}")
+    lineas.append("data: " + json.dumps(datos, ensure_ascii=False))
+    return "\n".join(lineas) + "\n\n"
+
+
+def _cambios(almacen, tipo, trabajo_id):
+    """
+    Genera el estado del trabajo cada vez que cambia en el almacén
+
+    Se despierta con cada escritura de ese trabajo en el proceso y, como
+    máximo, cada EVENTOS_ESPERA segundos (cambios de otros procesos). Genera None cuando
+    pasa EVENTOS_PING sin cambios, para mantener viva la conexión, y termina
+    si el trabajo no aparece en EVENTOS_ESPERA_INICIAL segundos.
+    """
+    with almacen.suscribir(tipo, trabajo_id) as suscripcion:
+        version = suscripcion.version
+        anterior = None
+        visto = False
+        inicio = ultimo_envio = time.time()
+
+        while True:
+            estado = almacen.obtener(tipo, trabajo_id)
+            if estado is None and not visto and time.time() - inicio > EVENTOS_ESPERA_INICIAL:
+                return
+
+            if estado is not None:
+                visto = True
+                serializado = json.dumps(estado, sort_keys=True, ensure_ascii=False)
+                if serializado != anterior:
+                    anterior = serializado
+                    ultimo_envio = time.time()
+                    yield estado
+                    if estado.get("estado") in ESTADOS_FINALES:
+                        return
+
+            if time.time() - ultimo_envio >= EVENTOS_PING:
+                ultimo_envio = time.time()
+                yield None
+
+            version = suscripcion.esperar_cambio(version, EVENTOS_ESPERA)
+
+
+def eventos_consulta(almacen, consulta_id):
+    """
+    Stream SSE de una consulta individual: un evento "estado" por cada
+    transición (iniciando, captcha, llenando, enviando, capturando...) y
+    "fin" al terminar ("no_encontrado" si la consulta no existe; el nombre
+    "error" lo reserva EventSource para las fallas de conexión)
+    """
+    encontrado = False
+    for estado in _cambios(almacen, CONSULTA, consulta_id):
+        if estado is None:
+            yield ": ping\n\n"
+            continue
+        encontrado = True
+        yield formatear_evento("estado", estado)
+
+    if encontrado:
+        yield formatear_evento("fin", {})
+    else:
+        yield formatear_evento("no_encontrado", {"error": "Consulta no encontrada"})
+
+
+def eventos_lote(almacen, lote_id, desde=0):
+    """
+    Stream SSE de un lote: "estado" con el resumen (sin resultados) cuando
+    cambia y un "resultado" por cada fila nueva, con id = secuencia para que
+    el navegador reanude con Last-Event-ID si la conexión se corta
+
+    Args:
+        almacen: Almacén de trabajos
+        lote_id: ID del lote
+        desde: Secuencia del último resultado que el cliente ya tiene
+    """
+    encontrado = False
+    for estado in _cambios(almacen, LOTE, lote_id):
+        if estado is None:
+            yield ": ping\n\n"
+            continue
+        encontrado = True
+
+        if "procesados" in estado:
+            for resultado in almacen.resultados(lote_id, desde=desde):
+                desde = max(desde, resultado["secuencia"])
+                yield formatear_evento("resultado", resultado, evento_id=resultado["secuencia"])
+        yield formatear_evento("estado", dict(estado, siguiente_desde=desde))
+
+    if encontrado:
+        yield formatear_evento("fin", {})
+    else:
+        yield formatear_evento("no_encontrado", {"error": "Lote no encontrado"})
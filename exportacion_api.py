@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# exportacion_api.py
+"""Exportación de los resultados de un lote (JSON, NDJSON, CSV, XLSX, ZIP) por partes"""
+
+import io
+import os
+import csv
+import json
+import zlib
+import tempfile
+
+from lote_api import ruta_bitacora, leer_bitacora
+from zip_api import EntradaZip
+from escritor_api import obtener_escritor
+from artefactos_api import obtener_artefactos
+from results_api import EXTENSIONES_ARTEFACTOS
+
+
+FORMATOS_EXPORTACION = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "zip": "application/zip",
+}
+
+# Una fila por afiliación; los resultados sin afiliaciones ocupan una fila
+COLUMNAS_PLANAS = [
+    "fila", "tipo_doc", "numero_doc", "estado", "mensaje", "desde_cache", "duplicado_de",
+    "nombres", "apellidos", "fecha_nacimiento", "departamento", "municipio",
+    "afiliacion_estado", "entidad", "regimen", "fecha_afiliacion", "fecha_finalizacion",
+    "tipo_afiliado",
+]
+
+# Resultados acumulados antes de entregar un bloque de texto al cliente
+_FILAS_POR_BLOQUE = 500
+
+
+def resultados_lote(lote_id):
+    """
+    Resultados de un lote en el orden del archivo, leídos de su bitácora
+
+    Returns:
+        list or None: Resultados, o None si el lote no tiene bitácora
+    """
+    ruta = ruta_bitacora(lote_id)
+    if not os.path.exists(ruta):
+        return None
+    _, resultados = leer_bitacora(ruta)
+    return [resultados[fila] for fila in sorted(resultados)]
+
+
+def filas_planas(resultado):
+    """Convierte un resultado en filas planas (una por afiliación)"""
+    datos = resultado.get("datos") or {}
+    basica = datos.get("informacion_basica") or {}
+    base = {
+        "fila": resultado.get("fila"),
+        "tipo_doc": resultado.get("tipo_doc"),
+        "numero_doc": resultado.get("numero_doc"),
+        "estado": resultado.get("estado"),
+        "mensaje": resultado.get("mensaje"),
+        "desde_cache": resultado.get("desde_cache", False),
+        "duplicado_de": resultado.get("duplicado_de"),
+        "nombres": basica.get("nombres"),
+        "apellidos": basica.get("apellidos"),
+        "fecha_nacimiento": basica.get("fecha_nacimiento"),
+        "departamento": basica.get("departamento"),
+        "municipio": basica.get("municipio"),
+    }
+
+    afiliaciones = datos.get("datos_afiliacion") or [{}]
+    for afiliacion in afiliaciones:
+        fila = dict(base)
+        fila.update({
+            "afiliacion_estado": afiliacion.get("estado"),
+            "entidad": afiliacion.get("entidad"),
+            "regimen": afiliacion.get("regimen"),
+            "fecha_afiliacion": afiliacion.get("fecha_afiliacion"),
+            "fecha_finalizacion": afiliacion.get("fecha_finalizacion"),
+            "tipo_afiliado": afiliacion.get("tipo_afiliado"),
+        })
+        yield [fila[columna] for columna in COLUMNAS_PLANAS]
+
+
+def _por_bloques(resultados, convertir):
+    """Agrupa el texto de varios resultados para no entregar línea a línea"""
+    bloque = []
+    for indice, resultado in enumerate(resultados, 1):
+        bloque.append(convertir(resultado))
+        if indice % _FILAS_POR_BLOQUE == 0:
+            yield "".join(bloque)
+            bloque = []
+    if bloque:
+        yield "".join(bloque)
+
+
+def generar_ndjson(resultados):
+    """Genera el lote como NDJSON, un resultado por línea"""
+    return _por_bloques(resultados, lambda r: json.dumps(r, ensure_ascii=False) + "\n")
+
+
+def generar_json(resultados):
+    """Genera el lote como un arreglo JSON sin armarlo completo en memoria"""
+    yield "["
+    primero = True
+    for bloque in _por_bloques(resultados, lambda r: ",\n" + json.dumps(r, ensure_ascii=False)):
+        if primero:
+            bloque = bloque[2:]
+            primero = False
+        yield bloque
+    yield "]\n"
+
+
+def generar_csv(resultados):
+    """Genera el lote como CSV plano (una fila por afiliación)"""
+    def _convertir(resultado):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(filas_planas(resultado))
+        return buffer.getvalue()
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(COLUMNAS_PLANAS)
+    yield "\ufeff" + buffer.getvalue()  # BOM para que Excel detecte UTF-8
+    yield from _por_bloques(resultados, _convertir)
+
+
+def escribir_xlsx(resultados, destino):
+    """
+    Escribe el lote plano en un .xlsx con openpyxl en modo write_only
+    (memoria constante sin importar el número de filas)
+
+    Raises:
+        ImportError: Si openpyxl no está instalado
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("resultados")
+    hoja.append(COLUMNAS_PLANAS)
+    for resultado in resultados:
+        for fila in filas_planas(resultado):
+            hoja.append(fila)
+    libro.save(destino)
+
+
+def generar_xlsx(resultados, tamano_bloque=64 * 1024):
+    """
+    Escribe el .xlsx del lote en un archivo temporal y devuelve un generador
+    que lo entrega por bloques
+
+    El libro se escribe antes de devolver el generador, así un ImportError
+    (openpyxl no instalado) llega antes de empezar la respuesta.
+    """
+    temporal = tempfile.TemporaryFile()
+    try:
+        escribir_xlsx(resultados, temporal)
+    except Exception:
+        temporal.close()
+        raise
+    temporal.seek(0)
+
+    def _bloques():
+        with temporal:
+            while True:
+                bloque = temporal.read(tamano_bloque)
+                if not bloque:
+                    break
+                yield bloque
+
+    return _bloques()
+
+
+class _LectorGenerado:
+    """Adapta un generador de bytes a un objeto con read(n)"""
+
+    def __init__(self, bloques):
+        self._bloques = iter(bloques)
+        self._pendiente = b""
+
+    def read(self, cantidad):
+        while len(self._pendiente) < cantidad:
+            bloque = next(self._bloques, None)
+            if bloque is None:
+                break
+            self._pendiente += bloque
+        datos, self._pendiente = self._pendiente[:cantidad], self._pendiente[cantidad:]
+        return datos
+
+
+def _entrada_ndjson(nombre, resultados):
+    """
+    Consolidado NDJSON como entrada del ZIP: una pasada previa calcula su
+    tamaño y CRC, y el contenido se vuelve a generar al transmitirlo
+    """
+    def _bloques():
+        for bloque in generar_ndjson(resultados):
+            yield bloque.encode("utf-8")
+
+    tamano = crc = 0
+    for bloque in _bloques():
+        tamano += len(bloque)
+        crc = zlib.crc32(bloque, crc)
+    return EntradaZip(nombre, tamano, lambda: _LectorGenerado(_bloques()), crc=crc)
+
+
+def entradas_zip(lote_id, resultados):
+    """
+    Entradas del ZIP de un lote: el consolidado NDJSON y, por cada documento,
+    sus artefactos (HTML, JSON, TXT, PNG) resueltos por el índice
+
+    Los objetos comprimidos se incluyen tal cual, con su extensión (.html.gz).
+    Los documentos repetidos en el lote aparecen una sola vez. Cada fila se
+    resuelve con la marca de su propia consulta: una consulta posterior del
+    mismo documento no cambia el ZIP (ni su ETag) a mitad de una descarga.
+
+    Returns:
+        list: EntradaZip en orden de fila
+    """
+    artefactos = obtener_artefactos()
+    escritor = obtener_escritor()
+    entradas = [_entrada_ndjson(f"lote_{lote_id}.ndjson", resultados)]
+    nombres = set()
+
+    for resultado in resultados:
+        nombre_archivo = resultado.get("nombre_archivo")
+        if not nombre_archivo or nombre_archivo in nombres:
+            continue
+        nombres.add(nombre_archivo)
+
+        for tipo in sorted(resultado.get("archivos") or {}):
+            if tipo not in EXTENSIONES_ARTEFACTOS:
+                continue
+            artefacto = artefactos.resolver(nombre_archivo, tipo, resultado.get("marca"))
+            if artefacto is None:
+                continue
+            ruta = artefacto["ruta"]
+            escritor.esperar_archivo(ruta)
+            if not os.path.exists(ruta):
+                continue
+            extension = ruta[len(artefactos.ruta_objeto(artefacto["hash"], "")):]
+            entradas.append(EntradaZip(
+                f"{nombre_archivo}/resultado_{nombre_archivo}{extension}",
+                os.path.getsize(ruta),
+                lambda ruta=ruta: open(ruta, "rb"),
+                clave_crc=ruta,
+            ))
+    return entradas
+
+
+GENERADORES = {
+    "json": generar_json,
+    "ndjson": generar_ndjson,
+    "csv": generar_csv,
+    "xlsx": generar_xlsx,
+}
@@ -2,7 +2,13 @@
 # form_api.py
 """API para interacción con formularios web"""
 
+import os
+import json
 import time
+import atexit
+import weakref
+import tempfile
+import threading
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import (
@@ -12,54 +18,143 @@ from selenium.common.exceptions import (
     NoSuchFrameException,
 )
 from selenium.webdriver import ActionChains
-from config import DEBUG_DIR
+from config import DEBUG_DIR, ESPERA_INTERVALO, ESCRITURA_STATS_PATH, ESCRITURA_STATS_INTERVALO
 from browser_api import guardar_debug
+from espera_api import esperar_valor, esperar_clicable
 
 
-def _buscar_elemento_en_contexto(
-    driver,
-    locators,
-    timeout,
-    max_profundidad=6,
-    _profundidad=0,
-    _visitados=None,
-):
-    """Busca un elemento manejando iframes y tiempos de carga variables."""
+# Caché de resolución por navegador: campo -> (ruta de índices de iframe, localizador)
+_rutas_por_driver = weakref.WeakKeyDictionary()
+_rutas_lock = threading.Lock()
+_stats_localizadores = {}
 
-    if _visitados is None:
-        _visitados = set()
 
-    if _profundidad == 0:
-        limite = time.time() + timeout
-        ultimo_error = None
-        while time.time() < limite:
-            driver.switch_to.default_content()
-            try:
-                elemento = _buscar_elemento_en_contexto(
-                    driver,
-                    locators,
-                    timeout=0,
-                    max_profundidad=max_profundidad,
-                    _profundidad=1,
-                    _visitados=set(),
-                )
-                if elemento:
-                    try:
-                        if elemento.is_displayed() and elemento.is_enabled():
-                            return elemento
-                    except StaleElementReferenceException as exc:
-                        ultimo_error = exc
-                else:
-                    ultimo_error = None
-            except Exception as exc:  # pylint: disable=broad-except
-                ultimo_error = exc
-            time.sleep(0.5)
-
-        if ultimo_error:
-            raise ultimo_error
+def _registrar_resolucion(campo, resultado):
+    """Cuenta aciertos, fallos e invalidaciones de la caché por campo"""
+    with _rutas_lock:
+        stats = _stats_localizadores.setdefault(
+            str(campo), {"hits": 0, "misses": 0, "invalidaciones": 0}
+        )
+        stats[resultado] += 1
+
+
+def estadisticas_localizadores():
+    """Aciertos de la caché de rutas de iframe y localizador ganador por campo"""
+    with _rutas_lock:
+        stats = {campo: dict(valores) for campo, valores in _stats_localizadores.items()}
+        for rutas in _rutas_por_driver.values():
+            for campo, (ruta, locator) in rutas.items():
+                if str(campo) in stats:
+                    stats[str(campo)]["ruta_iframes"] = list(ruta)
+                    stats[str(campo)]["localizador"] = list(locator)
+    return stats
+
+
+def _ruta_en_cache(driver, campo):
+    with _rutas_lock:
+        return _rutas_por_driver.get(driver, {}).get(campo)
+
+
+def _guardar_ruta(driver, campo, ruta, locator):
+    with _rutas_lock:
+        _rutas_por_driver.setdefault(driver, {})[campo] = (tuple(ruta), locator)
+
+
+def _invalidar_ruta(driver, campo):
+    with _rutas_lock:
+        _rutas_por_driver.get(driver, {}).pop(campo, None)
+    _registrar_resolucion(campo, "invalidaciones")
+
+
+def _elemento_utilizable(elemento):
+    try:
+        return elemento.is_displayed() and elemento.is_enabled()
+    except StaleElementReferenceException:
+        return False
+
+
+def _resolver_desde_cache(driver, campo, max_profundidad):
+    """
+    Salta directo al iframe guardado y prueba el localizador ganador
+
+    Si algún iframe de la ruta ya no existe o el localizador no encuentra un
+    elemento utilizable (la página cambió), la entrada se invalida.
+    """
+    entrada = _ruta_en_cache(driver, campo)
+    if entrada is None or len(entrada[0]) >= max_profundidad:
         return None
 
-    # En niveles recursivos no necesitamos bucle de tiempo porque el nivel 0 ya lo maneja
+    ruta, locator = entrada
+    try:
+        for indice in ruta:
+            iframes = driver.find_elements(By.CSS_SELECTOR, "iframe,frame")
+            driver.switch_to.frame(iframes[indice])
+        for elemento in driver.find_elements(*locator):
+            if _elemento_utilizable(elemento):
+                _registrar_resolucion(campo, "hits")
+                return elemento
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+    _invalidar_ruta(driver, campo)
+    driver.switch_to.default_content()
+    return None
+
+
+def _buscar_elemento_en_contexto(driver, locators, timeout, max_profundidad=6, campo=None):
+    """
+    Busca un elemento manejando iframes y tiempos de carga variables.
+
+    Primero intenta la ruta de iframes y el localizador que funcionaron la
+    última vez para el mismo campo en este navegador; solo si falla recorre
+    todos los iframes.
+
+    Args:
+        campo: Nombre lógico del campo para la caché (por defecto, los localizadores)
+    """
+    campo = campo if campo is not None else tuple(locators)
+    limite = time.time() + timeout
+    ultimo_error = None
+    buscado = False
+    while not buscado or time.time() < limite:
+        buscado = True
+        driver.switch_to.default_content()
+
+        elemento = _resolver_desde_cache(driver, campo, max_profundidad)
+        if elemento:
+            return elemento
+
+        try:
+            encontrado = _buscar_en_frames(
+                driver,
+                locators,
+                max_profundidad=max_profundidad,
+                profundidad=1,
+                visitados=set(),
+                ruta=[],
+            )
+            if encontrado:
+                elemento, ruta, locator = encontrado
+                _guardar_ruta(driver, campo, ruta, locator)
+                _registrar_resolucion(campo, "misses")
+                return elemento
+            ultimo_error = None
+        except Exception as exc:  # pylint: disable=broad-except
+            ultimo_error = exc
+        time.sleep(ESPERA_INTERVALO)
+
+    if ultimo_error:
+        raise ultimo_error
+    return None
+
+
+def _buscar_en_frames(driver, locators, max_profundidad, profundidad, visitados, ruta):
+    """
+    Recorrido recursivo por el contexto actual y sus iframes
+
+    Returns:
+        tuple or None: (elemento, ruta de índices de iframe, localizador)
+    """
     for locator in locators:
         try:
             elementos = driver.find_elements(*locator)
@@ -67,13 +162,10 @@ def _buscar_elemento_en_contexto(
             elementos = []
 
         for elemento in elementos:
-            try:
-                if elemento.is_displayed() and elemento.is_enabled():
-                    return elemento
-            except StaleElementReferenceException:
-                continue
+            if _elemento_utilizable(elemento):
+                return elemento, ruta, locator
 
-    if _profundidad >= max_profundidad:
+    if profundidad >= max_profundidad:
         return None
 
     try:
@@ -82,20 +174,10 @@ def _buscar_elemento_en_contexto(
         iframes = []
 
     for indice, iframe in enumerate(iframes):
-        try:
-            clave = (
-                _profundidad,
-                iframe.id,
-                iframe.get_attribute("id"),
-                iframe.get_attribute("name"),
-                indice,
-            )
-        except StaleElementReferenceException:
+        # El id interno del WebElement identifica el iframe sin ir al navegador
+        if iframe.id in visitados:
             continue
-
-        if clave in _visitados:
-            continue
-        _visitados.add(clave)
+        visitados.add(iframe.id)
 
         try:
             driver.switch_to.frame(iframe)
@@ -109,13 +191,13 @@ def _buscar_elemento_en_contexto(
                 pass
             continue
 
-        encontrado = _buscar_elemento_en_contexto(
+        encontrado = _buscar_en_frames(
             driver,
             locators,
-            timeout=0,
             max_profundidad=max_profundidad,
-            _profundidad=_profundidad + 1,
-            _visitados=_visitados,
+            profundidad=profundidad + 1,
+            visitados=visitados,
+            ruta=ruta + [indice],
         )
         if encontrado:
             return encontrado
@@ -145,6 +227,7 @@ def verificar_iframe_con_elemento(driver, element_id="txtNumDoc"):
         driver,
         [(By.ID, element_id)],
         timeout=5,
+        campo=element_id,
     )
 
     if element:
@@ -154,7 +237,7 @@ def verificar_iframe_con_elemento(driver, element_id="txtNumDoc"):
     return False
 
 
-def encontrar_elemento_con_localizadores(driver, locators, timeout=30, buscar_en_iframes=True):
+def encontrar_elemento_con_localizadores(driver, locators, timeout=30, buscar_en_iframes=True, campo=None):
     """
     Intenta encontrar un elemento usando múltiples localizadores
     
@@ -162,6 +245,7 @@ def encontrar_elemento_con_localizadores(driver, locators, timeout=30, buscar_en
         driver: WebDriver de Selenium
         locators: Lista de tuplas (By, valor)
         timeout: Tiempo máximo de espera
+        campo: Nombre lógico del campo para reutilizar la ruta de iframes
     
     Returns:
         WebElement or None: Elemento encontrado o None
@@ -173,6 +257,7 @@ def encontrar_elemento_con_localizadores(driver, locators, timeout=30, buscar_en
         locators,
         timeout=timeout,
         max_profundidad=6 if buscar_en_iframes else 1,
+        campo=campo,
     )
 
     if elemento:
@@ -182,13 +267,14 @@ def encontrar_elemento_con_localizadores(driver, locators, timeout=30, buscar_en
     return None
 
 
-def seleccionar_tipo_documento(driver, tipo_documento="CC"):
+def seleccionar_tipo_documento(driver, tipo_documento="CC", tiempos=None):
     """
     Selecciona el tipo de documento en el dropdown del formulario
     
     Args:
         driver: WebDriver de Selenium
         tipo_documento: Código del tipo de documento (CC, TI, CE, PA, etc.)
+        tiempos: Diccionario etapa -> segundos de la consulta (opcional)
     
     Returns:
         bool: True si se seleccionó correctamente
@@ -218,6 +304,7 @@ def seleccionar_tipo_documento(driver, tipo_documento="CC"):
             locators,
             timeout=10,
             buscar_en_iframes=True,
+            campo="tipoDoc",
         )
         
         if not dropdown_element:
@@ -233,13 +320,8 @@ def seleccionar_tipo_documento(driver, tipo_documento="CC"):
         
         select.select_by_value(tipo_documento)
         
-        # Pequeña espera para que el cambio se procese
-        time.sleep(0.5)
-        
-        # Verificar que se seleccionó correctamente
-        selected_value = select.first_selected_option.get_attribute('value')
-        
-        if selected_value == tipo_documento:
+        # Esperar a que el valor quede aplicado en el select
+        if esperar_valor(driver, dropdown_element, tipo_documento, "tipo_documento", tiempos=tiempos):
             print(f"[+] Tipo de documento '{tipo_documento}' seleccionado correctamente")
             return True
         else:
@@ -256,11 +338,10 @@ def escribir_texto_metodo_1(driver, element, texto):
         element.click()
     except (ElementClickInterceptedException, ElementNotInteractableException):
         driver.execute_script("arguments[0].scrollIntoView({block:'center'});", element)
-        time.sleep(0.2)
+        esperar_clicable(driver, element)
         element.click()
     
     element.clear()
-    time.sleep(0.05)
     element.send_keys(texto)
     
     valor = driver.execute_script("return arguments[0].value;", element)
@@ -280,9 +361,12 @@ def escribir_texto_metodo_3(driver, element, texto):
     """Método 3: Carácter por carácter"""
     element.click()
     element.clear()
+    escrito = ""
     for char in texto:
         element.send_keys(char)
-        time.sleep(0.1)
+        escrito += char
+        # Esperar a que el carácter quede en el campo antes del siguiente
+        esperar_valor(driver, element, escrito, "caracter", timeout=1)
     
     valor = driver.execute_script("return arguments[0].value;", element)
     return str(valor).strip() == str(texto)
@@ -303,15 +387,139 @@ def escribir_texto_metodo_4(driver, element, texto):
     return str(valor).strip() == str(texto)
 
 
-def escribir_en_campo(driver, cedula, timeout=30, debug_folder=DEBUG_DIR):
+class _EstadisticasEscritura:
+    """
+    Éxitos, fallos y latencia por método de escritura, guardados en JSON
+
+    Los cambios se llevan a disco como mucho cada intervalo segundos y al
+    salir del proceso, con un temporal de nombre único y os.replace (varios
+    procesos pueden compartir la ruta sin pisarse el temporal). El orden de
+    los métodos se decide por costo esperado: latencia media dividida por
+    la tasa de éxito (suavizada, para que un método sin historial no quede
+    descartado). Empates conservan el orden original.
+    """
+
+    def __init__(self, ruta=ESCRITURA_STATS_PATH, intervalo=ESCRITURA_STATS_INTERVALO):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._stats = None
+        self._pendiente = False
+        self._ultimo_guardado = time.monotonic()
+
+    def _cargar(self):
+        if self._stats is not None:
+            return
+        self._stats = {}
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                self._stats = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _guardar(self):
+        self._pendiente = False
+        self._ultimo_guardado = time.monotonic()
+        try:
+            descriptor, temporal = tempfile.mkstemp(
+                prefix=os.path.basename(self.ruta) + ".", suffix=".tmp",
+                dir=os.path.dirname(self.ruta) or ".",
+            )
+            try:
+                with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                    json.dump(self._stats, f, indent=2)
+                os.replace(temporal, self.ruta)
+            except BaseException:
+                try:
+                    os.remove(temporal)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"[!] No se pudieron guardar las estadísticas de escritura: {e}")
+
+    def guardar(self):
+        """Lleva a disco los cambios pendientes (se llama también al salir)"""
+        with self._lock:
+            if self._pendiente:
+                self._guardar()
+
+    def _costo(self, nombre):
+        stats = self._stats.get(nombre)
+        if not stats:
+            return 0.0
+        intentos = stats["exitos"] + stats["fallos"]
+        tasa = (stats["exitos"] + 1) / (intentos + 2)
+        # Piso de 10 ms: un método que falla al instante tampoco es gratis
+        return max(stats["segundos"] / intentos, 0.01) / tasa
+
+    def ordenar(self, metodos):
+        """Devuelve los métodos (nombre, función) del más al menos conveniente"""
+        with self._lock:
+            self._cargar()
+            return sorted(metodos, key=lambda metodo: self._costo(metodo[0]))
+
+    def registrar(self, intentos):
+        """
+        Acumula los intentos de una escritura (se persisten periódicamente)
+
+        Args:
+            intentos: Lista de (nombre, exito, segundos)
+        """
+        with self._lock:
+            self._cargar()
+            for nombre, exito, segundos in intentos:
+                stats = self._stats.setdefault(nombre, {"exitos": 0, "fallos": 0, "segundos": 0.0})
+                stats["exitos" if exito else "fallos"] += 1
+                stats["segundos"] = round(stats["segundos"] + segundos, 4)
+            self._pendiente = True
+            if time.monotonic() - self._ultimo_guardado >= self.intervalo:
+                self._guardar()
+
+    def resumen(self):
+        with self._lock:
+            self._cargar()
+            resumen = {}
+            for nombre, stats in self._stats.items():
+                intentos = stats["exitos"] + stats["fallos"]
+                resumen[nombre] = {
+                    "exitos": stats["exitos"],
+                    "fallos": stats["fallos"],
+                    "latencia_media_segundos": round(stats["segundos"] / intentos, 3) if intentos else None,
+                }
+            return resumen
+
+
+_estadisticas_escritura = _EstadisticasEscritura()
+atexit.register(_estadisticas_escritura.guardar)
+
+METODOS_ESCRITURA = [
+    ("click_then_send", escribir_texto_metodo_1),
+    ("actionchains_send", escribir_texto_metodo_2),
+    ("char_by_char", escribir_texto_metodo_3),
+    ("js_set_value", escribir_texto_metodo_4)
+]
+
+
+def estadisticas_escritura():
+    """Éxitos, fallos y latencia media por método de escritura"""
+    return _estadisticas_escritura.resumen()
+
+
+def escribir_en_campo(driver, cedula, timeout=30, debug_folder=DEBUG_DIR, solo_js=False):
     """
     Escribe la cédula en el campo del formulario usando múltiples métodos
     
+    Los métodos se prueban empezando por el que mejor ha funcionado hasta
+    ahora (ver _EstadisticasEscritura).
+    
     Args:
         driver: WebDriver de Selenium
         cedula: Número de cédula a escribir
         timeout: Tiempo máximo de espera
         debug_folder: Carpeta para guardar información de debug
+        solo_js: Si True, escribe solo con JavaScript (modo rápido headless);
+            los demás métodos quedan como respaldo si el valor no se aplica
     
     Returns:
         bool: True si se escribió correctamente
@@ -319,7 +527,6 @@ def escribir_en_campo(driver, cedula, timeout=30, debug_folder=DEBUG_DIR):
     Raises:
         RuntimeError: Si no se pudo escribir después de todos los intentos
     """
-    import os
     os.makedirs(debug_folder, exist_ok=True)
 
     # Normalizar cédula (eliminar espacios y caracteres no numéricos comunes)
@@ -347,35 +554,45 @@ def escribir_en_campo(driver, cedula, timeout=30, debug_folder=DEBUG_DIR):
         locators,
         timeout,
         buscar_en_iframes=True,
+        campo="txtNumDoc",
     )
     
     if not el:
         screenshot, html = guardar_debug(driver, "no_element_present", debug_folder)
         raise RuntimeError(f"No se encontró el campo de cédula. Captura: {screenshot}")
 
-    # Métodos de escritura
-    metodos = [
-        ("click_then_send", escribir_texto_metodo_1),
-        ("actionchains_send", escribir_texto_metodo_2),
-        ("char_by_char", escribir_texto_metodo_3),
-        ("js_set_value", escribir_texto_metodo_4)
-    ]
+    # Métodos de escritura, del más al menos conveniente según el historial
+    if solo_js:
+        metodos = [metodo for metodo in METODOS_ESCRITURA if metodo[0] == "js_set_value"]
+        metodos += _estadisticas_escritura.ordenar(
+            [metodo for metodo in METODOS_ESCRITURA if metodo[0] != "js_set_value"]
+        )
+    else:
+        metodos = _estadisticas_escritura.ordenar(METODOS_ESCRITURA)
 
+    intentos = []
     last_exc = None
-    for nombre, metodo in metodos:
-        try:
-            if metodo(driver, el, cedula):
+    try:
+        for nombre, metodo in metodos:
+            inicio = time.perf_counter()
+            exito = False
+            try:
+                exito = metodo(driver, el, cedula)
+            except StaleElementReferenceException as e:
+                last_exc = e
+                try:
+                    el = driver.find_element(By.ID, "txtNumDoc")
+                except:
+                    pass
+            except Exception as e:
+                last_exc = e
+            intentos.append((nombre, exito, time.perf_counter() - inicio))
+            
+            if exito:
                 print(f"[+] Cédula escrita correctamente usando método: {nombre}")
                 return True
-        except StaleElementReferenceException as e:
-            last_exc = e
-            try:
-                el = driver.find_element(By.ID, "txtNumDoc")
-            except:
-                pass
-        except Exception as e:
-            last_exc = e
-        time.sleep(0.2)
+    finally:
+        _estadisticas_escritura.registrar(intentos)
 
     # Si llegamos aquí, ningún método funcionó
     screenshot, html = guardar_debug(driver, "write_failed", debug_folder)
@@ -385,6 +602,122 @@ def escribir_en_campo(driver, cedula, timeout=30, debug_folder=DEBUG_DIR):
     )
 
 
+_JS_LLENAR_FORMULARIO = """
+var valores = arguments[0];
+var leer = arguments[1] || Object.keys(valores);
+var campos = {};
+var ids = Object.keys(valores).concat(leer);
+for (var i = 0; i < ids.length; i++) {
+    campos[ids[i]] = document.getElementById(ids[i]);
+    if (!campos[ids[i]]) { return null; }
+}
+
+if ('tipoDoc' in valores) {
+    var opciones = Array.prototype.map.call(campos.tipoDoc.options, function (o) { return o.value; });
+    if (opciones.indexOf(valores.tipoDoc) < 0) { return {error: 'opcion', opciones: opciones}; }
+}
+
+function asignar(el, valor, cambio) {
+    el.focus();
+    el.value = valor;
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    if (cambio) { el.dispatchEvent(new Event('change', {bubbles: true})); }
+    el.blur();
+}
+
+for (var id in valores) {
+    // Un change en un select con AutoPostBack recargaría el formulario
+    var postback = /__doPostBack/.test(campos[id].getAttribute('onchange') || '');
+    asignar(campos[id], valores[id], !postback);
+}
+
+var resultado = {};
+for (var j = 0; j < leer.length; j++) { resultado[leer[j]] = campos[leer[j]].value; }
+return resultado;
+"""
+
+
+def _asignar_campos(driver, valores, esperados, tipo_documento):
+    """
+    Asigna valores con un solo execute_script y verifica los campos esperados
+
+    Si los campos no están en el contexto actual, ubica el iframe del
+    formulario (usando la caché de rutas) y reintenta una vez.
+
+    Returns:
+        bool: True si cada campo de esperados quedó con su valor
+    """
+    try:
+        resultado = driver.execute_script(_JS_LLENAR_FORMULARIO, valores, list(esperados))
+        if resultado is None:
+            encontrar_elemento_con_localizadores(driver, [(By.ID, "txtNumDoc")], timeout=5, campo="txtNumDoc")
+            resultado = driver.execute_script(_JS_LLENAR_FORMULARIO, valores, list(esperados))
+    except Exception as e:
+        print(f"[!] Llenado por JavaScript falló: {e}")
+        return False
+
+    if not resultado:
+        return False
+    if resultado.get("error") == "opcion":
+        raise RuntimeError(
+            f"Tipo de documento '{tipo_documento}' no está disponible. Opciones: {resultado.get('opciones')}"
+        )
+
+    return all(str(resultado.get(campo, "")).strip() == valor for campo, valor in esperados.items())
+
+
+def prellenar_formulario(driver, tipo_documento, numero_documento):
+    """
+    Llena tipo y número de documento con un solo execute_script
+
+    Pensado para correr mientras Anti-Captcha resuelve el CAPTCHA; el
+    CAPTCHA se ingresa después con completar_formulario().
+
+    Args:
+        driver: WebDriver de Selenium
+        tipo_documento: Código del tipo de documento (CC, TI, ...)
+        numero_documento: Número de documento normalizado
+
+    Returns:
+        bool: True si ambos campos quedaron con el valor esperado
+    """
+    valores = {"tipoDoc": str(tipo_documento), "txtNumDoc": str(numero_documento)}
+    return _asignar_campos(driver, valores, valores, tipo_documento)
+
+
+def completar_formulario(driver, tipo_documento, numero_documento, captcha_value,
+                         captcha_input_id="Capcha_CaptchaTextBox"):
+    """
+    Ingresa el CAPTCHA y verifica los tres campos con un solo execute_script
+
+    Escribe solo el CAPTCHA (tipo y número ya los dejó prellenar_formulario)
+    y devuelve lo que quedó en los tres campos, así un postback que haya
+    borrado el número se detecta en la misma ida y vuelta al navegador.
+
+    Args:
+        driver: WebDriver de Selenium
+        tipo_documento: Código del tipo de documento (CC, TI, ...)
+        numero_documento: Número de documento normalizado
+        captcha_value: Texto del CAPTCHA resuelto
+        captcha_input_id: ID del input del CAPTCHA
+
+    Returns:
+        bool: True si los tres campos quedaron con el valor esperado; False
+            para que el llamador use los métodos paso a paso
+    """
+    esperados = {
+        "tipoDoc": str(tipo_documento),
+        "txtNumDoc": str(numero_documento),
+        captcha_input_id: str(captcha_value),
+    }
+    correcto = _asignar_campos(
+        driver, {captcha_input_id: esperados[captcha_input_id]}, esperados, tipo_documento
+    )
+    if correcto:
+        print("[+] Formulario llenado en dos llamadas (tipo y número durante el CAPTCHA)")
+    return correcto
+
+
 def enviar_formulario(driver, button_id="btnConsultar"):
     """
     Hace click en el botón de envío del formulario
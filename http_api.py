@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# http_api.py
+"""Motor de consulta por HTTP directo (sin navegador) para el formulario ADRES"""
+
+import re
+import html
+import queue
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import URL_FORMULARIO, HTTP_TIMEOUT, HTTP_POOL_CONEXIONES
+from captcha_api import resolver_captcha_imagen
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+)
+
+_PATRON_INPUT_OCULTO = re.compile(r'<input\b[^>]*\btype=["\']hidden["\'][^>]*>', re.IGNORECASE)
+_PATRON_ATRIBUTO = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_PATRON_FORM = re.compile(r'<form\b[^>]*>', re.IGNORECASE)
+_PATRON_POPUP = re.compile(r'window\.open\(\s*["\']([^"\']+)["\']', re.IGNORECASE)
+# Aviso junto al formulario (ej. "Código de verificación errado")
+_PATRON_AVISO = re.compile(r'<span\b[^>]*>([^<]+)</span>', re.IGNORECASE)
+
+# Marcadores de una página con resultados (ver results_api.parsear_html_a_json)
+_MARCADORES_RESULTADO = ("DataGrid_Item", "TIPO DE IDENTIFICACI")
+
+_sesiones = queue.LifoQueue()
+
+
+def _atributos(etiqueta):
+    """Convierte los atributos de una etiqueta HTML en diccionario"""
+    return {
+        nombre.lower(): html.unescape(doble if doble is not None else simple)
+        for nombre, doble, simple in _PATRON_ATRIBUTO.findall(etiqueta)
+    }
+
+
+def extraer_campos_ocultos(contenido):
+    """
+    Extrae los campos ocultos de un formulario ASP.NET
+
+    Args:
+        contenido: HTML de la página del formulario
+
+    Returns:
+        dict: Nombre -> valor (__VIEWSTATE, __EVENTVALIDATION, etc.)
+    """
+    campos = {}
+    for etiqueta in _PATRON_INPUT_OCULTO.findall(contenido):
+        atributos = _atributos(etiqueta)
+        if atributos.get("name"):
+            campos[atributos["name"]] = atributos.get("value", "")
+    return campos
+
+
+def atributos_elemento(contenido, element_id):
+    """
+    Busca un elemento por su atributo id y devuelve sus atributos
+
+    Args:
+        contenido: HTML de la página
+        element_id: Valor del atributo id
+
+    Returns:
+        dict or None: Atributos del elemento o None si no existe
+    """
+    patron = re.compile(
+        r'<(?:input|select|img|textarea)\b[^>]*\bid=["\']' + re.escape(element_id) + r'["\'][^>]*>',
+        re.IGNORECASE,
+    )
+    encontrado = patron.search(contenido)
+    if not encontrado:
+        return None
+    return _atributos(encontrado.group(0))
+
+
+def _nombre_campo(contenido, element_id):
+    """Nombre con el que ASP.NET espera el campo (ej. Capcha$CaptchaTextBox)"""
+    atributos = atributos_elemento(contenido, element_id) or {}
+    return atributos.get("name", element_id)
+
+
+def _crear_sesion():
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=HTTP_POOL_CONEXIONES, pool_maxsize=HTTP_POOL_CONEXIONES)
+    sesion.mount("http://", adaptador)
+    sesion.mount("https://", adaptador)
+    sesion.headers.update({"User-Agent": USER_AGENT})
+    return sesion
+
+
+@contextmanager
+def sesion_prestada():
+    """
+    Presta una sesión HTTP del pool (conexiones keep-alive reutilizadas)
+
+    Las cookies se borran al prestarla para que cada consulta tenga su propia
+    sesión ASP.NET.
+    """
+    try:
+        sesion = _sesiones.get_nowait()
+    except queue.Empty:
+        sesion = _crear_sesion()
+    sesion.cookies.clear()
+    try:
+        yield sesion
+    finally:
+        _sesiones.put(sesion)
+
+
+def _es_pagina_resultado(contenido):
+    return any(marcador in contenido for marcador in _MARCADORES_RESULTADO)
+
+
+class FormularioRechazado(RuntimeError):
+    """ADRES devolvió el formulario en lugar de resultados (CAPTCHA errado o sesión vencida)"""
+
+
+def _es_formulario(contenido):
+    """True si la página es el formulario de consulta (sin DataGrid ni popup)"""
+    return (
+        atributos_elemento(contenido, "txtNumDoc") is not None
+        or "__VIEWSTATE" in contenido
+    ) and not _es_pagina_resultado(contenido) and not _PATRON_POPUP.search(contenido)
+
+
+def _mensaje_formulario(contenido):
+    """Texto del aviso que ADRES muestra junto al formulario (si hay uno)"""
+    aviso = _PATRON_AVISO.search(contenido)
+    return html.unescape(aviso.group(1)).strip() if aviso else "sin resultados"
+
+
+def consultar_por_http(numero_doc, tipo_doc, url=URL_FORMULARIO, resolver=resolver_captcha_imagen,
+                       timeout=HTTP_TIMEOUT, intentos=2):
+    """
+    Ejecuta la consulta completa con requests, sin abrir un navegador
+
+    Si ADRES responde con el formulario otra vez (CAPTCHA errado o sesión
+    vencida) se reintenta con una sesión y un CAPTCHA nuevos.
+
+    Args:
+        numero_doc: Número de documento
+        tipo_doc: Código del tipo de documento (CC, TI, ...)
+        url: URL del formulario ASP.NET
+        resolver: Callable(bytes_imagen) -> texto del CAPTCHA o None
+        timeout: Timeout en segundos de cada petición
+        intentos: Envíos del formulario antes de rendirse
+
+    Returns:
+        str: HTML de la página de resultados (para parsear_html_a_json)
+
+    Raises:
+        FormularioRechazado: Si todos los intentos devolvieron el formulario
+        RuntimeError: Si el formulario no tiene la estructura esperada o se
+            cancela el CAPTCHA
+    """
+    for intento in range(1, max(1, intentos) + 1):
+        try:
+            return _consultar_una_vez(numero_doc, tipo_doc, url, resolver, timeout)
+        except FormularioRechazado as e:
+            if intento >= intentos:
+                raise
+            print(f"[!] {e}; reintentando con sesión y CAPTCHA nuevos ({intento}/{intentos})")
+
+
+def _consultar_una_vez(numero_doc, tipo_doc, url, resolver, timeout):
+    """Un envío completo del formulario con una sesión recién prestada"""
+    with sesion_prestada() as sesion:
+        # 1. Cargar formulario
+        respuesta = sesion.get(url, timeout=timeout)
+        respuesta.raise_for_status()
+        formulario = respuesta.text
+        url_actual = respuesta.url
+
+        campos = extraer_campos_ocultos(formulario)
+        if "__VIEWSTATE" not in campos:
+            raise RuntimeError("El formulario no contiene __VIEWSTATE")
+
+        form = _PATRON_FORM.search(formulario)
+        accion = _atributos(form.group(0)).get("action", "") if form else ""
+        url_post = urljoin(url_actual, accion) if accion else url_actual
+
+        # 2. Descargar imagen del CAPTCHA
+        imagen = atributos_elemento(formulario, "Capcha_CaptchaImageUP")
+        if not imagen or not imagen.get("src"):
+            raise RuntimeError("No se encontró la imagen del CAPTCHA")
+        respuesta_imagen = sesion.get(urljoin(url_actual, imagen["src"]), timeout=timeout)
+        respuesta_imagen.raise_for_status()
+
+        captcha_value = resolver(respuesta_imagen.content)
+        if not captcha_value:
+            raise RuntimeError("No se pudo resolver el CAPTCHA")
+
+        # 3. Enviar formulario
+        boton = atributos_elemento(formulario, "btnConsultar") or {}
+        datos = dict(campos)
+        datos[_nombre_campo(formulario, "tipoDoc")] = tipo_doc
+        datos[_nombre_campo(formulario, "txtNumDoc")] = numero_doc
+        datos[_nombre_campo(formulario, "Capcha_CaptchaTextBox")] = captcha_value
+        datos[boton.get("name", "btnConsultar")] = boton.get("value", "Consultar")
+
+        respuesta = sesion.post(url_post, data=datos, headers={"Referer": url_actual}, timeout=timeout)
+        respuesta.raise_for_status()
+        contenido = respuesta.text
+        print(f"[+] Formulario enviado por HTTP ({len(contenido)} bytes)")
+
+        if _es_pagina_resultado(contenido):
+            return contenido
+
+        # 4. ADRES abre los resultados en un popup (window.open)
+        popup = _PATRON_POPUP.search(contenido)
+        if popup:
+            respuesta = sesion.get(urljoin(respuesta.url, html.unescape(popup.group(1))),
+                                   headers={"Referer": url_post}, timeout=timeout)
+            respuesta.raise_for_status()
+            return respuesta.text
+
+        if _es_formulario(contenido):
+            raise FormularioRechazado(f"ADRES devolvió el formulario: {_mensaje_formulario(contenido)}")
+        return contenido
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# lectura_api.py
+"""Lectura incremental de archivos de entrada para consultas masivas"""
+
+import os
+import csv
+import gzip
+import json
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+
+XLSX_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+_TAG_ROW = f"{{{XLSX_MAIN_NS}}}row"
+_TAG_CELDA = f"{{{XLSX_MAIN_NS}}}c"
+_TAG_VALOR = f"{{{XLSX_MAIN_NS}}}v"
+_TAG_INLINE = f"{{{XLSX_MAIN_NS}}}is"
+_TAG_SI = f"{{{XLSX_MAIN_NS}}}si"
+_TAG_SHEET_DATA = f"{{{XLSX_MAIN_NS}}}sheetData"
+_TAG_DIMENSION = f"{{{XLSX_MAIN_NS}}}dimension"
+
+COLUMNAS_REQUERIDAS = ('tipo_identificacion', 'numero_identificacion')
+
+EXTENSIONES_EXCEL = ('.xlsx', '.xls')
+EXTENSIONES_CSV = ('.csv', '.csv.gz')
+EXTENSIONES_NDJSON = ('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz')
+EXTENSIONES_LOTE = EXTENSIONES_EXCEL + EXTENSIONES_CSV + EXTENSIONES_NDJSON
+
+
+def _columna_a_indice(columna):
+    """Convierte una referencia de columna de Excel (ej. 'AA') a índice basado en cero."""
+    indice = 0
+    for caracter in columna:
+        if not caracter.isalpha():
+            break
+        indice = indice * 26 + (ord(caracter.upper()) - ord('A') + 1)
+    return max(indice - 1, 0)
+
+
+def _texto_shared_string(elemento):
+    """Extrae el texto de un nodo <si> o inlineStr dentro del XML de Excel."""
+    partes = []
+    for nodo in elemento.iter():
+        if nodo.tag.endswith('}t') and nodo.text:
+            partes.append(nodo.text)
+    return ''.join(partes)
+
+
+def _leer_shared_strings(archivo_zip):
+    """Carga la tabla de cadenas compartidas liberando cada nodo al leerlo"""
+    shared_strings = []
+    if 'xl/sharedStrings.xml' not in archivo_zip.namelist():
+        return shared_strings
+
+    with archivo_zip.open('xl/sharedStrings.xml') as stream:
+        for _, elemento in ET.iterparse(stream, events=('end',)):
+            if elemento.tag == _TAG_SI:
+                shared_strings.append(_texto_shared_string(elemento))
+                elemento.clear()
+    return shared_strings
+
+
+def _ruta_primera_hoja(archivo_zip):
+    """Resuelve la ruta dentro del ZIP de la primera hoja del libro"""
+    workbook = ET.fromstring(archivo_zip.read('xl/workbook.xml'))
+    hoja = workbook.find(f'.//{{{XLSX_MAIN_NS}}}sheet')
+    if hoja is None:
+        return None
+
+    rel_id = hoja.attrib.get(f'{{{XLSX_REL_NS}}}id')
+    destino_hoja = None
+
+    try:
+        rels = ET.fromstring(archivo_zip.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels.findall(f'{{{XLSX_REL_NS}}}Relationship'):
+            if rel.attrib.get('Id') == rel_id:
+                destino_hoja = rel.attrib.get('Target')
+                break
+    except KeyError:
+        pass
+
+    if not destino_hoja:
+        destino_hoja = 'worksheets/sheet1.xml'
+
+    destino_hoja = destino_hoja.lstrip('/')
+    if not destino_hoja.startswith('xl/'):
+        destino_hoja = f'xl/{destino_hoja}'
+    return destino_hoja
+
+
+def _valores_fila(fila, shared_strings):
+    """Convierte un nodo <row> en lista de valores por posición de columna"""
+    celdas = {}
+    max_columnas = 0
+    for celda in fila.iter(_TAG_CELDA):
+        referencia = celda.attrib.get('r', '')
+        columna = ''.join(ch for ch in referencia if ch.isalpha())
+        indice_columna = _columna_a_indice(columna) if columna else max_columnas
+
+        valor = ''
+        tipo = celda.attrib.get('t')
+        if tipo == 's':
+            indice_shared = celda.find(_TAG_VALOR)
+            if indice_shared is not None and indice_shared.text:
+                try:
+                    valor = shared_strings[int(indice_shared.text)]
+                except (ValueError, IndexError):
+                    valor = ''
+        elif tipo == 'inlineStr':
+            inline = celda.find(_TAG_INLINE)
+            if inline is not None:
+                valor = _texto_shared_string(inline)
+        else:
+            nodo_valor = celda.find(_TAG_VALOR)
+            if nodo_valor is not None and nodo_valor.text is not None:
+                valor = nodo_valor.text
+
+        celdas[indice_columna] = valor
+        max_columnas = max(max_columnas, indice_columna + 1)
+
+    valores = [''] * max_columnas
+    for indice, valor in celdas.items():
+        valores[indice] = valor
+    return valores
+
+
+def iterar_filas_xlsx(ruta):
+    """
+    Recorre la primera hoja de un XLSX fila por fila con iterparse
+
+    Cada nodo <row> se libera apenas se procesa, así que la memoria no crece
+    con el tamaño de la hoja (solo con la tabla de cadenas compartidas).
+
+    Args:
+        ruta: Ruta del archivo .xlsx
+
+    Yields:
+        list: Valores de la fila (cadenas) por posición de columna
+
+    Raises:
+        ValueError: Si el archivo no es un XLSX válido
+    """
+    try:
+        with zipfile.ZipFile(ruta) as archivo_zip:
+            shared_strings = _leer_shared_strings(archivo_zip)
+            destino_hoja = _ruta_primera_hoja(archivo_zip)
+            if destino_hoja is None:
+                return
+
+            with archivo_zip.open(destino_hoja) as stream:
+                sheet_data = None
+                for evento, elemento in ET.iterparse(stream, events=('start', 'end')):
+                    if evento == 'start':
+                        if elemento.tag == _TAG_SHEET_DATA:
+                            sheet_data = elemento
+                        continue
+                    if elemento.tag == _TAG_ROW:
+                        yield _valores_fila(elemento, shared_strings)
+                        elemento.clear()
+                        if sheet_data is not None:
+                            sheet_data.clear()
+    except (KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        raise ValueError(f"Archivo XLSX inválido: {e}") from e
+
+
+def contar_filas_xlsx(ruta):
+    """
+    Estima el número de filas de datos leyendo solo el <dimension> de la hoja
+
+    Returns:
+        int or None: Filas de datos (sin encabezado) o None si no se declara
+    """
+    try:
+        with zipfile.ZipFile(ruta) as archivo_zip:
+            destino_hoja = _ruta_primera_hoja(archivo_zip)
+            if destino_hoja is None:
+                return None
+            with archivo_zip.open(destino_hoja) as stream:
+                for _, elemento in ET.iterparse(stream, events=('start',)):
+                    if elemento.tag == _TAG_DIMENSION:
+                        referencia = elemento.attrib.get('ref', '')
+                        ultima = referencia.split(':')[-1]
+                        digitos = ''.join(ch for ch in ultima if ch.isdigit())
+                        return max(int(digitos) - 1, 0) if digitos else None
+                    if elemento.tag == _TAG_SHEET_DATA:
+                        return None
+    except (KeyError, zipfile.BadZipFile, ET.ParseError):
+        pass
+    return None
+
+
+def iterar_registros_xlsx(ruta):
+    """
+    Recorre un XLSX como registros usando la primera fila como encabezado
+
+    Yields:
+        dict: Encabezado -> valor (cadena vacía si la celda no existe)
+    """
+    filas = iterar_filas_xlsx(ruta)
+    encabezados = None
+    for valores in filas:
+        if encabezados is None:
+            encabezados = [str(col).strip() for col in valores]
+            continue
+
+        registro = {}
+        for indice, encabezado in enumerate(encabezados):
+            if not encabezado:
+                continue
+            registro[encabezado] = valores[indice] if indice < len(valores) else ''
+        if registro:
+            yield registro
+
+
+def iterar_documentos(registros):
+    """
+    Extrae (tipo_identificacion, numero_identificacion) de un iterable de registros
+
+    Verifica las columnas con el primer registro, antes de consumir el resto.
+
+    Args:
+        registros: Iterable de diccionarios (encabezado -> valor)
+
+    Returns:
+        iterator: Tuplas (tipo_identificacion, numero_identificacion) sin
+            normalizar; las filas con alguno de los dos vacío se omiten
+
+    Raises:
+        ValueError: Si el archivo está vacío o faltan columnas
+    """
+    registros = iter(registros)
+    primero = next(registros, None)
+    if primero is None:
+        raise ValueError("El archivo está vacío")
+    if any(columna not in primero for columna in COLUMNAS_REQUERIDAS):
+        raise ValueError(
+            "El archivo debe tener las columnas: tipo_identificacion, numero_identificacion"
+        )
+
+    def _generar():
+        for registro in _encadenar(primero, registros):
+            tipo = registro.get('tipo_identificacion')
+            numero = registro.get('numero_identificacion')
+            if _vacio(tipo) or _vacio(numero):
+                continue
+            yield tipo, numero
+
+    return _generar()
+
+
+def _encadenar(primero, resto):
+    yield primero
+    yield from resto
+
+
+def _vacio(valor):
+    if valor is None:
+        return True
+    try:
+        if pd.isna(valor):
+            return True
+    except (TypeError, ValueError):
+        pass
+    return not str(valor).strip()
+
+
+def _abrir_texto(ruta):
+    """Abre un archivo de texto UTF-8 (con o sin BOM), descomprimiendo .gz al vuelo"""
+    if ruta.lower().endswith('.gz'):
+        return gzip.open(ruta, 'rt', encoding='utf-8-sig', newline='')
+    return open(ruta, 'r', encoding='utf-8-sig', newline='')
+
+
+def iterar_registros_csv(ruta):
+    """
+    Recorre un CSV (opcionalmente .csv.gz) como registros, en memoria constante
+
+    El separador (coma, punto y coma o tabulador) se detecta con la primera
+    porción del archivo.
+
+    Yields:
+        dict: Encabezado -> valor
+    """
+    with _abrir_texto(ruta) as archivo:
+        muestra = archivo.read(4096)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+
+        # Volver al inicio y dejar que csv parta las líneas (solo \n y \r
+        # fuera de comillas; str.splitlines partiría también en \x0b, \x1c...)
+        archivo.seek(0)
+        lector = csv.DictReader(archivo, dialect=dialecto)
+        if lector.fieldnames:
+            lector.fieldnames = [str(col).strip() for col in lector.fieldnames]
+        for registro in lector:
+            yield registro
+
+
+def iterar_registros_ndjson(ruta):
+    """
+    Recorre un archivo JSON por líneas (NDJSON, opcionalmente .gz)
+
+    Yields:
+        dict: Objeto de cada línea no vacía
+
+    Raises:
+        ValueError: Si una línea no es un objeto JSON válido
+    """
+    with _abrir_texto(ruta) as archivo:
+        for numero_linea, linea in enumerate(archivo, 1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Línea {numero_linea} no es JSON válido: {e}") from e
+            if not isinstance(registro, dict):
+                raise ValueError(f"Línea {numero_linea} no es un objeto JSON")
+            yield registro
+
+
+def cargar_excel_como_dataframe(ruta):
+    """Intenta cargar un archivo Excel utilizando pandas y un lector básico como respaldo."""
+    try:
+        return pd.read_excel(ruta)
+    except Exception as error:
+        mensaje = str(error).lower()
+        if ruta.lower().endswith('.xlsx') and 'openpyxl' in mensaje:
+            df = leer_excel_xlsx_basico(ruta)
+            if not df.empty:
+                return df
+        raise
+
+
+def es_archivo_lote(nombre):
+    """True si la extensión del archivo es un formato de lote soportado"""
+    return nombre.lower().endswith(EXTENSIONES_LOTE)
+
+
+def abrir_documentos_lote(ruta):
+    """
+    Abre el archivo de un lote para leerlo de forma incremental
+
+    Los .xlsx se recorren con iterparse y CSV/NDJSON línea a línea (también
+    comprimidos con gzip); solo los .xls pasan por pandas.
+
+    Args:
+        ruta: Ruta del archivo subido
+
+    Returns:
+        tuple: (total estimado o None, iterador de (tipo, numero))
+
+    Raises:
+        ValueError: Si el archivo está vacío, le faltan columnas o el formato
+            no es soportado
+    """
+    nombre = ruta.lower()
+    if nombre.endswith('.xlsx'):
+        return contar_filas_xlsx(ruta), iterar_documentos(iterar_registros_xlsx(ruta))
+    if nombre.endswith(EXTENSIONES_CSV):
+        return None, iterar_documentos(iterar_registros_csv(ruta))
+    if nombre.endswith(EXTENSIONES_NDJSON):
+        return None, iterar_documentos(iterar_registros_ndjson(ruta))
+    if nombre.endswith('.xls'):
+        df = cargar_excel_como_dataframe(ruta)
+        return len(df), iterar_documentos(df.to_dict('records'))
+    raise ValueError(f"Formato de archivo no soportado: {os.path.basename(ruta)}")
+
+
+def leer_excel_xlsx_basico(ruta):
+    """Lee un archivo XLSX sin dependencias externas como openpyxl."""
+    try:
+        df = pd.DataFrame(list(iterar_registros_xlsx(ruta)))
+    except ValueError:
+        return pd.DataFrame()
+
+    if not df.empty:
+        df = df.replace(r'^\s*$', pd.NA, regex=True)
+    return df
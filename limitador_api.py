@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# limitador_api.py
+"""Limitador de tasa hacia ADRES (token bucket) con control adaptativo AIMD"""
+
+import time
+import threading
+
+from config import (
+    LIMITADOR_TASA_INICIAL,
+    LIMITADOR_TASA_MINIMA,
+    LIMITADOR_TASA_MAXIMA,
+    LIMITADOR_INCREMENTO,
+    LIMITADOR_FACTOR,
+    LIMITADOR_RAFAGA,
+    LIMITADOR_ENFRIAMIENTO,
+)
+
+
+class LimitadorAIMD:
+    """
+    Token bucket compartido por todos los motores de consulta
+
+    Cada consulta a ADRES consume un token; los tokens se reponen a la tasa
+    actual (consultas por minuto). La tasa se ajusta como en TCP: sube de a
+    poco con cada consulta exitosa (aumento aditivo) y se multiplica por
+    LIMITADOR_FACTOR ante timeouts, páginas de error o resultados vacíos
+    (reducción multiplicativa). Varias fallas seguidas dentro de la ventana
+    de enfriamiento cuentan como una sola reducción.
+    """
+
+    def __init__(self, tasa_inicial=LIMITADOR_TASA_INICIAL, tasa_minima=LIMITADOR_TASA_MINIMA,
+                 tasa_maxima=LIMITADOR_TASA_MAXIMA, incremento=LIMITADOR_INCREMENTO,
+                 factor=LIMITADOR_FACTOR, rafaga=LIMITADOR_RAFAGA,
+                 enfriamiento=LIMITADOR_ENFRIAMIENTO):
+        """
+        Args:
+            tasa_inicial: Consultas por minuto al arrancar
+            tasa_minima: Piso de la tasa tras reducciones
+            tasa_maxima: Techo de la tasa tras aumentos
+            incremento: Consultas/minuto que suma cada éxito
+            factor: Multiplicador de la tasa ante una falla (0 < factor < 1)
+            rafaga: Tokens máximos acumulables (consultas seguidas sin espera)
+            enfriamiento: Segundos tras una reducción en que no se reduce otra vez
+        """
+        self.tasa_minima = max(0.1, tasa_minima)
+        self.tasa_maxima = max(self.tasa_minima, tasa_maxima)
+        self.incremento = incremento
+        self.factor = min(max(factor, 0.05), 0.95)
+        self.rafaga = max(1.0, float(rafaga))
+        self.enfriamiento = enfriamiento
+
+        self._condicion = threading.Condition()
+        self._tasa = min(max(tasa_inicial, self.tasa_minima), self.tasa_maxima)
+        self._tokens = self.rafaga
+        self._ultima_reposicion = time.monotonic()
+        self._ultima_reduccion = float("-inf")
+
+        self._stats = {
+            "adquisiciones": 0,
+            "esperas": 0,
+            "espera_total": 0.0,
+            "exitos": 0,
+            "fallos": {},
+            "reducciones": 0,
+        }
+
+    def _reponer(self):
+        """Suma los tokens generados desde la última reposición (con el lock tomado)"""
+        ahora = time.monotonic()
+        self._tokens = min(
+            self.rafaga,
+            self._tokens + (ahora - self._ultima_reposicion) * self._tasa / 60.0,
+        )
+        self._ultima_reposicion = ahora
+
+    def adquirir(self, timeout=None):
+        """
+        Espera hasta tener un token para consultar ADRES
+
+        Args:
+            timeout: Segundos máximos de espera (None = sin límite)
+
+        Returns:
+            float: Segundos esperados
+
+        Raises:
+            TimeoutError: Si no hubo token antes del timeout
+        """
+        inicio = time.monotonic()
+        with self._condicion:
+            while True:
+                self._reponer()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                faltante = (1 - self._tokens) * 60.0 / self._tasa
+                if timeout is not None:
+                    restante = inicio + timeout - time.monotonic()
+                    if restante <= 0:
+                        raise TimeoutError("Límite de consultas a ADRES alcanzado")
+                    faltante = min(faltante, restante)
+                self._condicion.wait(faltante)
+
+            espera = time.monotonic() - inicio
+            self._stats["adquisiciones"] += 1
+            if espera > 0.001:
+                self._stats["esperas"] += 1
+                self._stats["espera_total"] += espera
+        return espera
+
+    def registrar_exito(self):
+        """Consulta con datos: aumento aditivo de la tasa"""
+        with self._condicion:
+            self._stats["exitos"] += 1
+            self._reponer()
+            self._tasa = min(self.tasa_maxima, self._tasa + self.incremento)
+
+    def registrar_fallo(self, motivo):
+        """
+        Timeout, página de error o resultado vacío: reducción multiplicativa
+
+        Args:
+            motivo: Causa para las estadísticas (ej. "timeout", "sin_datos")
+        """
+        with self._condicion:
+            self._stats["fallos"][motivo] = self._stats["fallos"].get(motivo, 0) + 1
+            ahora = time.monotonic()
+            if ahora - self._ultima_reduccion < self.enfriamiento:
+                return
+            self._reponer()
+            self._ultima_reduccion = ahora
+            self._tasa = max(self.tasa_minima, self._tasa * self.factor)
+            # Sin tokens acumulados: la nueva tasa se aplica de inmediato
+            self._tokens = min(self._tokens, 0.0)
+            self._stats["reducciones"] += 1
+
+    def registrar_resultado(self, datos_json):
+        """Registra éxito o fallo según lo que devolvió parsear_html_a_json"""
+        if datos_json and datos_json.get("exito"):
+            self.registrar_exito()
+        else:
+            self.registrar_fallo("sin_datos")
+
+    def estadisticas(self):
+        with self._condicion:
+            self._reponer()
+            stats = dict(self._stats, fallos=dict(self._stats["fallos"]))
+            stats["tasa_por_minuto"] = round(self._tasa, 2)
+            stats["tokens"] = round(self._tokens, 2)
+        stats["espera_total"] = round(stats["espera_total"], 3)
+        return stats
+
+
+def motivo_fallo(error):
+    """Clasifica una excepción de consulta para el limitador"""
+    nombre = type(error).__name__.lower()
+    if "timeout" in nombre or "timed out" in str(error).lower():
+        return "timeout"
+    return "error"
+
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+
+def obtener_limitador():
+    """Devuelve el limitador global (se crea al primer uso)"""
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            _limitador = LimitadorAIMD()
+        return _limitador
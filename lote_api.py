@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# lote_api.py
+"""Ejecución concurrente de consultas masivas (lotes)"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from config import LOTE_CONCURRENCIA, LOTE_BITACORA_DIR
+from almacen_api import LOTE
+
+
+def ruta_bitacora(lote_id):
+    """Ruta de la bitácora NDJSON de un lote"""
+    return os.path.join(LOTE_BITACORA_DIR, f"{lote_id}.ndjson")
+
+
+class BitacoraLote:
+    """
+    Registro append-only (una línea JSON por fila) de los resultados de un lote
+
+    La primera línea es la cabecera con los parámetros del lote (archivo,
+    motor, etc.); cada línea siguiente es el resultado de una fila. Se hace
+    flush por escritura, así una caída del proceso pierde como mucho la
+    línea que se estaba escribiendo.
+    """
+
+    def __init__(self, ruta, cabecera=None):
+        """
+        Args:
+            ruta: Archivo de la bitácora
+            cabecera: Diccionario para iniciar una bitácora nueva; None para
+                seguir escribiendo al final de una existente (reanudar)
+        """
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        if cabecera is None:
+            self._archivo = open(ruta, "a", encoding="utf-8")
+        else:
+            self._archivo = open(ruta, "w", encoding="utf-8")
+            self._escribir_lineas([cabecera])
+
+    def _escribir_lineas(self, objetos):
+        self._archivo.write("".join(json.dumps(o, ensure_ascii=False) + "\n" for o in objetos))
+        self._archivo.flush()
+
+    def escribir(self, filas):
+        """Agrega los resultados de (fila, resultado) al final de la bitácora"""
+        with self._lock:
+            self._escribir_lineas([resultado for _, resultado in filas])
+
+    def cerrar(self):
+        with self._lock:
+            self._archivo.close()
+
+
+def leer_cabecera_bitacora(ruta):
+    """Lee solo la cabecera (parámetros del lote) de una bitácora"""
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+def leer_bitacora(ruta):
+    """
+    Reconstruye un lote a partir de su bitácora
+
+    Una última línea incompleta (caída a mitad de escritura) se ignora; si
+    una fila aparece varias veces gana la última.
+
+    Returns:
+        tuple: (cabecera, {fila: resultado})
+    """
+    cabecera = None
+    resultados = {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                objeto = json.loads(linea)
+            except ValueError:
+                continue
+            if cabecera is None:
+                cabecera = objeto
+            elif "fila" in objeto:
+                resultados[objeto["fila"]] = objeto
+    return cabecera, resultados
+
+
+class ProgresoLote:
+    """
+    Estado de un lote compartido entre los workers, protegido por un lock
+
+    Si recibe un almacén, cada resultado y el resumen del lote (sin la lista
+    de resultados) se escriben en él, así otros procesos pueden consultar el
+    avance y el lote sobrevive a un reinicio. Si recibe una bitácora, cada
+    resultado nuevo se agrega también a ella.
+    """
+
+    def __init__(self, estado, concurrencia=LOTE_CONCURRENCIA, almacen=None, lote_id=None,
+                 bitacora=None):
+        """
+        Args:
+            estado: Diccionario de estado del lote (se modifica en sitio)
+            concurrencia: Número de workers del lote
+            almacen: Almacén de trabajos (opcional, ver almacen_api)
+            lote_id: ID del lote en el almacén
+            bitacora: BitacoraLote donde se agregan los resultados (opcional)
+        """
+        self._lock = threading.Lock()
+        self._lock_persistencia = threading.Lock()
+        self._almacen = almacen
+        self._bitacora = bitacora
+        self._lote_id = lote_id
+        self._estado = estado
+        self._filas = []
+        self._inicio = time.time()
+
+        estado.setdefault("total", 0)
+        estado.update({
+            "estado": "procesando",
+            "procesados": 0,
+            "exitosos": 0,
+            "fallidos": 0,
+            "duplicados": 0,
+            "concurrencia": concurrencia,
+            "resultados": [],
+        })
+        self._persistir()
+
+    def agregar_total(self, cantidad):
+        """Suma filas al total esperado (útil cuando se lee por partes)"""
+        with self._lock:
+            self._estado["total"] += cantidad
+        self._persistir()
+
+    def registrar(self, fila, resultado, duplicada=False):
+        """
+        Registra el resultado de una fila manteniendo el orden de entrada
+
+        Args:
+            fila: Índice de la fila en el archivo de entrada
+            resultado: Diccionario de resultado (con clave "estado")
+            duplicada: True si el resultado se copió de otra fila del lote
+        """
+        with self._lock:
+            self._registrar(fila, resultado, duplicada)
+        self._persistir([(fila, resultado)])
+
+    def registrar_varios(self, filas):
+        """
+        Registra muchos resultados de una vez (ej. las filas rechazadas)
+
+        Args:
+            filas: Lista de (fila, resultado)
+        """
+        with self._lock:
+            for fila, resultado in filas:
+                self._registrar(fila, resultado, False)
+        self._persistir(filas)
+
+    def restaurar(self, filas):
+        """
+        Carga resultados de un lote anterior (ej. leídos de la bitácora)
+
+        Cuentan en el avance y se escriben en el almacén, pero no se vuelven
+        a agregar a la bitácora.
+
+        Args:
+            filas: Lista de (fila, resultado)
+        """
+        with self._lock:
+            for fila, resultado in filas:
+                self._registrar(fila, resultado, "duplicado_de" in resultado)
+        self._persistir(filas, bitacora=False)
+
+    def _registrar(self, fila, resultado, duplicada):
+        resultado["fila"] = fila
+        if duplicada:
+            self._estado["duplicados"] += 1
+        posicion = bisect.bisect(self._filas, fila)
+        self._filas.insert(posicion, fila)
+        self._estado["resultados"].insert(posicion, resultado)
+
+        self._estado["procesados"] += 1
+        if resultado.get("estado") == "completado":
+            self._estado["exitosos"] += 1
+        else:
+            self._estado["fallidos"] += 1
+
+        self._estado["mensaje"] = (
+            f"Procesados {self._estado['procesados']}/{self._estado['total']}"
+        )
+
+    def finalizar(self, **campos):
+        """Marca el lote como terminado con los campos indicados"""
+        with self._lock:
+            self._estado.update(campos)
+            self._agregar_metricas(self._estado)
+        self._persistir()
+
+    def resultados(self):
+        """Copia de los resultados en el orden del archivo de entrada"""
+        with self._lock:
+            return list(self._estado["resultados"])
+
+    def _persistir(self, filas=(), bitacora=True):
+        """
+        Escribe los resultados nuevos en la bitácora y en el almacén, junto
+        con el resumen actual
+
+        El resumen se toma dentro del lock de persistencia para que dos
+        workers no dejen en el almacén un conteo más viejo que el último.
+        """
+        if filas and bitacora and self._bitacora is not None:
+            self._bitacora.escribir(filas)
+        if self._almacen is None:
+            return
+        with self._lock_persistencia:
+            if filas:
+                self._almacen.agregar_resultados(self._lote_id, filas)
+            with self._lock:
+                resumen = {k: v for k, v in self._estado.items() if k != "resultados"}
+            self._agregar_metricas(resumen)
+            self._almacen.guardar(LOTE, self._lote_id, resumen)
+
+    def _agregar_metricas(self, estado):
+        """Calcula rendimiento (filas/minuto) y tiempo restante estimado"""
+        transcurrido = max(time.time() - self._inicio, 1e-6)
+        procesados = estado.get("procesados", 0)
+        por_minuto = procesados * 60.0 / transcurrido
+        restantes = max(estado.get("total", 0) - procesados, 0)
+
+        estado["transcurrido_segundos"] = round(transcurrido, 1)
+        estado["filas_por_minuto"] = round(por_minuto, 2)
+        estado["eta_segundos"] = round(restantes * 60.0 / por_minuto, 1) if por_minuto else None
+
+
+class _Deduplicador:
+    """Colapsa filas con el mismo documento y reparte el resultado a todas"""
+
+    def __init__(self, progreso):
+        self._progreso = progreso
+        self._lock = threading.Lock()
+        self._claves = {}
+
+    def es_duplicada(self, fila, clave):
+        """
+        Registra la fila; devuelve True si otra fila con la misma clave ya fue
+        despachada (la fila se resolverá con ese resultado)
+        """
+        with self._lock:
+            entrada = self._claves.get(clave)
+            if entrada is None:
+                self._claves[clave] = {"fila": fila, "resultado": None, "pendientes": []}
+                return False
+            if entrada["resultado"] is None:
+                entrada["pendientes"].append(fila)
+                return True
+            resultado, original = entrada["resultado"], entrada["fila"]
+
+        self._registrar_copia(fila, original, resultado)
+        return True
+
+    def resolver(self, clave, resultado):
+        """Registra el resultado de la fila original y de sus duplicadas en espera"""
+        with self._lock:
+            entrada = self._claves[clave]
+            entrada["resultado"] = resultado
+            pendientes, entrada["pendientes"] = entrada["pendientes"], []
+            original = entrada["fila"]
+
+        self._progreso.registrar(original, resultado)
+        for fila in pendientes:
+            self._registrar_copia(fila, original, resultado)
+
+    def _registrar_copia(self, fila, original, resultado):
+        copia = dict(resultado, duplicado_de=original)
+        self._progreso.registrar(fila, copia, duplicada=True)
+
+
+def _al_terminar(deduplicador, cupos, clave, futuro):
+    """Callback de cada consulta: registra el resultado y libera su cupo"""
+    tipo_doc, numero_doc = clave
+    try:
+        resultado = futuro.result()
+    except Exception as e:
+        resultado = {
+            "tipo_doc": tipo_doc,
+            "numero_doc": numero_doc,
+            "estado": "error",
+            "mensaje": f"Error: {str(e)}",
+        }
+    finally:
+        cupos.release()
+    deduplicador.resolver(clave, resultado)
+
+
+def procesar_filas(filas, consultar_fila, progreso, concurrencia=LOTE_CONCURRENCIA):
+    """
+    Despacha las filas de un lote a un pool de workers concurrentes
+
+    Las filas se consumen de forma perezosa: como máximo hay el doble de la
+    concurrencia en vuelo, así que el iterable puede ser un generador. Las
+    filas con el mismo (tipo_doc, numero_doc) se consultan una sola vez y el
+    resultado se replica en cada una.
+
+    Args:
+        filas: Iterable de tuplas (fila, tipo_doc, numero_doc) ya normalizadas
+        consultar_fila: Callable(fila, tipo_doc, numero_doc) -> dict resultado
+        progreso: ProgresoLote donde se registran los resultados
+        concurrencia: Número de consultas simultáneas
+    """
+    concurrencia = max(1, concurrencia)
+    cupos = threading.BoundedSemaphore(concurrencia * 2)
+    deduplicador = _Deduplicador(progreso)
+
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="lote") as executor:
+        for fila, tipo_doc, numero_doc in filas:
+            clave = (tipo_doc, numero_doc)
+            if deduplicador.es_duplicada(fila, clave):
+                continue
+            cupos.acquire()
+            futuro = executor.submit(consultar_fila, fila, tipo_doc, numero_doc)
+            futuro.add_done_callback(partial(_al_terminar, deduplicador, cupos, clave))
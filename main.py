@@ -2,12 +2,12 @@
 # main.py
 """Script principal para consulta ADRES con resolución de CAPTCHA"""
 
-import time
 from config import URL, DEFAULT_CEDULA, OUTPUT_DIR, DEBUG_DIR
 from browser_api import iniciar_navegador, cerrar_navegador, guardar_debug
 from form_api import escribir_en_campo, enviar_formulario
 from captcha_api import resolver_captcha, encontrar_input_captcha
 from results_api import capturar_resultados, guardar_resultados, imprimir_resultado_consola
+from espera_api import esperar_documento_listo, esperar_valor
 
 
 def ejecutar_consulta_adres(cedula):
@@ -26,7 +26,7 @@ def ejecutar_consulta_adres(cedula):
         print("[1/6] Iniciando navegador...")
         driver = iniciar_navegador(headless=False)
         driver.get(URL)
-        time.sleep(2)
+        esperar_documento_listo(driver)
 
         # 2. Escribir cédula
         print("[2/6] Escribiendo cédula en el formulario...")
@@ -53,7 +53,7 @@ def ejecutar_consulta_adres(cedula):
         except:
             pass
         captcha_input.send_keys(captcha_value)
-        time.sleep(0.2)
+        esperar_valor(driver, captcha_input, captcha_value, "captcha_ingresado")
 
         # 5. Enviar formulario
         print("[5/6] Enviando formulario...")
@@ -61,8 +61,6 @@ def ejecutar_consulta_adres(cedula):
 
         # 6. Capturar resultados
         print("[6/6] Capturando resultados...")
-        time.sleep(3)  # Esperar a que cargue la nueva ventana
-        
         contenido_resultado = capturar_resultados(driver, ventanas_antes, timeout=20)
         
         if not contenido_resultado:
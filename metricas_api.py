@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# metricas_api.py
+"""Tiempos por etapa de cada consulta, histogramas y exportación en formato Prometheus"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+from config import METRICAS_BUCKETS
+
+
+PREFIJO = "adres_"
+
+# Etapas de una consulta, en el orden en que ocurren
+ETAPAS_CONSULTA = (
+    "inicio_navegador",    # pool: arrancar Chrome
+    "carga_pagina",        # pool: cargar el formulario en un Chrome nuevo
+    "reinicio_navegador",  # pool: limpiar y recargar el formulario al devolverlo
+    "limitador",           # espera de un token del limitador de tasa
+    "navegador_pool",      # préstamo del navegador (incluye iniciarlo si hace falta)
+    "captcha_captura",     # ubicar la imagen del CAPTCHA y capturarla
+    "prellenado",          # tipo y número en una llamada, mientras se resuelve el CAPTCHA
+    "captcha_resolucion",  # espera de la respuesta de Anti-Captcha
+    "llenado_formulario",  # CAPTCHA y verificación de los tres campos en una llamada
+    "seleccion_tipo",      # llenado paso a paso: tipo de documento
+    "escritura_numero",    # llenado paso a paso: número de documento
+    "captcha_ingreso",     # llenado paso a paso: texto del CAPTCHA
+    "envio",               # click en Consultar
+    "nueva_ventana",       # espera de la ventana de resultados
+    "captura_resultado",   # espera del DataGrid y lectura del HTML
+    "consulta_http",       # motor HTTP: formulario + CAPTCHA + envío
+    "parseo",              # HTML -> JSON
+    "guardado_artefactos", # registro en el índice y encolado de escrituras
+)
+# Las esperas del navegador (espera_api) se miden como sub-etapas
+# "espera_<nombre>" dentro de las anteriores (ej. espera_resultados)
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos (como los de Prometheus)"""
+
+    def __init__(self, limites=METRICAS_BUCKETS):
+        self.limites = sorted(limites)
+        self.conteos = [0] * (len(self.limites) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.conteos[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def percentil(self, p):
+        """
+        Percentil aproximado: límite superior del bucket que lo contiene
+        (None si cae por encima del último límite)
+        """
+        if not self.total:
+            return 0.0
+        objetivo = p / 100.0 * self.total
+        acumulado = 0
+        for indice, conteo in enumerate(self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return self.limites[indice] if indice < len(self.limites) else None
+        return None
+
+
+class RegistroMetricas:
+    """
+    Histogramas y contadores con etiquetas, protegidos por un lock
+
+    Cada métrica se identifica por su nombre y una tupla ordenada de
+    (etiqueta, valor); la exportación agrupa las series por nombre.
+    """
+
+    def __init__(self, limites=METRICAS_BUCKETS):
+        self.limites = sorted(limites)
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._contadores = {}
+        self._ayudas = {}
+
+    def describir(self, nombre, ayuda):
+        self._ayudas[nombre] = ayuda
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = Histograma(self.limites)
+            histograma.observar(valor)
+
+    def incrementar(self, nombre, cantidad=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + cantidad
+
+    def resumen(self, nombre):
+        """
+        Resumen de un histograma por su primera etiqueta (ej. etapa)
+
+        Returns:
+            dict: valor -> {"cantidad", "media_segundos", "p50", "p95", "p99"}
+        """
+        with self._lock:
+            series = [(etiquetas, h) for (n, etiquetas), h in self._histogramas.items() if n == nombre]
+            resumen = {}
+            for etiquetas, h in sorted(series):
+                clave = ",".join(str(valor) for _, valor in etiquetas) or "total"
+                resumen[clave] = {
+                    "cantidad": h.total,
+                    "media_segundos": round(h.suma / h.total, 3) if h.total else 0.0,
+                    "p50": h.percentil(50),
+                    "p95": h.percentil(95),
+                    "p99": h.percentil(99),
+                }
+        return resumen
+
+    def exportar(self, indicadores=()):
+        """
+        Texto en formato de exposición de Prometheus (versión 0.0.4)
+
+        Args:
+            indicadores: Valores instantáneos adicionales como tuplas
+                (nombre, ayuda, valor, dict de etiquetas), exportados como gauge
+        """
+        lineas = []
+        with self._lock:
+            histogramas = sorted(self._histogramas.items())
+            contadores = sorted(self._contadores.items())
+
+            for nombre, series in _agrupar(histogramas):
+                _cabecera(lineas, nombre, self._ayudas.get(nombre), "histogram")
+                for etiquetas, h in series:
+                    acumulado = 0
+                    for limite, conteo in zip(self.limites + [float("inf")], h.conteos):
+                        acumulado += conteo
+                        le = "+Inf" if limite == float("inf") else _numero(limite)
+                        lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', le),))} {acumulado}")
+                    lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(h.suma)}")
+                    lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {h.total}")
+
+            for nombre, series in _agrupar(contadores):
+                _cabecera(lineas, nombre, self._ayudas.get(nombre), "counter")
+                for etiquetas, valor in series:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+
+        vistos = set()
+        for nombre, ayuda, valor, etiquetas in indicadores:
+            nombre = PREFIJO + nombre
+            if nombre not in vistos:
+                _cabecera(lineas, nombre, ayuda, "gauge")
+                vistos.add(nombre)
+            lineas.append(f"{nombre}{_etiquetas(tuple(sorted((etiquetas or {}).items())))} {_numero(valor)}")
+
+        return "\n".join(lineas) + "\n"
+
+
+def _agrupar(items):
+    """[((nombre, etiquetas), valor)] ordenados -> [(nombre, [(etiquetas, valor)])]"""
+    grupos = []
+    for (nombre, etiquetas), valor in items:
+        if not grupos or grupos[-1][0] != nombre:
+            grupos.append((nombre, []))
+        grupos[-1][1].append((etiquetas, valor))
+    return grupos
+
+
+def _cabecera(lineas, nombre, ayuda, tipo):
+    if ayuda:
+        lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _numero(valor):
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, int):
+        return str(valor)
+    return repr(float(valor))
+
+
+_registro = RegistroMetricas()
+_registro.describir(PREFIJO + "etapa_segundos", "Duración de cada etapa de una consulta a ADRES")
+_registro.describir(PREFIJO + "consulta_segundos", "Duración total de una consulta por motor y estado final")
+_registro.describir(PREFIJO + "consultas_total", "Consultas terminadas por motor y estado final")
+
+
+def obtener_registro():
+    """Devuelve el registro de métricas global"""
+    return _registro
+
+
+@contextmanager
+def medir_etapa(etapa, etapas=None):
+    """
+    Mide una etapa de la consulta y la agrega al histograma adres_etapa_segundos
+
+    Args:
+        etapa: Nombre de la etapa (ver ETAPAS_CONSULTA y las esperas espera_*)
+        etapas: Diccionario etapa -> segundos de la consulta (opcional); se
+            adjunta al estado del trabajo. Si la etapa se repite, se acumula
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        if etapas is not None:
+            etapas[etapa] = round(etapas.get(etapa, 0.0) + duracion, 3)
+        _registro.observar(PREFIJO + "etapa_segundos", duracion, etapa=etapa)
+
+
+def registrar_consulta(motor, estado, segundos):
+    """Cuenta una consulta terminada y su duración total"""
+    _registro.incrementar(PREFIJO + "consultas_total", motor=motor, estado=estado)
+    _registro.observar(PREFIJO + "consulta_segundos", segundos, motor=motor, estado=estado)
+
+
+def resumen_etapas():
+    """Cantidad, media y percentiles aproximados por etapa (para /api/health)"""
+    return _registro.resumen(PREFIJO + "etapa_segundos")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# mocks/adres_mock.py
+"""Réplica local del formulario ADRES para pruebas sin salir a internet
+
+Uso:
+    python mocks/adres_mock.py --puerto 5055
+    python mocks/adres_mock.py --latencia 1.5 --jitter 0.5 --tasa-error 0.05 --tasa-sin-datos 0.02
+
+    ADRES_URL=http://localhost:5055/consulte-su-eps \
+    ADRES_URL_FORMULARIO=http://localhost:5055/bdua_internet/Pages/ConsultarAfiliadoWeb.aspx \
+    python server.py
+"""
+
+import io
+import html
+import time
+import uuid
+import random
+import zlib
+import argparse
+import threading
+
+from flask import Flask, request, make_response, abort, jsonify
+from PIL import Image, ImageDraw
+
+
+TIPOS_DOCUMENTO = ['CC', 'TI', 'CE', 'PA', 'RC', 'NU', 'AS', 'MS', 'CD', 'CN', 'SC', 'PE', 'PT']
+ENTIDADES = ['NUEVA EPS S.A.', 'SANITAS S.A.S.', 'SURA EPS', 'SALUD TOTAL S.A.', 'COOSALUD EPS-S']
+RUTA_FORMULARIO = "/bdua_internet/Pages/ConsultarAfiliadoWeb.aspx"
+COOKIE_SESION = "ASP.NET_SessionId"
+
+PAGINA_PRINCIPAL = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulte su EPS</title></head>
+<body>
+<h1>Consulte su EPS</h1>
+<iframe id="iframeConsulta" src="{ruta}" width="900" height="600"></iframe>
+</body></html>"""
+
+PAGINA_FORMULARIO = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consultar Afiliado</title></head>
+<body>
+<form method="post" action="./ConsultarAfiliadoWeb.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="1A2B3C4D" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{validacion}" />
+<select name="tipoDoc" id="tipoDoc" class="txtBox">{opciones}</select>
+<input name="txtNumDoc" type="text" id="txtNumDoc" class="txtBox" placeholder="Número de documento" />
+<img id="Capcha_CaptchaImageUP" src="Captcha.aspx?guid={guid}" alt="captcha" />
+<input name="Capcha$CaptchaTextBox" type="text" id="Capcha_CaptchaTextBox" />
+<input type="submit" name="btnConsultar" value="Consultar" id="btnConsultar" />
+{mensaje}
+</form>
+{script}
+</body></html>"""
+
+PAGINA_RESULTADO = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Respuesta Consulta</title></head>
+<body>
+<table id="GridViewBasica"><tr><th>COLUMNAS</th><th>DATOS</th></tr>
+<tr><td>TIPO DE IDENTIFICACIÓN</td><td>{tipo}</td></tr>
+<tr><td>NÚMERO DE IDENTIFICACION</td><td>{numero}</td></tr>
+<tr><td>NOMBRES</td><td>{nombres}</td></tr>
+<tr><td>APELLIDOS</td><td>{apellidos}</td></tr>
+<tr><td>FECHA DE NACIMIENTO</td><td>**/**/**</td></tr>
+<tr><td>DEPARTAMENTO</td><td>{departamento}</td></tr>
+<tr><td>MUNICIPIO</td><td>{municipio}</td></tr>
+</table>
+<table id="GridViewAfiliacion" class="DataGrid">
+<tr class="DataGrid_HeaderStyle"><td>ESTADO</td><td>ENTIDAD</td><td>REGIMEN</td><td>FECHA DE AFILIACIÓN EFECTIVA</td><td>FECHA DE FINALIZACIÓN DE AFILIACIÓN</td><td>TIPO DE AFILIADO</td></tr>
+{filas}
+</table>
+<p>Fecha de Impresión: <span id="lblProce">{fecha}</span></p>
+<p>Estación de origen: <span id="lblIP">127.0.0.1</span></p>
+</body></html>"""
+
+PAGINA_ERROR = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Error</title></head>
+<body><h2>Error en el servidor</h2><p>Intente nuevamente más tarde.</p></body></html>"""
+
+PAGINA_SIN_DATOS = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Respuesta Consulta</title></head>
+<body><p>El servicio no está disponible en este momento.</p></body></html>"""
+
+FILA_AFILIACION = """<tr class="{clase}" align="center">
+<td>{estado}</td><td>{entidad}</td><td>{regimen}</td><td>{desde}</td><td>31/12/2999</td><td>{tipo_afiliado}</td></tr>"""
+
+
+def _imagen_captcha(texto):
+    """Genera un PNG pequeño con los dígitos del CAPTCHA"""
+    imagen = Image.new("RGB", (120, 40), "white")
+    dibujo = ImageDraw.Draw(imagen)
+    dibujo.text((20, 12), texto, fill="black")
+    salida = io.BytesIO()
+    imagen.save(salida, format="PNG")
+    return salida.getvalue()
+
+
+def _pagina_resultado(tipo_doc, numero_doc):
+    """Resultado determinístico a partir del número de documento"""
+    semilla = zlib.crc32(f"{tipo_doc}{numero_doc}".encode())
+    generador = random.Random(semilla)
+    filas = []
+    for indice in range(1 + semilla % 2):
+        filas.append(FILA_AFILIACION.format(
+            clase="DataGrid_Item" if indice % 2 == 0 else "DataGrid_AlternatingItem",
+            estado="ACTIVO" if indice == 0 else "RETIRADO",
+            entidad=generador.choice(ENTIDADES),
+            regimen=generador.choice(["CONTRIBUTIVO", "SUBSIDIADO"]),
+            desde=f"{generador.randint(1, 28):02d}/{generador.randint(1, 12):02d}/{generador.randint(1995, 2023)}",
+            tipo_afiliado=generador.choice(["COTIZANTE", "BENEFICIARIO", "CABEZA DE FAMILIA"]),
+        ))
+    return PAGINA_RESULTADO.format(
+        tipo=html.escape(tipo_doc),
+        numero=html.escape(numero_doc),
+        nombres=generador.choice(["MARIA", "JUAN", "ANA", "CARLOS"]),
+        apellidos=generador.choice(["GOMEZ PEREZ", "RODRIGUEZ DIAZ", "LOPEZ RUIZ"]),
+        departamento="BOGOTA D.C.",
+        municipio="BOGOTA D.C.",
+        filas="\n".join(filas),
+        fecha="01/01/2025 08:00:00",
+    )
+
+
+def crear_app(captcha_estricto=False, latencia=0.0, jitter=0.0, latencia_pagina=0.0,
+              tasa_error=0.0, tasa_sin_datos=0.0, semilla=None):
+    """
+    Crea la aplicación Flask que imita el formulario ASP.NET de ADRES
+
+    Args:
+        captcha_estricto: Si True, exige el texto exacto del CAPTCHA; si False
+            acepta cualquier valor no vacío (útil con un resolvedor simulado)
+        latencia: Segundos promedio que tarda ADRES en responder una consulta
+        jitter: Variación aleatoria (+/-) de la latencia
+        latencia_pagina: Segundos que tarda en servir el formulario vacío
+        tasa_error: Fracción de consultas que responden 500 (página de error)
+        tasa_sin_datos: Fracción de consultas cuyo resultado viene sin datos
+        semilla: Semilla de las fallas y latencias (corridas reproducibles)
+
+    Returns:
+        Flask: Aplicación lista para app.run() o test_client()
+    """
+    app = Flask(__name__)
+    sesiones = {}
+    respuestas = {}
+    lock = threading.Lock()
+    azar = random.Random(semilla)
+    stats = {"formularios": 0, "consultas": 0, "errores": 0, "sin_datos": 0, "captcha_errado": 0}
+
+    def _sortear():
+        """Latencia y desenlace de una consulta (con el lock: Random no es thread-safe)"""
+        with lock:
+            demora = max(0.0, latencia + azar.uniform(-jitter, jitter))
+            dado = azar.random()
+        if dado < tasa_error:
+            return demora, "error"
+        if dado < tasa_error + tasa_sin_datos:
+            return demora, "sin_datos"
+        return demora, "ok"
+
+    def _sesion():
+        sesion_id = request.cookies.get(COOKIE_SESION)
+        with lock:
+            if sesion_id not in sesiones:
+                sesion_id = uuid.uuid4().hex
+                sesiones[sesion_id] = {}
+            return sesion_id, sesiones[sesion_id]
+
+    def _formulario(sesion, mensaje="", script=""):
+        sesion["viewstate"] = uuid.uuid4().hex
+        sesion["validacion"] = uuid.uuid4().hex
+        sesion["captcha"] = f"{random.randint(0, 99999):05d}"
+        opciones = "".join(f'<option value="{tipo}">{tipo}</option>' for tipo in TIPOS_DOCUMENTO)
+        return PAGINA_FORMULARIO.format(
+            viewstate=sesion["viewstate"],
+            validacion=sesion["validacion"],
+            opciones=opciones,
+            guid=uuid.uuid4().hex,
+            mensaje=mensaje,
+            script=script,
+        )
+
+    def _responder(contenido, sesion_id):
+        respuesta = make_response(contenido)
+        respuesta.set_cookie(COOKIE_SESION, sesion_id)
+        return respuesta
+
+    @app.route("/consulte-su-eps")
+    def principal():
+        return PAGINA_PRINCIPAL.format(ruta=RUTA_FORMULARIO)
+
+    @app.route(RUTA_FORMULARIO, methods=["GET", "POST"])
+    def formulario():
+        sesion_id, sesion = _sesion()
+        if request.method == "GET":
+            with lock:
+                stats["formularios"] += 1
+            if latencia_pagina:
+                time.sleep(latencia_pagina)
+            return _responder(_formulario(sesion), sesion_id)
+
+        valido = (
+            request.form.get("__VIEWSTATE") == sesion.get("viewstate")
+            and request.form.get("__EVENTVALIDATION") == sesion.get("validacion")
+        )
+        captcha = request.form.get("Capcha$CaptchaTextBox", "").strip()
+        captcha_ok = captcha == sesion.get("captcha") if captcha_estricto else bool(captcha)
+        tipo_doc = request.form.get("tipoDoc", "")
+        numero_doc = request.form.get("txtNumDoc", "").strip()
+
+        if not valido:
+            return _responder(_formulario(sesion, mensaje="<span>Sesión expirada</span>"), sesion_id)
+        if not captcha_ok:
+            with lock:
+                stats["captcha_errado"] += 1
+            return _responder(_formulario(sesion, mensaje="<span>Código de verificación errado</span>"), sesion_id)
+
+        demora, desenlace = _sortear()
+        time.sleep(demora)
+        with lock:
+            stats["consultas"] += 1
+            if desenlace == "error":
+                stats["errores"] += 1
+            elif desenlace == "sin_datos":
+                stats["sin_datos"] += 1
+        if desenlace == "error":
+            return PAGINA_ERROR, 500
+
+        token = uuid.uuid4().hex
+        with lock:
+            respuestas[token] = (
+                PAGINA_SIN_DATOS if desenlace == "sin_datos" else _pagina_resultado(tipo_doc, numero_doc)
+            )
+        script = f"<script>window.open('RespuestaConsulta.aspx?tokenId={token}', '_blank');</script>"
+        return _responder(_formulario(sesion, script=script), sesion_id)
+
+    @app.route("/bdua_internet/Pages/Captcha.aspx")
+    def captcha():
+        sesion_id, sesion = _sesion()
+        respuesta = make_response(_imagen_captcha(sesion.get("captcha", "00000")))
+        respuesta.headers["Content-Type"] = "image/png"
+        respuesta.set_cookie(COOKIE_SESION, sesion_id)
+        return respuesta
+
+    @app.route("/bdua_internet/Pages/RespuestaConsulta.aspx")
+    def respuesta_consulta():
+        with lock:
+            contenido = respuestas.pop(request.args.get("tokenId", ""), None)
+        if contenido is None:
+            abort(404)
+        return contenido
+
+    @app.route("/stats", methods=["GET"])
+    def estadisticas():
+        with lock:
+            return jsonify(dict(stats, sesiones=len(sesiones), respuestas_pendientes=len(respuestas)))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplica local del formulario ADRES")
+    parser.add_argument("--puerto", type=int, default=5055)
+    parser.add_argument("--captcha-estricto", action="store_true",
+                        help="Exigir el texto exacto del CAPTCHA")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="Segundos promedio de respuesta a una consulta")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--latencia-pagina", type=float, default=0.0,
+                        help="Segundos para servir el formulario vacío")
+    parser.add_argument("--tasa-error", type=float, default=0.0,
+                        help="Fracción de consultas que responden 500")
+    parser.add_argument("--tasa-sin-datos", type=float, default=0.0,
+                        help="Fracción de consultas con resultado vacío")
+    parser.add_argument("--semilla", type=int, default=None)
+    args = parser.parse_args()
+
+    app = crear_app(
+        captcha_estricto=args.captcha_estricto,
+        latencia=args.latencia,
+        jitter=args.jitter,
+        latencia_pagina=args.latencia_pagina,
+        tasa_error=args.tasa_error,
+        tasa_sin_datos=args.tasa_sin_datos,
+        semilla=args.semilla,
+    )
+    print(f"Réplica ADRES en http://localhost:{args.puerto}/consulte-su-eps")
+    app.run(host="127.0.0.1", port=args.puerto, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
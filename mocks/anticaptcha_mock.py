@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# mocks/anticaptcha_mock.py
+"""Servidor local que imita la API de Anti-Captcha (createTask / getTaskResult)
+
+Uso:
+    python mocks/anticaptcha_mock.py --puerto 5056 --demora 3
+
+    ANTICAPTCHA_URL=http://localhost:5056 python server.py
+"""
+
+import time
+import random
+import argparse
+import itertools
+import threading
+
+from flask import Flask, request, jsonify
+
+
+def crear_app(demora=3.0, jitter=1.0, texto="12345", tasa_error=0.0):
+    """
+    Crea la aplicación Flask del resolvedor simulado
+
+    Args:
+        demora: Segundos promedio hasta que una tarea queda lista
+        jitter: Variación aleatoria (+/-) de la demora
+        texto: Texto devuelto como solución
+        tasa_error: Fracción de tareas que terminan en ERROR_CAPTCHA_UNSOLVABLE
+
+    Returns:
+        Flask: Aplicación lista para app.run() o test_client()
+    """
+    app = Flask(__name__)
+    tareas = {}
+    contador = itertools.count(1)
+    lock = threading.Lock()
+    stats = {"createTask": 0, "getTaskResult": 0}
+
+    @app.route("/createTask", methods=["POST"])
+    def crear_tarea():
+        datos = request.get_json(silent=True) or {}
+        if not datos.get("clientKey"):
+            return jsonify({"errorId": 1, "errorCode": "ERROR_KEY_DOES_NOT_EXIST",
+                            "errorDescription": "Account authorization key not found"})
+        if not (datos.get("task") or {}).get("body"):
+            return jsonify({"errorId": 16, "errorCode": "ERROR_NO_SUCH_METHOD",
+                            "errorDescription": "Task body is empty"})
+
+        with lock:
+            stats["createTask"] += 1
+            task_id = next(contador)
+            tareas[task_id] = {
+                "lista": time.time() + max(0.0, demora + random.uniform(-jitter, jitter)),
+                "falla": random.random() < tasa_error,
+            }
+        return jsonify({"errorId": 0, "taskId": task_id})
+
+    @app.route("/getTaskResult", methods=["POST"])
+    def resultado_tarea():
+        datos = request.get_json(silent=True) or {}
+        with lock:
+            stats["getTaskResult"] += 1
+            tarea = tareas.get(datos.get("taskId"))
+        if tarea is None:
+            return jsonify({"errorId": 16, "errorCode": "ERROR_NO_SUCH_CAPCHA_ID",
+                            "errorDescription": "Task not found"})
+        if time.time() < tarea["lista"]:
+            return jsonify({"errorId": 0, "status": "processing"})
+
+        with lock:
+            tareas.pop(datos.get("taskId"), None)
+        if tarea["falla"]:
+            return jsonify({"errorId": 12, "errorCode": "ERROR_CAPTCHA_UNSOLVABLE",
+                            "errorDescription": "Captcha could not be solved"})
+        return jsonify({"errorId": 0, "status": "ready", "solution": {"text": texto},
+                        "cost": "0.00070"})
+
+    @app.route("/stats", methods=["GET"])
+    def estadisticas():
+        with lock:
+            return jsonify(dict(stats, pendientes=len(tareas)))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anti-Captcha simulado")
+    parser.add_argument("--puerto", type=int, default=5056)
+    parser.add_argument("--demora", type=float, default=3.0)
+    parser.add_argument("--jitter", type=float, default=1.0)
+    parser.add_argument("--texto", default="12345")
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = crear_app(args.demora, args.jitter, args.texto, args.tasa_error)
+    print(f"Anti-Captcha simulado en http://localhost:{args.puerto}")
+    app.run(host="127.0.0.1", port=args.puerto, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
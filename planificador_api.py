@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# planificador_api.py
+"""Planificador central de consultas: cola acotada con prioridad y turnos por cliente"""
+
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from config import PLANIFICADOR_TRABAJADORES, PLANIFICADOR_COLA_MAX
+
+
+# Menor número = se atiende primero
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_LOTE = 1
+NOMBRES_PRIORIDAD = {PRIORIDAD_INTERACTIVA: "interactiva", PRIORIDAD_LOTE: "lote"}
+
+
+class ColaLlena(Exception):
+    """La cola de una prioridad está llena; el cliente debe reintentar"""
+
+    def __init__(self, en_cola, capacidad):
+        super().__init__(f"Cola llena ({en_cola}/{capacidad})")
+        self.en_cola = en_cola
+        self.capacidad = capacidad
+
+
+class _Tarea:
+    def __init__(self, funcion, args, cliente, etiqueta):
+        self.funcion = funcion
+        self.args = args
+        self.cliente = cliente
+        self.etiqueta = etiqueta
+        self.futuro = Future()
+        self.encolada = time.time()
+
+
+class Planificador:
+    """
+    Ejecuta tareas con un número fijo de trabajadores
+
+    Cada prioridad tiene su propia cola acotada; dentro de una prioridad los
+    clientes (IP del usuario, ID del lote) se atienden por turnos, así un
+    lote grande o un cliente insistente no acapara los navegadores.
+    """
+
+    def __init__(self, trabajadores=PLANIFICADOR_TRABAJADORES, capacidad=PLANIFICADOR_COLA_MAX):
+        self.trabajadores = max(1, trabajadores)
+        self.capacidad = max(1, capacidad)
+
+        self._condicion = threading.Condition()
+        # prioridad -> OrderedDict(cliente -> deque de tareas); el primer
+        # cliente es el que tiene el turno
+        self._colas = {}
+        self._en_cola = {}
+        self._en_ejecucion = 0
+        self._cerrado = False
+
+        self._stats = {
+            "aceptadas": 0,
+            "rechazadas": 0,
+            "completadas": 0,
+            "espera_total": 0.0,
+            "espera_maxima": 0.0,
+        }
+
+        self._hilos = [
+            threading.Thread(target=self._trabajar, name=f"planificador-{i}", daemon=True)
+            for i in range(self.trabajadores)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    # ------------------------------------------------------------------
+    # Encolar
+    # ------------------------------------------------------------------
+    def enviar(self, funcion, *args, prioridad=PRIORIDAD_INTERACTIVA, cliente=None,
+               etiqueta=None, esperar_cupo=False):
+        """
+        Encola funcion(*args)
+
+        Args:
+            funcion: Callable a ejecutar en un trabajador
+            prioridad: PRIORIDAD_INTERACTIVA o PRIORIDAD_LOTE
+            cliente: Clave de equidad (las tareas de un cliente se turnan
+                con las de los demás)
+            etiqueta: Identificador para consultar la posición en cola
+            esperar_cupo: Si la cola está llena, esperar en lugar de fallar
+
+        Returns:
+            Future: Resultado de la tarea
+
+        Raises:
+            ColaLlena: Si la cola de esa prioridad está llena y no se espera
+        """
+        tarea = _Tarea(funcion, args, cliente, etiqueta)
+        with self._condicion:
+            while self._en_cola.get(prioridad, 0) >= self.capacidad:
+                if not esperar_cupo:
+                    self._stats["rechazadas"] += 1
+                    raise ColaLlena(self._en_cola[prioridad], self.capacidad)
+                self._condicion.wait()
+
+            clientes = self._colas.setdefault(prioridad, OrderedDict())
+            clientes.setdefault(cliente, deque()).append(tarea)
+            self._en_cola[prioridad] = self._en_cola.get(prioridad, 0) + 1
+            self._stats["aceptadas"] += 1
+            self._condicion.notify_all()
+        return tarea.futuro
+
+    def ejecutar(self, funcion, *args, prioridad=PRIORIDAD_LOTE, cliente=None, etiqueta=None):
+        """Encola esperando cupo y bloquea hasta tener el resultado"""
+        return self.enviar(
+            funcion, *args, prioridad=prioridad, cliente=cliente,
+            etiqueta=etiqueta, esperar_cupo=True
+        ).result()
+
+    # ------------------------------------------------------------------
+    # Orden de atención
+    # ------------------------------------------------------------------
+    def _siguiente(self):
+        """Saca la próxima tarea (con el lock tomado) o None si no hay"""
+        for prioridad in sorted(self._colas):
+            clientes = self._colas[prioridad]
+            if not clientes:
+                continue
+            cliente, tareas = next(iter(clientes.items()))
+            tarea = tareas.popleft()
+            # El cliente pasa al final de la ronda (o sale si no le quedan tareas)
+            del clientes[cliente]
+            if tareas:
+                clientes[cliente] = tareas
+            self._en_cola[prioridad] -= 1
+            return tarea
+        return None
+
+    def _orden_atencion(self):
+        """Etiquetas en el orden en que se atenderían (con el lock tomado)"""
+        orden = []
+        for prioridad in sorted(self._colas):
+            por_cliente = [list(tareas) for tareas in self._colas[prioridad].values()]
+            rondas = max((len(tareas) for tareas in por_cliente), default=0)
+            for turno in range(rondas):
+                for tareas in por_cliente:
+                    if turno < len(tareas):
+                        orden.append(tareas[turno].etiqueta)
+        return orden
+
+    def posicion(self, etiqueta):
+        """
+        Posición (1 = la próxima en atenderse) de una tarea en cola
+
+        Returns:
+            int or None: Posición, o None si ya no está en cola
+        """
+        with self._condicion:
+            orden = self._orden_atencion()
+        try:
+            return orden.index(etiqueta) + 1
+        except ValueError:
+            return None
+
+    # ------------------------------------------------------------------
+    # Trabajadores
+    # ------------------------------------------------------------------
+    def _trabajar(self):
+        while True:
+            with self._condicion:
+                while True:
+                    if self._cerrado:
+                        return
+                    tarea = self._siguiente()
+                    if tarea is not None:
+                        break
+                    self._condicion.wait()
+                espera = time.time() - tarea.encolada
+                self._en_ejecucion += 1
+                self._stats["espera_total"] += espera
+                self._stats["espera_maxima"] = max(self._stats["espera_maxima"], espera)
+                # Libera cupo para quien espera encolar
+                self._condicion.notify_all()
+
+            if tarea.futuro.set_running_or_notify_cancel():
+                try:
+                    tarea.futuro.set_result(tarea.funcion(*tarea.args))
+                except BaseException as e:
+                    tarea.futuro.set_exception(e)
+
+            with self._condicion:
+                self._en_ejecucion -= 1
+                self._stats["completadas"] += 1
+
+    def cerrar(self):
+        """Detiene los trabajadores (las tareas en cola no se ejecutan)"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+
+    def estadisticas(self):
+        with self._condicion:
+            stats = dict(self._stats)
+            stats["en_cola"] = {
+                NOMBRES_PRIORIDAD.get(prioridad, str(prioridad)): cantidad
+                for prioridad, cantidad in self._en_cola.items()
+            }
+            stats["en_ejecucion"] = self._en_ejecucion
+            iniciadas = stats["completadas"] + self._en_ejecucion
+
+        stats["trabajadores"] = self.trabajadores
+        stats["capacidad_cola"] = self.capacidad
+        stats["espera_media"] = round(stats.pop("espera_total") / iniciadas, 3) if iniciadas else 0.0
+        stats["espera_maxima"] = round(stats["espera_maxima"], 3)
+        return stats
+
+
+_planificador = None
+_planificador_lock = threading.Lock()
+
+
+def obtener_planificador():
+    """Devuelve el planificador global (se crea al primer uso)"""
+    global _planificador
+    with _planificador_lock:
+        if _planificador is None:
+            _planificador = Planificador()
+        return _planificador
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# pool_api.py
+"""Pool de navegadores Chrome reutilizables entre consultas"""
+
+import time
+import threading
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException, TimeoutException
+from config import URL, POOL_NAVEGADORES, POOL_MAX_USOS, POOL_HEADLESS, POOL_TIMEOUT_PRESTAMO
+from browser_api import iniciar_navegador, reiniciar_navegador
+from metricas_api import medir_etapa
+
+
+class PoolNavegadores:
+    """Mantiene navegadores precalentados y los presta uno por consulta"""
+
+    def __init__(self, tamano=POOL_NAVEGADORES, max_usos=POOL_MAX_USOS,
+                 headless=POOL_HEADLESS, url=URL):
+        self.tamano = max(1, tamano)
+        self.max_usos = max(1, max_usos)
+        self.headless = headless
+        self.url = url
+
+        self._condicion = threading.Condition()
+        self._libres = []
+        self._usos = {}
+        self._prestados = set()
+        self._creando = 0
+        self._cerrado = False
+
+        self._stats = {
+            "creados": 0,
+            "reciclados": 0,
+            "fallos": 0,
+            "prestamos": 0,
+            "espera_total": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida de los navegadores
+    # ------------------------------------------------------------------
+    def _total(self):
+        return len(self._libres) + len(self._prestados) + self._creando
+
+    def _crear_navegador(self):
+        """Inicia un Chrome nuevo y carga el formulario"""
+        with medir_etapa("inicio_navegador"):
+            driver = iniciar_navegador(headless=self.headless)
+        try:
+            with medir_etapa("carga_pagina"):
+                driver.get(self.url)
+        except Exception:
+            self._quitar(driver)
+            raise
+        return driver
+
+    def _quitar(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _descartar(self, driver):
+        """Cierra un navegador y libera su cupo en el pool"""
+        self._quitar(driver)
+        with self._condicion:
+            self._usos.pop(id(driver), None)
+            self._stats["reciclados"] += 1
+            self._condicion.notify()
+
+    def precalentar(self):
+        """Crea navegadores hasta completar el tamaño configurado"""
+        while True:
+            with self._condicion:
+                if self._cerrado or self._total() >= self.tamano:
+                    return
+                self._creando += 1
+
+            try:
+                driver = self._crear_navegador()
+            except Exception as e:
+                print(f"[!] No se pudo precalentar navegador: {e}")
+                with self._condicion:
+                    self._creando -= 1
+                    self._stats["fallos"] += 1
+                    self._condicion.notify()
+                return
+
+            with self._condicion:
+                self._creando -= 1
+                self._stats["creados"] += 1
+                self._usos[id(driver)] = 0
+                self._libres.append(driver)
+                self._condicion.notify()
+
+    def precalentar_en_segundo_plano(self):
+        """Lanza el precalentamiento sin bloquear al llamador"""
+        hilo = threading.Thread(target=self.precalentar, daemon=True)
+        hilo.start()
+        return hilo
+
+    # ------------------------------------------------------------------
+    # Préstamo y devolución
+    # ------------------------------------------------------------------
+    def obtener(self, timeout=POOL_TIMEOUT_PRESTAMO):
+        """
+        Presta un navegador listo en el formulario
+
+        Args:
+            timeout: Segundos máximos a esperar por un navegador libre
+
+        Returns:
+            WebDriver: Navegador prestado (devolver con liberar())
+
+        Raises:
+            TimeoutError: Si no hubo navegador disponible a tiempo
+        """
+        inicio = time.time()
+        limite = inicio + timeout
+        crear = False
+
+        with self._condicion:
+            while True:
+                if self._cerrado:
+                    raise RuntimeError("El pool de navegadores está cerrado")
+                if self._libres:
+                    driver = self._libres.pop()
+                    break
+                if self._total() < self.tamano:
+                    self._creando += 1
+                    crear = True
+                    break
+                restante = limite - time.time()
+                if restante <= 0:
+                    raise TimeoutError("No hay navegadores disponibles en el pool")
+                self._condicion.wait(restante)
+
+        if crear:
+            try:
+                driver = self._crear_navegador()
+            except Exception:
+                with self._condicion:
+                    self._creando -= 1
+                    self._stats["fallos"] += 1
+                    self._condicion.notify()
+                raise
+            with self._condicion:
+                self._creando -= 1
+                self._stats["creados"] += 1
+                self._usos[id(driver)] = 0
+
+        with self._condicion:
+            self._prestados.add(driver)
+            self._stats["prestamos"] += 1
+            self._stats["espera_total"] += time.time() - inicio
+
+        return driver
+
+    def liberar(self, driver, fallido=False):
+        """
+        Devuelve un navegador al pool
+
+        El navegador se recicla (se cierra y se crea otro) si falló, si alcanzó
+        el máximo de usos o si no se pudo reiniciar. En otro caso se limpia y se
+        deja cargado en el formulario para la siguiente consulta.
+
+        Args:
+            driver: Navegador obtenido con obtener()
+            fallido: True si el navegador quedó en estado inválido (crash)
+        """
+        with self._condicion:
+            self._prestados.discard(driver)
+            usos = self._usos.get(id(driver), 0) + 1
+            self._usos[id(driver)] = usos
+            if fallido:
+                self._stats["fallos"] += 1
+            reciclar = fallido or usos >= self.max_usos or self._cerrado
+
+        if not reciclar:
+            try:
+                with medir_etapa("reinicio_navegador"):
+                    reiniciar_navegador(driver, self.url)
+            except Exception as e:
+                print(f"[!] Navegador descartado al reiniciar: {e}")
+                with self._condicion:
+                    self._stats["fallos"] += 1
+                reciclar = True
+
+        if reciclar:
+            self._descartar(driver)
+            if not self._cerrado:
+                self.precalentar_en_segundo_plano()
+            return
+
+        with self._condicion:
+            self._libres.append(driver)
+            self._condicion.notify()
+
+    @contextmanager
+    def prestar(self, timeout=POOL_TIMEOUT_PRESTAMO):
+        """Context manager que presta un navegador y lo devuelve al salir"""
+        driver = self.obtener(timeout)
+        fallido = False
+        try:
+            yield driver
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            fallido = True
+            raise
+        finally:
+            self.liberar(driver, fallido=fallido)
+
+    def cerrar(self):
+        """Cierra todos los navegadores libres y rechaza nuevos préstamos"""
+        with self._condicion:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._condicion.notify_all()
+        for driver in libres:
+            self._quitar(driver)
+
+    def estadisticas(self):
+        """Devuelve un resumen del estado del pool"""
+        with self._condicion:
+            prestamos = self._stats["prestamos"]
+            return {
+                "tamano": self.tamano,
+                "max_usos": self.max_usos,
+                "headless": self.headless,
+                "libres": len(self._libres),
+                "prestados": len(self._prestados),
+                "creando": self._creando,
+                "creados": self._stats["creados"],
+                "reciclados": self._stats["reciclados"],
+                "fallos": self._stats["fallos"],
+                "prestamos": prestamos,
+                "espera_promedio_ms": round(self._stats["espera_total"] * 1000 / prestamos, 1) if prestamos else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """Devuelve el pool global, creándolo y precalentándolo la primera vez"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolNavegadores()
+            _pool.precalentar_en_segundo_plano()
+        return _pool
+
+
+def estadisticas_pool():
+    """Estadísticas del pool global sin forzar su creación"""
+    with _pool_lock:
+        if _pool is None:
+            return {"iniciado": False, "tamano": POOL_NAVEGADORES}
+        stats = _pool.estadisticas()
+    stats["iniciado"] = True
+    return stats
@@ -2,65 +2,104 @@
 # results_api.py (OPTIMIZADO)
 """API para captura y almacenamiento de resultados - VERSION OPTIMIZADA"""
 
-import os
-import time
 import json
 import re
+import time
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from config import OUTPUT_DIR
+from config import ARTEFACTOS_PERFIL
 from browser_api import cambiar_a_nueva_ventana, buscar_iframe_con_contenido
+from espera_api import esperar_resultados
+from escritor_api import (
+    obtener_escritor,
+    compresion_disponible,
+    EXTENSIONES_COMPRESION,
+    COMPRESION_ARTEFACTOS,
+)
+from artefactos_api import obtener_artefactos
+from metricas_api import medir_etapa
 
 
-def capturar_resultados(driver, ventanas_anteriores, timeout=15):
+def capturar_resultados(driver, ventanas_anteriores, timeout=15, etapas=None):
     """
-    Captura los resultados después de enviar el formulario (OPTIMIZADO)
+    Captura los resultados después de enviar el formulario
     
     Args:
         driver: WebDriver de Selenium
         ventanas_anteriores: Lista de handles de ventanas antes del envío
-        timeout: Tiempo máximo de espera (reducido a 15s)
+        timeout: Tiempo máximo de espera de la ventana de resultados
+        etapas: Diccionario de tiempos por etapa (metricas_api, opcional)
     
     Returns:
         str: Texto del resultado capturado
     """
     # Esperar nueva ventana o iframe
-    nueva_ventana = cambiar_a_nueva_ventana(driver, ventanas_anteriores, timeout)
-    
-    if not nueva_ventana:
-        # Intentar detectar iframe con contenido
-        buscar_iframe_con_contenido(driver)
+    with medir_etapa("nueva_ventana", etapas):
+        nueva_ventana = cambiar_a_nueva_ventana(driver, ventanas_anteriores, timeout, etapas)
+        
+        if not nueva_ventana:
+            # Intentar detectar iframe con contenido
+            buscar_iframe_con_contenido(driver)
     
-    # OPTIMIZACIÓN: Reducir espera y usar WebDriverWait para elementos específicos
-    try:
-        # Esperar a que aparezca algún elemento clave de los resultados
-        wait = WebDriverWait(driver, 10)
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-        # Pequeña espera adicional para asegurar que todo cargó
-        time.sleep(1)
-    except:
-        # Si no se encuentra tabla, esperar un poco más
-        time.sleep(2)
-    
-    # Extraer HTML completo
-    try:
-        page_source = driver.page_source
-        return page_source
-    except Exception as e:
-        print(f"[!] Error capturando page_source: {e}")
-        # Fallback: intentar obtener el body
+    with medir_etapa("captura_resultado", etapas):
+        # Esperar a que aparezca una fila del DataGrid (o a que termine de cargar)
+        if not esperar_resultados(driver, timeout=10, tiempos=etapas):
+            print("[!] La página de resultados no terminó de cargar a tiempo")
+        
+        # Extraer HTML completo
         try:
-            body_text = driver.find_element(By.TAG_NAME, "body").text
-            return body_text
-        except:
-            return None
+            page_source = driver.page_source
+            return page_source
+        except Exception as e:
+            print(f"[!] Error capturando page_source: {e}")
+            # Fallback: intentar obtener el body
+            try:
+                body_text = driver.find_element(By.TAG_NAME, "body").text
+                return body_text
+            except:
+                return None
+
+
+# Etiquetas de la tabla de información básica -> clave en el JSON
+_ETIQUETAS_BASICAS = (
+    ("tipo_identificacion", "TIPO DE IDENTIFICACIÓN"),
+    ("numero_identificacion", "NÚMERO DE IDENTIFICACION"),
+    ("nombres", "NOMBRES"),
+    ("apellidos", "APELLIDOS"),
+    ("fecha_nacimiento", "FECHA DE NACIMIENTO"),
+    ("departamento", "DEPARTAMENTO"),
+    ("municipio", "MUNICIPIO"),
+)
+_CAMPOS_BASICOS = tuple(campo for campo, _ in _ETIQUETAS_BASICAS)
+_CAMPOS_AFILIACION = (
+    "estado", "entidad", "regimen", "fecha_afiliacion", "fecha_finalizacion", "tipo_afiliado"
+)
+
+# Un solo patrón para la tabla básica y las filas del DataGrid. Todas las
+# alternativas empiezan por "<", así que re salta directo entre etiquetas
+# HTML sin probar cada posición del __VIEWSTATE. Las etiquetas se verifican
+# con lookbehind y las filas con lookahead: ninguna coincidencia consume el
+# "<" de la siguiente, igual que las búsquedas independientes de antes.
+_PATRON_RESULTADO = re.compile(
+    "<(?:"
+    "(?:"
+    + "|".join(f"(?<={re.escape(etiqueta)}<)(?P<{campo}>)" for campo, etiqueta in _ETIQUETAS_BASICAS)
+    + r")/td><td>(?P<valor>[^<]+)(?=</td>)"
+    + r'|(?=tr class="DataGrid_(?:Item|AlternatingItem)" align="center">\s*<td>'
+    + "</td><td>".join(f"(?P<{campo}>[^<]+)" for campo in _CAMPOS_AFILIACION)
+    + "</td>)"
+    ")"
+)
+_PATRON_FECHA_IMPRESION = re.compile(r'Fecha de Impresión:.*?<span[^>]*>([^<]+)</span>')
+_PATRON_ESTACION = re.compile(r'Estación de origen:.*?<span[^>]*>([^<]+)</span>')
 
 
 def parsear_html_a_json(html_content):
     """
     Parsea el HTML de resultados y extrae información estructurada
     
+    La tabla de información básica y las filas de afiliación se extraen en
+    un único recorrido del documento con un patrón precompilado.
+    
     Args:
         html_content: Contenido HTML de la página de resultados
     
@@ -75,45 +114,30 @@ def parsear_html_a_json(html_content):
     }
     
     try:
-        # Extraer información básica
-        tipo_id_match = re.search(r'TIPO DE IDENTIFICACIÓN</td><td>([^<]+)</td>', html_content)
-        numero_id_match = re.search(r'NÚMERO DE IDENTIFICACION</td><td>([^<]+)</td>', html_content)
-        nombres_match = re.search(r'NOMBRES</td><td>([^<]+)</td>', html_content)
-        apellidos_match = re.search(r'APELLIDOS</td><td>([^<]+)</td>', html_content)
-        fecha_nac_match = re.search(r'FECHA DE NACIMIENTO</td><td>([^<]+)</td>', html_content)
-        departamento_match = re.search(r'DEPARTAMENTO</td><td>([^<]+)</td>', html_content)
-        municipio_match = re.search(r'MUNICIPIO</td><td>([^<]+)</td>', html_content)
+        basica = {}
+        for match in _PATRON_RESULTADO.finditer(html_content):
+            if match.group("estado") is not None:
+                resultado["datos_afiliacion"].append({
+                    campo: match.group(campo).strip() for campo in _CAMPOS_AFILIACION
+                })
+                continue
+            
+            # Solo cuenta la primera aparición de cada etiqueta
+            for campo in _CAMPOS_BASICOS:
+                if match.group(campo) is not None:
+                    if campo not in basica:
+                        basica[campo] = match.group("valor").strip()
+                    break
         
-        if tipo_id_match and numero_id_match:
+        if "tipo_identificacion" in basica and "numero_identificacion" in basica:
             resultado["exito"] = True
             resultado["informacion_basica"] = {
-                "tipo_identificacion": tipo_id_match.group(1).strip(),
-                "numero_identificacion": numero_id_match.group(1).strip(),
-                "nombres": nombres_match.group(1).strip() if nombres_match else "",
-                "apellidos": apellidos_match.group(1).strip() if apellidos_match else "",
-                "fecha_nacimiento": fecha_nac_match.group(1).strip() if fecha_nac_match else "",
-                "departamento": departamento_match.group(1).strip() if departamento_match else "",
-                "municipio": municipio_match.group(1).strip() if municipio_match else ""
+                campo: basica.get(campo, "") for campo in _CAMPOS_BASICOS
             }
         
-        # Extraer datos de afiliación
-        afiliacion_pattern = r'<tr class="DataGrid_(?:Item|AlternatingItem)" align="center">\s*<td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td>'
-        afiliaciones = re.finditer(afiliacion_pattern, html_content)
-        
-        for match in afiliaciones:
-            afiliacion = {
-                "estado": match.group(1).strip(),
-                "entidad": match.group(2).strip(),
-                "regimen": match.group(3).strip(),
-                "fecha_afiliacion": match.group(4).strip(),
-                "fecha_finalizacion": match.group(5).strip(),
-                "tipo_afiliado": match.group(6).strip()
-            }
-            resultado["datos_afiliacion"].append(afiliacion)
-        
         # Extraer metadatos
-        fecha_impresion_match = re.search(r'Fecha de Impresión:.*?<span[^>]*>([^<]+)</span>', html_content)
-        estacion_match = re.search(r'Estación de origen:.*?<span[^>]*>([^<]+)</span>', html_content)
+        fecha_impresion_match = _PATRON_FECHA_IMPRESION.search(html_content)
+        estacion_match = _PATRON_ESTACION.search(html_content)
         
         resultado["metadatos"] = {
             "fecha_consulta": fecha_impresion_match.group(1).strip() if fecha_impresion_match else "",
@@ -127,53 +151,91 @@ def parsear_html_a_json(html_content):
     return resultado
 
 
-def guardar_resultados(nombre_archivo, contenido_resultado, driver, output_dir=OUTPUT_DIR):
+# Artefactos que se guardan por consulta según el perfil
+PERFILES_ARTEFACTOS = {
+    "json-only": ("json",),
+    "json+html.gz": ("json", "html"),
+    "full": ("json", "html", "txt", "screenshot"),
+}
+
+
+# Extensión de cada tipo de artefacto en el almacén
+EXTENSIONES_ARTEFACTOS = {"html": ".html", "json": ".json", "txt": ".txt", "screenshot": ".png"}
+
+
+def guardar_resultados(nombre_archivo, contenido_resultado, driver=None, tipo_doc=None, numero_doc=None,
+                       perfil=ARTEFACTOS_PERFIL, compresion=COMPRESION_ARTEFACTOS, etapas=None, marca=None):
     """
-    Guarda los resultados en archivos (HTML, TXT, JSON, PNG)
+    Guarda los resultados (JSON y, según el perfil, HTML, TXT, PNG) en el
+    almacén de artefactos
+    
+    El JSON se parsea aquí y el texto/screenshot se toman del navegador antes
+    de devolverlo al pool. Cada artefacto se registra en el índice con el
+    hash de su contenido; la escritura del objeto la hace el escritor en
+    segundo plano (y se omite si ese contenido ya estaba guardado).
     
     Args:
-        nombre_archivo: Nombre base para los archivos (ej: "CC_1234567890")
+        nombre_archivo: Nombre base de la consulta (ej: "CC_1234567890")
         contenido_resultado: Contenido HTML/texto del resultado
-        driver: WebDriver para capturar screenshot
-        output_dir: Directorio donde guardar los archivos
+        driver: WebDriver para capturar texto y screenshot (None en el motor HTTP)
+        tipo_doc, numero_doc: Documento consultado (para el historial del índice)
+        perfil: Clave de PERFILES_ARTEFACTOS
+        compresion: Compresión del HTML ("", "gzip" o "zstd")
+        etapas: Diccionario de tiempos por etapa (metricas_api, opcional)
+        marca: Momento de la consulta con el que se indexan los artefactos
+            (por defecto, ahora); permite pedir después esta misma versión
     
     Returns:
-        tuple: (dict de archivos, dict de datos JSON)
+        tuple: (dict tipo -> ruta del objeto, dict de datos JSON)
     """
+    if perfil not in PERFILES_ARTEFACTOS:
+        raise ValueError(f"Perfil de artefactos desconocido '{perfil}'. Valores permitidos: {list(PERFILES_ARTEFACTOS)}")
+    artefactos = PERFILES_ARTEFACTOS[perfil]
+    if perfil == "json+html.gz" and not compresion:
+        compresion = "gzip"
+    compresion = compresion_disponible(compresion)
+    
+    escritor = obtener_escritor()
+    almacen = obtener_artefactos()
+    marca = marca or time.time()
     archivos = {}
     
-    # Guardar HTML completo
-    html_path = os.path.join(output_dir, f"resultado_{nombre_archivo}.html")
-    with open(html_path, "w", encoding="utf-8") as f:
-        f.write(contenido_resultado)
-    archivos["html"] = html_path
-    print(f"[+] HTML guardado en: {html_path}")
+    def _guardar(tipo, datos, compresion_objeto=""):
+        if isinstance(datos, str):
+            datos = datos.encode("utf-8")
+        hash_contenido = almacen.calcular_hash(datos)
+        extension = EXTENSIONES_ARTEFACTOS[tipo] + EXTENSIONES_COMPRESION.get(compresion_objeto, "")
+        ruta = almacen.registrar(
+            nombre_archivo, tipo, hash_contenido, extension, len(datos),
+            tipo_doc=tipo_doc, numero_doc=numero_doc, codificacion=compresion_objeto, marca=marca,
+        )
+        escritor.escribir(tipo, ruta, datos, compresion_objeto)
+        archivos[tipo] = ruta
     
     # Parsear y guardar JSON
-    datos_json = parsear_html_a_json(contenido_resultado)
-    json_path = os.path.join(output_dir, f"resultado_{nombre_archivo}.json")
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(datos_json, f, indent=2, ensure_ascii=False)
-    archivos["json"] = json_path
-    print(f"[+] JSON guardado en: {json_path}")
-    
-    # Guardar texto plano
-    try:
-        body_text = driver.find_element(By.TAG_NAME, "body").text
-        txt_path = os.path.join(output_dir, f"resultado_{nombre_archivo}.txt")
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write(body_text)
-        archivos["txt"] = txt_path
-        print(f"[+] TXT guardado en: {txt_path}")
-    except:
-        pass
-
-    # Guardar screenshot
-    screenshot_path = os.path.join(output_dir, f"resultado_{nombre_archivo}.png")
-    driver.save_screenshot(screenshot_path)
-    archivos["screenshot"] = screenshot_path
-    print(f"[+] Screenshot guardado en: {screenshot_path}")
+    with medir_etapa("parseo", etapas):
+        datos_json = parsear_html_a_json(contenido_resultado)
+    
+    with medir_etapa("guardado_artefactos", etapas):
+        _guardar("json", json.dumps(datos_json, indent=2, ensure_ascii=False))
+        
+        # HTML completo (opcionalmente comprimido)
+        if "html" in artefactos:
+            _guardar("html", contenido_resultado, compresion)
+        
+        if driver is not None:
+            # Texto plano (una ida y vuelta extra al navegador, solo en perfil full)
+            if "txt" in artefactos:
+                try:
+                    _guardar("txt", driver.find_element(By.TAG_NAME, "body").text)
+                except:
+                    pass
+            
+            # Screenshot: se captura ya y se escribe después
+            if "screenshot" in artefactos:
+                _guardar("screenshot", driver.get_screenshot_as_png())
     
+    print(f"[+] Resultados de {nombre_archivo} en cola de escritura: {', '.join(archivos)}")
     return archivos, datos_json
 
 
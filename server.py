@@ -2,23 +2,70 @@
 # server.py
 """Servidor Flask para consulta ADRES via API REST"""
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 import os
 import time
-from threading import Thread
-import json
-import zipfile
-import xml.etree.ElementTree as ET
+import uuid
+import mimetypes
+from threading import Thread, Lock
+from functools import partial
+from concurrent.futures import Future
 
-import pandas as pd
+from requests import RequestException
 from werkzeug.utils import secure_filename
 
-from config import URL, OUTPUT_DIR, DEBUG_DIR
-from browser_api import iniciar_navegador, cerrar_navegador, guardar_debug
-from form_api import escribir_en_campo, enviar_formulario, seleccionar_tipo_documento
-from captcha_api import resolver_captcha, encontrar_input_captcha
+from config import (
+    OUTPUT_DIR, DEBUG_DIR, LOTE_CONCURRENCIA, MOTOR_CONSULTA, MOTORES_CONSULTA, MAX_UPLOAD_MB,
+    ESCRITURA_SOLO_JS,
+)
+from browser_api import guardar_debug
+from pool_api import obtener_pool, estadisticas_pool
+from form_api import (
+    escribir_en_campo,
+    enviar_formulario,
+    seleccionar_tipo_documento,
+    prellenar_formulario,
+    completar_formulario,
+    estadisticas_localizadores,
+    estadisticas_escritura,
+)
+from captcha_api import solicitar_captcha, esperar_captcha, encontrar_input_captcha
+from anticaptcha_api import estadisticas_captcha
 from results_api import capturar_resultados, guardar_resultados
+from escritor_api import obtener_escritor
+from artefactos_api import obtener_artefactos
+from espera_api import esperar_valor
+from metricas_api import medir_etapa, registrar_consulta, resumen_etapas, obtener_registro
+from lote_api import (
+    ProgresoLote,
+    BitacoraLote,
+    procesar_filas,
+    ruta_bitacora,
+    leer_bitacora,
+    leer_cabecera_bitacora,
+)
+from http_api import consultar_por_http
+from cache_api import obtener_cache
+from almacen_api import obtener_almacen, CONSULTA, LOTE
+from vuelo_api import VueloUnico
+from lectura_api import abrir_documentos_lote, es_archivo_lote
+from limitador_api import obtener_limitador, motivo_fallo
+from planificador_api import (
+    obtener_planificador,
+    ColaLlena,
+    PRIORIDAD_INTERACTIVA,
+    PRIORIDAD_LOTE,
+)
+from eventos_api import eventos_consulta, eventos_lote
+from exportacion_api import FORMATOS_EXPORTACION, GENERADORES, resultados_lote, entradas_zip
+from zip_api import ZipDeterminista
+from validacion_api import (
+    TIPOS_DOCUMENTO_VALIDOS,
+    normalizar_numero_documento,
+    validar_documentos,
+    resumen_rechazos,
+)
 
 app = Flask(__name__)
 CORS(app)
@@ -27,442 +74,520 @@ CORS(app)
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
-
-# Estado de consultas
-consultas_en_progreso = {}
-consultas_masivas = {}
-
-TIPOS_DOCUMENTO_VALIDOS = ['CC', 'TI', 'CE', 'PA', 'RC', 'NU', 'AS', 'MS', 'CD', 'CN', 'SC', 'PE', 'PT']
-
-XLSX_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
-XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
-
+# La lectura de lotes es incremental, así que el límite puede ser alto
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Estado de consultas y lotes (en memoria o SQLite, ver almacen_api)
+almacen = obtener_almacen()
+# Todas las consultas (individuales y filas de lote) pasan por el planificador
+planificador = obtener_planificador()
+# Ritmo de consultas hacia ADRES, compartido por los motores HTTP y Selenium
+limitador = obtener_limitador()
+# Lotes que este proceso está ejecutando (evita reanudar uno en curso)
+lotes_en_ejecucion = set()
+lotes_en_ejecucion_lock = Lock()
+consultas_coalescidas = VueloUnico()
+
+def _estado_completado(nombre_archivo, archivos, datos_json, tipo_doc, numero_doc, marca):
+    """
+    Arma el estado final de una consulta exitosa
+
+    La marca identifica la versión de los artefactos en el índice; con ella
+    las descargas posteriores entregan esta consulta y no una más reciente.
+    """
+    enlaces_descarga = {
+        clave: f"/api/descargar/{nombre_archivo}/{clave}?marca={marca}"
+        for clave in archivos.keys()
+    }
 
-def _columna_a_indice(columna):
-    """Convierte una referencia de columna de Excel (ej. 'AA') a índice basado en cero."""
-    indice = 0
-    for caracter in columna:
-        if not caracter.isalpha():
-            break
-        indice = indice * 26 + (ord(caracter.upper()) - ord('A') + 1)
-    return max(indice - 1, 0)
+    return {
+        "estado": "completado",
+        "progreso": 100,
+        "mensaje": "Consulta completada exitosamente",
+        "datos": datos_json,
+        "archivos": {k: os.path.basename(v) for k, v in archivos.items()},
+        "links_descarga": enlaces_descarga,
+        "nombre_archivo": nombre_archivo,
+        "tipo_doc": tipo_doc,
+        "numero_doc": numero_doc,
+        "marca": marca
+    }
 
 
-def _texto_shared_string(elemento):
-    """Extrae el texto de un nodo <si> o inlineStr dentro del XML de Excel."""
-    partes = []
-    for nodo in elemento.iter():
-        if nodo.tag.endswith('}t') and nodo.text:
-            partes.append(nodo.text)
-    return ''.join(partes)
+def ejecutar_consulta_http(numero_doc, tipo_doc, consulta_id):
+    """Ejecuta la consulta con el motor HTTP (sin navegador) y devuelve su estado final"""
+    inicio = time.perf_counter()
+    etapas = {}
+    try:
+        almacen.guardar(CONSULTA, consulta_id, {
+            "estado": "enviando",
+            "progreso": 30,
+            "mensaje": "Consultando por HTTP (formulario + CAPTCHA)..."
+        })
+        with medir_etapa("limitador", etapas):
+            limitador.adquirir()
+        with medir_etapa("consulta_http", etapas):
+            contenido_resultado = consultar_por_http(numero_doc, tipo_doc)
+        
+        almacen.guardar(CONSULTA, consulta_id, {
+            "estado": "capturando",
+            "progreso": 90,
+            "mensaje": "Procesando resultados..."
+        })
+        nombre_archivo = f"{tipo_doc}_{numero_doc}"
+        marca = time.time()
+        archivos, datos_json = guardar_resultados(
+            nombre_archivo, contenido_resultado, tipo_doc=tipo_doc, numero_doc=numero_doc, etapas=etapas,
+            marca=marca
+        )
+        limitador.registrar_resultado(datos_json)
+        
+        almacen.guardar(CONSULTA, consulta_id, dict(
+            _estado_completado(nombre_archivo, archivos, datos_json, tipo_doc, numero_doc, marca),
+            etapas=etapas
+        ))
+    
+    except Exception as e:
+        # Solo las fallas de red/HTTP hablan del estado de ADRES (no las del CAPTCHA)
+        if isinstance(e, RequestException):
+            limitador.registrar_fallo(motivo_fallo(e))
+        almacen.guardar(CONSULTA, consulta_id, {
+            "estado": "error",
+            "progreso": 100,
+            "mensaje": f"Error: {str(e)}",
+            "etapas": etapas
+        })
+    
+    estado_final = almacen.obtener(CONSULTA, consulta_id)
+    registrar_consulta("http", (estado_final or {}).get("estado", "error"), time.perf_counter() - inicio)
+    return estado_final
 
 
-def leer_excel_xlsx_basico(ruta):
-    """Lee un archivo XLSX sin dependencias externas como openpyxl."""
-    try:
-        with zipfile.ZipFile(ruta) as archivo_zip:
-            nombres = set(archivo_zip.namelist())
+def clave_documento(tipo_doc, numero_doc):
+    """Clave normalizada de un documento para caché y coalescencia"""
+    return (str(tipo_doc).strip().upper(), normalizar_numero_documento(numero_doc))
 
-            shared_strings = []
-            if 'xl/sharedStrings.xml' in nombres:
-                raiz_shared = ET.fromstring(archivo_zip.read('xl/sharedStrings.xml'))
-                for si in raiz_shared.findall(f'.//{{{XLSX_MAIN_NS}}}si'):
-                    shared_strings.append(_texto_shared_string(si))
 
-            workbook = ET.fromstring(archivo_zip.read('xl/workbook.xml'))
-            hoja = workbook.find(f'.//{{{XLSX_MAIN_NS}}}sheet')
-            if hoja is None:
-                return pd.DataFrame()
+def _consultar_documento(numero_doc, tipo_doc, consulta_id, motor):
+    """Consulta real con el motor elegido; los resultados exitosos van a la caché"""
+    if motor == "http":
+        estado = ejecutar_consulta_http(numero_doc, tipo_doc, consulta_id)
+    else:
+        estado = ejecutar_consulta_selenium(numero_doc, tipo_doc, consulta_id)
+    
+    if estado and estado.get("estado") == "completado" and (estado.get("datos") or {}).get("exito"):
+        obtener_cache().guardar(tipo_doc, numero_doc, estado)
+    return estado
 
-            rel_id = hoja.attrib.get(f'{{{XLSX_REL_NS}}}id')
-            destino_hoja = None
 
+def iniciar_consulta(numero_doc, tipo_doc, consulta_id, motor=MOTOR_CONSULTA, forzar=False,
+                     prioridad=PRIORIDAD_INTERACTIVA, cliente=None, esperar_cupo=False):
+    """
+    Inicia la consulta sin bloquear y devuelve un Future con su estado final
+    
+    Si hay un resultado vigente en la caché (y no se pide forzar) se devuelve
+    sin abrir navegador ni resolver CAPTCHA. Si ya hay una consulta igual en
+    curso o en cola, solo se espera su resultado. Únicamente la consulta líder
+    ocupa un trabajador del planificador.
+    
+    Returns:
+        tuple: (Future con el estado final, consulta_id del líder compartido
+            o None)
+    
+    Raises:
+        ColaLlena: Si la cola del planificador está llena y no se espera cupo
+    """
+    futuro = Future()
+    if not forzar:
+        cacheado = obtener_cache().obtener(tipo_doc, numero_doc)
+        if cacheado:
+            cacheado["desde_cache"] = True
+            cacheado["mensaje"] = "Consulta completada (resultado en caché)"
+            almacen.guardar(CONSULTA, consulta_id, cacheado)
+            futuro.set_result(cacheado)
+            return futuro, None
+    
+    # Una sola consulta real por documento: las idénticas concurrentes la comparten
+    clave = clave_documento(tipo_doc, numero_doc)
+    futuro_vuelo, lider, consulta_lider = consultas_coalescidas.unirse(clave, etiqueta=consulta_id)
+    
+    if not lider:
+        almacen.guardar(CONSULTA, consulta_id, {
+            "estado": "esperando",
+            "progreso": 10,
+            "mensaje": f"Compartiendo la consulta en curso {consulta_lider}..."
+        })
+        
+        def _compartir(terminado):
             try:
-                rels = ET.fromstring(archivo_zip.read('xl/_rels/workbook.xml.rels'))
-                for rel in rels.findall(f'{{{XLSX_REL_NS}}}Relationship'):
-                    if rel.attrib.get('Id') == rel_id:
-                        destino_hoja = rel.attrib.get('Target')
-                        break
-            except KeyError:
-                pass
-
-            if not destino_hoja:
-                destino_hoja = 'worksheets/sheet1.xml'
-
-            if not destino_hoja.startswith('xl/'):
-                destino_hoja = f'xl/{destino_hoja}'
-
-            hoja_xml = archivo_zip.read(destino_hoja)
-            raiz_hoja = ET.fromstring(hoja_xml)
-
-            datos = []
-            max_columnas = 0
-            for fila in raiz_hoja.findall(f'.//{{{XLSX_MAIN_NS}}}row'):
-                celdas = {}
-                for celda in fila.findall(f'{{{XLSX_MAIN_NS}}}c'):
-                    referencia = celda.attrib.get('r', '')
-                    columna = ''.join(ch for ch in referencia if ch.isalpha())
-                    indice_columna = _columna_a_indice(columna) if columna else 0
-
-                    valor = ''
-                    tipo = celda.attrib.get('t')
-                    if tipo == 's':
-                        indice_shared = celda.find(f'{{{XLSX_MAIN_NS}}}v')
-                        if indice_shared is not None and indice_shared.text:
-                            try:
-                                valor = shared_strings[int(indice_shared.text)]
-                            except (ValueError, IndexError):
-                                valor = ''
-                    elif tipo == 'inlineStr':
-                        inline = celda.find(f'{{{XLSX_MAIN_NS}}}is')
-                        if inline is not None:
-                            valor = _texto_shared_string(inline)
-                    else:
-                        nodo_valor = celda.find(f'{{{XLSX_MAIN_NS}}}v')
-                        if nodo_valor is not None and nodo_valor.text is not None:
-                            valor = nodo_valor.text
-
-                    celdas[indice_columna] = valor
-                    max_columnas = max(max_columnas, indice_columna + 1)
-
-                fila_actual = [''] * max_columnas
-                for indice, valor in celdas.items():
-                    if indice >= len(fila_actual):
-                        fila_actual.extend([''] * (indice + 1 - len(fila_actual)))
-                    fila_actual[indice] = valor
-                datos.append(fila_actual)
-
-            if not datos:
-                return pd.DataFrame()
-
-            encabezados = [col.strip() for col in datos[0]]
-            registros = []
-            for fila in datos[1:]:
-                registro = {}
-                for indice, encabezado in enumerate(encabezados):
-                    if not encabezado:
-                        continue
-                    valor = fila[indice] if indice < len(fila) else ''
-                    registro[encabezado] = valor
-                if registro:
-                    registros.append(registro)
-
-            df = pd.DataFrame(registros)
-            if not df.empty:
-                df = df.replace(r'^\s*$', pd.NA, regex=True)
-            return df
-
-    except (KeyError, zipfile.BadZipFile, ET.ParseError):
-        pass
-
-    return pd.DataFrame()
-
-
-def cargar_excel_como_dataframe(ruta):
-    """Intenta cargar un archivo Excel utilizando pandas y un lector básico como respaldo."""
+                estado = terminado.result()
+            except Exception as e:
+                estado = {"estado": "error", "progreso": 100, "mensaje": f"Error: {str(e)}"}
+            if estado:
+                estado = dict(estado, compartida=True)
+                almacen.guardar(CONSULTA, consulta_id, estado)
+            futuro.set_result(estado)
+        
+        futuro_vuelo.add_done_callback(_compartir)
+        return futuro, consulta_lider
+    
     try:
-        return pd.read_excel(ruta)
-    except Exception as error:
-        mensaje = str(error).lower()
-        if ruta.lower().endswith('.xlsx') and 'openpyxl' in mensaje:
-            df = leer_excel_xlsx_basico(ruta)
-            if not df.empty:
-                return df
+        futuro_tarea = planificador.enviar(
+            _consultar_documento, numero_doc, tipo_doc, consulta_id, motor,
+            prioridad=prioridad, cliente=cliente, etiqueta=consulta_id, esperar_cupo=esperar_cupo
+        )
+    except Exception as e:
+        consultas_coalescidas.terminar(clave, error=e)
         raise
-
-
-def normalizar_numero_documento(valor):
-    """Convierte el número de documento a una cadena solo con dígitos."""
-    if valor is None:
-        return ""
-
-    import numbers
-
-    if isinstance(valor, numbers.Number):
+    
+    def _publicar(terminado):
+        error = terminado.exception()
+        consultas_coalescidas.terminar(clave, None if error else terminado.result(), error)
+    
+    futuro_tarea.add_done_callback(_publicar)
+    return futuro_vuelo, None
+
+
+def ejecutar_consulta_async(numero_doc, tipo_doc, consulta_id, motor=MOTOR_CONSULTA, forzar=False,
+                            prioridad=PRIORIDAD_INTERACTIVA, cliente=None):
+    """Como iniciar_consulta(), pero espera cupo en la cola y bloquea hasta el estado final"""
+    futuro, _ = iniciar_consulta(
+        numero_doc, tipo_doc, consulta_id, motor, forzar,
+        prioridad=prioridad, cliente=cliente, esperar_cupo=True
+    )
+    return futuro.result()
+
+
+def _llenar_formulario_paso_a_paso(driver, tipo_doc, numero_doc, captcha_value, solo_js=False, etapas=None):
+    """Respaldo de completar_formulario: selecciona, escribe e ingresa el CAPTCHA por separado"""
+    with medir_etapa("seleccion_tipo", etapas):
+        seleccionar_tipo_documento(driver, tipo_doc, tiempos=etapas)
+    with medir_etapa("escritura_numero", etapas):
+        escribir_en_campo(driver, numero_doc, solo_js=solo_js)
+    
+    with medir_etapa("captcha_ingreso", etapas):
+        captcha_input = encontrar_input_captcha(driver)
+        if captcha_input is None:
+            raise RuntimeError("No se encontró el input del CAPTCHA")
+        
         try:
-            return str(int(valor))
-        except (ValueError, OverflowError):
+            captcha_input.clear()
+        except:
             pass
-
-    texto = str(valor).strip()
-    if not texto:
-        return ""
-
-    if texto.isdigit():
-        return texto
-
-    texto_normalizado = texto.replace(" ", "").replace(",", "")
-    if texto_normalizado.isdigit():
-        return texto_normalizado
-
-    try:
-        numero = float(texto_normalizado)
-        if numero.is_integer():
-            return str(int(numero))
-    except ValueError:
-        pass
-
-    solo_digitos = "".join(ch for ch in texto if ch.isdigit())
-    return solo_digitos
+        captcha_input.send_keys(captcha_value)
+        esperar_valor(driver, captcha_input, captcha_value, "captcha_ingresado", tiempos=etapas)
 
 
-def ejecutar_consulta_async(numero_doc, tipo_doc, consulta_id):
-    """Ejecuta la consulta en background"""
+def ejecutar_consulta_selenium(numero_doc, tipo_doc, consulta_id):
+    """Ejecuta la consulta con un navegador del pool y devuelve su estado final"""
     driver = None
+    pool = obtener_pool()
+    navegador_fallido = False
+    formulario_enviado = False
+    etapas = {}
+    inicio = time.perf_counter()
     try:
-        consultas_en_progreso[consulta_id] = {
+        almacen.guardar(CONSULTA, consulta_id, {
             "estado": "iniciando",
             "progreso": 10,
-            "mensaje": "Iniciando navegador..."
-        }
+            "mensaje": "Obteniendo navegador del pool..."
+        })
         
-        driver = iniciar_navegador(headless=False)
-        driver.get(URL)
-        time.sleep(2)
+        # Un token del limitador por consulta (CAPTCHA + envío del formulario);
+        # se espera antes de pedir el navegador para no retenerlo ocioso
+        with medir_etapa("limitador", etapas):
+            limitador.adquirir()
         
-        # Seleccionar tipo de documento
-        consultas_en_progreso[consulta_id] = {
-            "estado": "seleccionando_tipo",
-            "progreso": 20,
-            "mensaje": "Seleccionando tipo de documento..."
-        }
-        seleccionar_tipo_documento(driver, tipo_doc)
-        time.sleep(0.5)
+        # El navegador prestado ya está limpio y cargado en el formulario
+        with medir_etapa("navegador_pool", etapas):
+            driver = pool.obtener()
         
-        # Escribir número
-        consultas_en_progreso[consulta_id] = {
-            "estado": "escribiendo",
-            "progreso": 30,
-            "mensaje": "Escribiendo número de documento..."
-        }
-        escribir_en_campo(driver, numero_doc)
+        # Enviar el CAPTCHA a resolver
+        almacen.guardar(CONSULTA, consulta_id, {
+            "estado": "captcha",
+            "progreso": 15,
+            "mensaje": "Enviando CAPTCHA a resolver..."
+        })
+        with medir_etapa("captcha_captura", etapas):
+            futuro_captcha, imagen_captcha = solicitar_captcha(driver, tiempos=etapas)
+        
+        # Llenar tipo y número mientras Anti-Captcha trabaja
+        with medir_etapa("prellenado", etapas):
+            prellenado = prellenar_formulario(driver, tipo_doc, numero_doc)
         
-        # Resolver CAPTCHA
-        consultas_en_progreso[consulta_id] = {
+        # Esperar la resolución del CAPTCHA
+        almacen.guardar(CONSULTA, consulta_id, {
             "estado": "captcha",
-            "progreso": 45,
+            "progreso": 30,
             "mensaje": "Resolviendo CAPTCHA..."
-        }
-        captcha_value = resolver_captcha(driver)
+        })
+        with medir_etapa("captcha_resolucion", etapas):
+            captcha_value = esperar_captcha(futuro_captcha, imagen_captcha)
         
         if captcha_value is None:
-            consultas_en_progreso[consulta_id] = {
+            estado_cancelado = {
                 "estado": "error",
                 "progreso": 100,
-                "mensaje": "CAPTCHA cancelado por el operador"
+                "mensaje": "CAPTCHA cancelado por el operador",
+                "etapas": etapas
             }
-            return
+            almacen.guardar(CONSULTA, consulta_id, estado_cancelado)
+            registrar_consulta("selenium", "cancelado", time.perf_counter() - inicio)
+            return estado_cancelado
         
-        # Ingresar CAPTCHA
-        consultas_en_progreso[consulta_id] = {
-            "estado": "ingresando_captcha",
+        # Ingresar el CAPTCHA y verificar los tres campos en una sola llamada;
+        # si no se puede, paso a paso
+        almacen.guardar(CONSULTA, consulta_id, {
+            "estado": "llenando",
             "progreso": 60,
-            "mensaje": "Ingresando valor del CAPTCHA..."
-        }
-        captcha_input = encontrar_input_captcha(driver)
-        if captcha_input is None:
-            raise RuntimeError("No se encontró el input del CAPTCHA")
-        
-        try:
-            captcha_input.clear()
-        except:
-            pass
-        captcha_input.send_keys(captcha_value)
-        time.sleep(0.2)
+            "mensaje": "Llenando formulario..."
+        })
+        with medir_etapa("llenado_formulario", etapas):
+            llenado = prellenado and completar_formulario(driver, tipo_doc, numero_doc, captcha_value)
+        if not llenado:
+            print("[i] Usando llenado paso a paso del formulario")
+            _llenar_formulario_paso_a_paso(
+                driver, tipo_doc, numero_doc, captcha_value,
+                solo_js=ESCRITURA_SOLO_JS and pool.headless, etapas=etapas,
+            )
         
         # Enviar formulario
-        consultas_en_progreso[consulta_id] = {
+        almacen.guardar(CONSULTA, consulta_id, {
             "estado": "enviando",
             "progreso": 75,
             "mensaje": "Enviando formulario..."
-        }
-        ventanas_antes = enviar_formulario(driver)
+        })
+        with medir_etapa("envio", etapas):
+            ventanas_antes = enviar_formulario(driver)
+        formulario_enviado = True
         
         # Capturar resultados (OPTIMIZADO)
-        consultas_en_progreso[consulta_id] = {
+        almacen.guardar(CONSULTA, consulta_id, {
             "estado": "capturando",
             "progreso": 90,
             "mensaje": "Capturando resultados..."
-        }
-        time.sleep(2)  # Reducido de 3 a 2 segundos
-        contenido_resultado = capturar_resultados(driver, ventanas_antes, timeout=15)  # Reducido de 20 a 15
+        })
+        contenido_resultado = capturar_resultados(
+            driver, ventanas_antes, timeout=15, etapas=etapas
+        )
         
         if not contenido_resultado:
             raise RuntimeError("No se pudo capturar el contenido de los resultados")
         
         # Guardar resultados
         nombre_archivo = f"{tipo_doc}_{numero_doc}"
-        archivos, datos_json = guardar_resultados(nombre_archivo, contenido_resultado, driver)
+        marca = time.time()
+        archivos, datos_json = guardar_resultados(
+            nombre_archivo, contenido_resultado, driver, tipo_doc=tipo_doc, numero_doc=numero_doc,
+            etapas=etapas, marca=marca
+        )
+        limitador.registrar_resultado(datos_json)
         
         # Actualizar estado final
-        enlaces_descarga = {
-            clave: f"/api/descargar/{nombre_archivo}/{clave}"
-            for clave in archivos.keys()
-        }
-
-        consultas_en_progreso[consulta_id] = {
-            "estado": "completado",
-            "progreso": 100,
-            "mensaje": "Consulta completada exitosamente",
-            "datos": datos_json,
-            "archivos": {k: os.path.basename(v) for k, v in archivos.items()},
-            "links_descarga": enlaces_descarga,
-            "nombre_archivo": nombre_archivo,
-            "tipo_doc": tipo_doc,
-            "numero_doc": numero_doc
-        }
+        almacen.guardar(CONSULTA, consulta_id, dict(
+            _estado_completado(nombre_archivo, archivos, datos_json, tipo_doc, numero_doc, marca),
+            etapas=etapas
+        ))
         
     except Exception as e:
-        consultas_en_progreso[consulta_id] = {
+        # Las fallas antes de enviar (pool, CAPTCHA) no dicen nada del ritmo hacia ADRES
+        if formulario_enviado:
+            limitador.registrar_fallo(motivo_fallo(e))
+        almacen.guardar(CONSULTA, consulta_id, {
             "estado": "error",
             "progreso": 100,
-            "mensaje": f"Error: {str(e)}"
-        }
+            "mensaje": f"Error: {str(e)}",
+            "etapas": etapas
+        })
         
         try:
             if driver:
                 guardar_debug(driver, "error", DEBUG_DIR)
         except:
-            pass
+            # Si ni siquiera se puede capturar el debug, el navegador está caído
+            navegador_fallido = True
     
     finally:
         if driver:
-            cerrar_navegador(driver, delay=2)  # Reducido de 3 a 2
+            pool.liberar(driver, fallido=navegador_fallido)
+    
+    estado_final = almacen.obtener(CONSULTA, consulta_id)
+    registrar_consulta("selenium", (estado_final or {}).get("estado", "error"), time.perf_counter() - inicio)
+    return estado_final
+
+
+def _consultar_fila_lote(lote_id, motor, forzar, fila, tipo_doc, numero_doc):
+    """Ejecuta la consulta de una fila del lote y arma su resultado"""
+    consulta_id = f"{tipo_doc}_{numero_doc}_{lote_id}_{fila}"
+    try:
+        # Prioridad baja y turnos por lote: las consultas individuales se adelantan
+        estado_final = ejecutar_consulta_async(
+            numero_doc, tipo_doc, consulta_id, motor, forzar,
+            prioridad=PRIORIDAD_LOTE, cliente=lote_id
+        ) or {}
+    finally:
+        almacen.eliminar(CONSULTA, consulta_id)
+
+    return {
+        "tipo_doc": tipo_doc,
+        "numero_doc": numero_doc,
+        "estado": estado_final.get("estado"),
+        "mensaje": estado_final.get("mensaje"),
+        "datos": estado_final.get("datos") if estado_final.get("estado") == "completado" else None,
+        "links_descarga": estado_final.get("links_descarga"),
+        "nombre_archivo": estado_final.get("nombre_archivo"),
+        "archivos": estado_final.get("archivos"),
+        "marca": estado_final.get("marca"),
+        "desde_cache": estado_final.get("desde_cache", False),
+        "etapas": estado_final.get("etapas")
+    }
 
 
-def ejecutar_consulta_masiva_async(archivo_excel, lote_id):
-    """Ejecuta consultas masivas desde un archivo Excel"""
+def ejecutar_consulta_masiva_async(archivo_excel, lote_id, concurrencia=LOTE_CONCURRENCIA,
+                                   motor=MOTOR_CONSULTA, forzar=False, reanudar=False):
+    """
+    Ejecuta consultas masivas desde un archivo Excel con varios workers en paralelo
+    
+    El archivo se lee por partes y se valida con operaciones vectorizadas;
+    el reporte de filas rechazadas queda en el estado del lote antes de que
+    empiece cualquier consulta. Cada resultado se agrega a la bitácora del
+    lote; con reanudar=True los resultados completados de la bitácora se
+    reutilizan y solo se consultan las filas pendientes o fallidas.
+    """
+    bitacora = None
     try:
-        # Leer Excel
+        # Abrir archivo (verifica encabezados y columnas)
         try:
-            df = cargar_excel_como_dataframe(archivo_excel)
-        except Exception as e:
-            consultas_masivas[lote_id] = {
+            total_estimado, documentos = abrir_documentos_lote(archivo_excel)
+        except ValueError as e:
+            almacen.guardar(LOTE, lote_id, {
                 "estado": "error",
-                "mensaje": f"Error al leer el archivo Excel: {str(e)}"
-            }
+                "mensaje": str(e)
+            })
             return
-        
-        # Validar que no esté vacío
-        if df.empty:
-            consultas_masivas[lote_id] = {
+        except Exception as e:
+            almacen.guardar(LOTE, lote_id, {
                 "estado": "error",
-                "mensaje": "El archivo Excel está vacío"
-            }
+                "mensaje": f"Error al leer el archivo: {str(e)}"
+            })
             return
         
-        # Validar columnas
-        if 'tipo_identificacion' not in df.columns or 'numero_identificacion' not in df.columns:
-            consultas_masivas[lote_id] = {
+        # Validación vectorizada de todo el archivo antes de abrir navegadores
+        def _avance_validacion(leidas):
+            almacen.guardar(LOTE, lote_id, {
+                "estado": "validando",
+                "mensaje": f"Validando filas ({leidas}/{total_estimado or '?'})...",
+                "filas_leidas": leidas,
+            })
+
+        _avance_validacion(0)
+        aceptadas, rechazadas = validar_documentos(documentos, al_avanzar=_avance_validacion)
+        
+        estado_lote = {
+            "total": len(aceptadas) + len(rechazadas),
+            "validacion": {
+                "aceptadas": len(aceptadas),
+                "rechazadas": len(rechazadas),
+                "motivos": resumen_rechazos(rechazadas),
+            },
+        }
+        if reanudar:
+            _, previos = leer_bitacora(ruta_bitacora(lote_id))
+            completadas = [
+                (fila, resultado) for fila, resultado in sorted(previos.items())
+                if resultado.get("estado") == "completado"
+            ]
+            bitacora = BitacoraLote(ruta_bitacora(lote_id))
+        else:
+            completadas = []
+            bitacora = BitacoraLote(ruta_bitacora(lote_id), cabecera={
+                "lote_id": lote_id,
+                "archivo": archivo_excel,
+                "motor": motor,
+                "forzar": forzar,
+                "concurrencia": concurrencia,
+                "creado": time.time(),
+            })
+        
+        progreso = ProgresoLote(estado_lote, concurrencia, almacen=almacen, lote_id=lote_id,
+                                bitacora=bitacora)
+        if completadas:
+            progreso.restaurar(completadas)
+            hechas = {fila for fila, _ in completadas}
+            aceptadas = (fila for fila in aceptadas if fila[0] not in hechas)
+        progreso.registrar_varios([
+            (fila, {
+                "tipo_doc": tipo_doc,
+                "numero_doc": numero_original,
                 "estado": "error",
-                "mensaje": "El archivo debe tener las columnas: tipo_identificacion, numero_identificacion"
-            }
-            return
+                "mensaje": motivo
+            })
+            for fila, tipo_doc, numero_original, motivo in rechazadas
+        ])
         
-        # Limpiar datos y eliminar filas vacías
-        df = df.dropna(subset=['tipo_identificacion', 'numero_identificacion'])
+        # Despachar solo las filas aceptadas a los workers en paralelo; las
+        # tuplas se generan a medida que los workers liberan cupos
+        procesar_filas(
+            aceptadas,
+            partial(_consultar_fila_lote, lote_id, motor, forzar),
+            progreso,
+            concurrencia,
+        )
         
-        if df.empty:
-            consultas_masivas[lote_id] = {
+        resultados = progreso.resultados()
+        if not resultados:
+            almacen.guardar(LOTE, lote_id, {
                 "estado": "error",
                 "mensaje": "No hay registros válidos en el archivo"
-            }
+            })
             return
         
-        total = len(df)
-        
-        consultas_masivas[lote_id] = {
-            "estado": "procesando",
-            "total": total,
-            "procesados": 0,
-            "exitosos": 0,
-            "fallidos": 0,
-            "resultados": []
-        }
-        
-        # Procesar cada registro
-        for idx, row in df.iterrows():
-            tipo_doc = str(row['tipo_identificacion']).strip().upper()
-            numero_doc = normalizar_numero_documento(row['numero_identificacion'])
-
-            if tipo_doc not in TIPOS_DOCUMENTO_VALIDOS:
-                consultas_masivas[lote_id]["fallidos"] += 1
-                consultas_masivas[lote_id]["resultados"].append({
-                    "tipo_doc": tipo_doc,
-                    "numero_doc": str(row['numero_identificacion']).strip(),
-                    "estado": "error",
-                    "mensaje": "Tipo de documento inválido"
-                })
-                consultas_masivas[lote_id]["procesados"] = idx + 1
-                continue
-
-            if not numero_doc:
-                consultas_masivas[lote_id]["fallidos"] += 1
-                consultas_masivas[lote_id]["resultados"].append({
-                    "tipo_doc": tipo_doc,
-                    "numero_doc": str(row['numero_identificacion']).strip(),
-                    "estado": "error",
-                    "mensaje": "Número de documento inválido"
-                })
-                consultas_masivas[lote_id]["procesados"] = idx + 1
-                continue
-
-            consultas_masivas[lote_id]["mensaje"] = f"Procesando {idx+1}/{total}: {tipo_doc} {numero_doc}"
-
-            # Ejecutar consulta individual
-            consulta_id = f"{tipo_doc}_{numero_doc}_{int(time.time())}"
-            ejecutar_consulta_async(numero_doc, tipo_doc, consulta_id)
-            
-            # Esperar a que termine
-            while consulta_id in consultas_en_progreso:
-                estado = consultas_en_progreso[consulta_id]
-                if estado["estado"] in ["completado", "error"]:
-                    break
-                time.sleep(1)
-            
-            # Guardar resultado
-            estado_final = consultas_en_progreso.get(consulta_id, {})
-            resultado = {
-                "tipo_doc": tipo_doc,
-                "numero_doc": numero_doc,
-                "estado": estado_final.get("estado"),
-                "datos": estado_final.get("datos") if estado_final.get("estado") == "completado" else None,
-                "links_descarga": estado_final.get("links_descarga"),
-                "nombre_archivo": estado_final.get("nombre_archivo"),
-                "archivos": estado_final.get("archivos")
+        # La bitácora ya tiene cada resultado en NDJSON: no se reescribe el lote
+        progreso.finalizar(
+            estado="completado",
+            mensaje="Lote procesado completamente",
+            total=len(resultados),
+            archivo_consolidado=bitacora.ruta,
+            link_consolidado=f"/api/descargar-lote/{lote_id}",
+            links_exportacion={
+                formato: f"/api/descargar-lote/{lote_id}?formato={formato}"
+                for formato in FORMATOS_EXPORTACION
             }
-            
-            consultas_masivas[lote_id]["resultados"].append(resultado)
-            consultas_masivas[lote_id]["procesados"] = idx + 1
-            
-            if estado_final.get("estado") == "completado":
-                consultas_masivas[lote_id]["exitosos"] += 1
-            else:
-                consultas_masivas[lote_id]["fallidos"] += 1
-            
-            # Limpieza
-            if consulta_id in consultas_en_progreso:
-                del consultas_en_progreso[consulta_id]
-            
-            # Pequeña pausa entre consultas
-            time.sleep(1)
-        
-        # Guardar resultados consolidados
-        consolidado_path = os.path.join(OUTPUT_DIR, f"lote_{lote_id}.json")
-        with open(consolidado_path, 'w', encoding='utf-8') as f:
-            json.dump(consultas_masivas[lote_id]["resultados"], f, indent=2, ensure_ascii=False)
-        
-        consultas_masivas[lote_id]["estado"] = "completado"
-        consultas_masivas[lote_id]["mensaje"] = "Lote procesado completamente"
-        consultas_masivas[lote_id]["archivo_consolidado"] = consolidado_path
-        consultas_masivas[lote_id]["link_consolidado"] = f"/api/descargar-lote/{lote_id}"
+        )
         
     except Exception as e:
-        consultas_masivas[lote_id] = {
+        almacen.guardar(LOTE, lote_id, {
             "estado": "error",
             "mensaje": f"Error procesando lote: {str(e)}"
-        }
+        })
+    
+    finally:
+        if bitacora:
+            bitacora.cerrar()
+        with lotes_en_ejecucion_lock:
+            lotes_en_ejecucion.discard(lote_id)
+
+
+def _iniciar_lote(archivo, lote_id, motor, forzar, reanudar=False):
+    """
+    Lanza el lote en un hilo si este proceso no lo está ejecutando ya
+
+    Returns:
+        bool: False si el lote ya estaba en ejecución
+    """
+    with lotes_en_ejecucion_lock:
+        if lote_id in lotes_en_ejecucion:
+            return False
+        lotes_en_ejecucion.add(lote_id)
+    
+    almacen.guardar(LOTE, lote_id, {"estado": "en_cola", "mensaje": "Lote en cola..."})
+    thread = Thread(
+        target=ejecutar_consulta_masiva_async,
+        args=(archivo, lote_id, LOTE_CONCURRENCIA, motor, forzar, reanudar)
+    )
+    thread.daemon = True
+    thread.start()
+    return True
 
 
 @app.route('/')
@@ -477,6 +602,8 @@ def consultar():
     data = request.get_json()
     numero_doc = normalizar_numero_documento(data.get('numero_doc'))
     tipo_doc = data.get('tipo_doc', 'CC').strip().upper()
+    motor = data.get('motor', MOTOR_CONSULTA)
+    forzar = bool(data.get('force_refresh', False))
 
     # Validar
     if not numero_doc:
@@ -485,23 +612,46 @@ def consultar():
     if tipo_doc not in TIPOS_DOCUMENTO_VALIDOS:
         return jsonify({"error": f"Tipo de documento inválido. Valores permitidos: {TIPOS_DOCUMENTO_VALIDOS}"}), 400
     
+    if motor not in MOTORES_CONSULTA:
+        return jsonify({"error": f"Motor inválido. Valores permitidos: {list(MOTORES_CONSULTA)}"}), 400
+    
     # Generar ID único
     consulta_id = f"{tipo_doc}_{numero_doc}_{int(time.time())}"
     
-    # Iniciar consulta en background
-    thread = Thread(target=ejecutar_consulta_async, args=(numero_doc, tipo_doc, consulta_id))
-    thread.daemon = True
-    thread.start()
+    # Encolar la consulta (si ya hay una igual en curso, solo espera su resultado)
+    almacen.guardar(CONSULTA, consulta_id, {
+        "estado": "en_cola",
+        "progreso": 0,
+        "mensaje": "Consulta en cola..."
+    })
+    try:
+        _, consulta_lider = iniciar_consulta(
+            numero_doc, tipo_doc, consulta_id, motor, forzar,
+            prioridad=PRIORIDAD_INTERACTIVA, cliente=request.remote_addr
+        )
+    except ColaLlena as e:
+        almacen.eliminar(CONSULTA, consulta_id)
+        respuesta = jsonify({
+            "error": "Servidor saturado, intenta de nuevo en unos segundos",
+            "en_cola": e.en_cola,
+            "capacidad_cola": e.capacidad
+        })
+        return respuesta, 429, {"Retry-After": "10"}
     
-    return jsonify({
+    respuesta = {
         "consulta_id": consulta_id,
-        "mensaje": "Consulta iniciada"
-    })
+        "mensaje": "Consulta iniciada",
+        "posicion_cola": planificador.posicion(consulta_id)
+    }
+    if consulta_lider:
+        respuesta["mensaje"] = "Consulta en curso para este documento; se compartirá su resultado"
+        respuesta["compartida_con"] = consulta_lider
+    return jsonify(respuesta)
 
 
 @app.route('/api/consultar-lote', methods=['POST'])
 def consultar_lote():
-    """Endpoint para procesar un archivo Excel con múltiples consultas"""
+    """Endpoint para procesar un archivo Excel, CSV o NDJSON con múltiples consultas"""
     if 'archivo' not in request.files:
         return jsonify({"error": "No se envió ningún archivo"}), 400
     
@@ -510,21 +660,25 @@ def consultar_lote():
     if file.filename == '':
         return jsonify({"error": "Archivo vacío"}), 400
     
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return jsonify({"error": "Solo se permiten archivos Excel (.xlsx, .xls)"}), 400
+    if not es_archivo_lote(file.filename):
+        return jsonify({"error": "Solo se permiten archivos Excel (.xlsx, .xls), CSV o NDJSON (opcionalmente .gz)"}), 400
     
-    # Guardar archivo
+    motor = request.form.get('motor', MOTOR_CONSULTA)
+    forzar = request.form.get('force_refresh', '').lower() in ('1', 'true', 'si', 'sí')
+    if motor not in MOTORES_CONSULTA:
+        return jsonify({"error": f"Motor inválido. Valores permitidos: {list(MOTORES_CONSULTA)}"}), 400
+    
+    # ID único: dos cargas en el mismo segundo no comparten archivo ni bitácora
+    lote_id = f"lote_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    
+    # Guardar archivo (con el ID del lote, se conserva para poder reanudarlo)
     filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{lote_id}_{filename}")
     file.save(filepath)
     
-    # Generar ID del lote
-    lote_id = f"lote_{int(time.time())}"
-    
     # Iniciar procesamiento en background
-    thread = Thread(target=ejecutar_consulta_masiva_async, args=(filepath, lote_id))
-    thread.daemon = True
-    thread.start()
+    if not _iniciar_lote(filepath, lote_id, motor, forzar):
+        return jsonify({"error": "Ya hay un lote en ejecución con este ID; reintente"}), 409
     
     return jsonify({
         "lote_id": lote_id,
@@ -532,31 +686,102 @@ def consultar_lote():
     })
 
 
+@app.route('/api/reanudar-lote/<lote_id>', methods=['POST'])
+def reanudar_lote(lote_id):
+    """Endpoint para continuar un lote interrumpido desde su bitácora"""
+    lote_id = secure_filename(lote_id)
+    ruta = ruta_bitacora(lote_id)
+    if not os.path.exists(ruta):
+        return jsonify({"error": "No hay bitácora para este lote"}), 404
+    
+    try:
+        cabecera = leer_cabecera_bitacora(ruta)
+    except ValueError:
+        return jsonify({"error": "Bitácora del lote corrupta"}), 500
+    
+    if not os.path.exists(cabecera.get("archivo", "")):
+        return jsonify({"error": "El archivo original del lote ya no existe"}), 404
+    
+    if not _iniciar_lote(cabecera["archivo"], lote_id, cabecera.get("motor", MOTOR_CONSULTA),
+                         cabecera.get("forzar", False), reanudar=True):
+        return jsonify({"error": "El lote ya se está procesando"}), 409
+    
+    return jsonify({
+        "lote_id": lote_id,
+        "mensaje": "Reanudación de lote iniciada"
+    })
+
+
 @app.route('/api/estado/<consulta_id>', methods=['GET'])
 def obtener_estado(consulta_id):
     """Endpoint para obtener el estado de una consulta individual"""
-    estado = consultas_en_progreso.get(consulta_id)
+    estado = almacen.obtener(CONSULTA, consulta_id)
     
     if not estado:
         return jsonify({"error": "Consulta no encontrada"}), 404
     
+    if estado.get("estado") == "en_cola":
+        estado["posicion_cola"] = planificador.posicion(consulta_id)
+    
     return jsonify(estado)
 
 
 @app.route('/api/estado-lote/<lote_id>', methods=['GET'])
 def obtener_estado_lote(lote_id):
-    """Endpoint para obtener el estado de un lote"""
-    estado = consultas_masivas.get(lote_id)
+    """
+    Endpoint para obtener el estado de un lote
+    
+    Con ?desde=<n> solo se devuelven los resultados registrados después de
+    la secuencia n; siguiente_desde es el valor a usar en la próxima llamada.
+    """
+    estado = almacen.obtener(LOTE, lote_id)
     
     if not estado:
         return jsonify({"error": "Lote no encontrado"}), 404
     
+    if "procesados" in estado:
+        desde = max(request.args.get('desde', 0, type=int), 0)
+        estado["resultados"] = almacen.resultados(lote_id, desde=desde)
+        estado["siguiente_desde"] = max(
+            [desde] + [resultado["secuencia"] for resultado in estado["resultados"]]
+        )
+    
     return jsonify(estado)
 
 
+def _respuesta_eventos(generador):
+    """Respuesta text/event-stream sin caché ni buffer de proxy"""
+    return Response(
+        generador,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.route('/api/eventos/<consulta_id>', methods=['GET'])
+def eventos_estado(consulta_id):
+    """Endpoint SSE con las transiciones de estado de una consulta individual"""
+    return _respuesta_eventos(eventos_consulta(almacen, consulta_id))
+
+
+@app.route('/api/eventos-lote/<lote_id>', methods=['GET'])
+def eventos_estado_lote(lote_id):
+    """Endpoint SSE con el resumen de un lote y sus resultados nuevos"""
+    desde = request.headers.get('Last-Event-ID', type=int)
+    if desde is None:
+        desde = request.args.get('desde', 0, type=int)
+    return _respuesta_eventos(eventos_lote(almacen, lote_id, desde))
+
+
 @app.route('/api/descargar/<nombre_archivo>/<tipo>', methods=['GET'])
 def descargar_archivo(nombre_archivo, tipo):
-    """Endpoint para descargar archivos generados"""
+    """
+    Endpoint para descargar archivos generados
+    
+    Se resuelve por el índice del almacén de artefactos (la consulta más
+    reciente, o la vigente en ?marca=<timestamp>); los archivos planos de
+    versiones anteriores en OUTPUT_DIR se siguen sirviendo.
+    """
     extensiones = {
         'html': 'html',
         'json': 'json',
@@ -568,24 +793,129 @@ def descargar_archivo(nombre_archivo, tipo):
         return jsonify({"error": "Tipo de archivo inválido"}), 400
     
     filename = f"resultado_{nombre_archivo}.{extensiones[tipo]}"
-    filepath = os.path.join(OUTPUT_DIR, filename)
+    artefacto = obtener_artefactos().resolver(nombre_archivo, tipo, request.args.get('marca', type=float))
+    
+    if artefacto is None:
+        if not os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+            return jsonify({"error": "Archivo no encontrado"}), 404
+        return send_from_directory(OUTPUT_DIR, filename)
     
-    if not os.path.exists(filepath):
+    # El objeto puede seguir en la cola del escritor
+    obtener_escritor().esperar_archivo(artefacto["ruta"])
+    if not os.path.exists(artefacto["ruta"]):
         return jsonify({"error": "Archivo no encontrado"}), 404
     
-    return send_from_directory(OUTPUT_DIR, filename)
+    respuesta = send_file(
+        artefacto["ruta"],
+        mimetype=mimetypes.guess_type(filename)[0],
+        download_name=filename,
+        etag=artefacto["hash"]
+    )
+    if artefacto["codificacion"]:
+        respuesta.headers["Content-Encoding"] = artefacto["codificacion"]
+    return respuesta
+
+
+@app.route('/api/versiones/<tipo_doc>/<numero_doc>', methods=['GET'])
+def versiones_documento(tipo_doc, numero_doc):
+    """
+    Endpoint con el historial de consultas de un documento según el índice
+    de artefactos, de la más reciente a la más antigua, con los links de
+    descarga de cada versión
+    """
+    tipo_doc, numero_doc = clave_documento(tipo_doc, numero_doc)
+    nombre_archivo = f"{tipo_doc}_{numero_doc}"
+
+    versiones = {}
+    for version in obtener_artefactos().versiones(tipo_doc, numero_doc):
+        marca = version["marca"]
+        if marca not in versiones:
+            versiones[marca] = {"marca": marca, "hashes": {}, "links_descarga": {}}
+        versiones[marca]["hashes"][version["tipo"]] = version["hash"]
+        versiones[marca]["links_descarga"][version["tipo"]] = (
+            f"/api/descargar/{nombre_archivo}/{version['tipo']}?marca={marca}"
+        )
+
+    if not versiones:
+        return jsonify({"error": "No hay consultas guardadas para ese documento"}), 404
+    return jsonify({
+        "tipo_doc": tipo_doc,
+        "numero_doc": numero_doc,
+        "versiones": list(versiones.values())
+    })
 
 
 @app.route('/api/descargar-lote/<lote_id>', methods=['GET'])
 def descargar_lote(lote_id):
-    """Endpoint para descargar resultados consolidados de un lote"""
-    filename = f"lote_{lote_id}.json"
-    filepath = os.path.join(OUTPUT_DIR, filename)
+    """
+    Endpoint para descargar los resultados de un lote (?formato=json, ndjson,
+    csv, xlsx o zip); la respuesta se genera por partes desde la bitácora,
+    también mientras el lote sigue en curso
+    """
+    formato = request.args.get('formato', 'json').lower()
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({"error": f"Formato inválido. Valores permitidos: {list(FORMATOS_EXPORTACION)}"}), 400
     
-    if not os.path.exists(filepath):
+    lote_id = secure_filename(lote_id)
+    resultados = resultados_lote(lote_id)
+    if resultados is None:
+        # Lotes anteriores a la bitácora: consolidado JSON ya escrito
+        filename = f"lote_{lote_id}.json"
+        if formato == 'json' and os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+            return send_from_directory(OUTPUT_DIR, filename)
         return jsonify({"error": "Archivo no encontrado"}), 404
     
-    return send_from_directory(OUTPUT_DIR, filename)
+    if formato == 'zip':
+        return _descargar_zip(lote_id, resultados)
+    
+    try:
+        contenido = GENERADORES[formato](resultados)
+    except ImportError:
+        return jsonify({"error": "La exportación a XLSX requiere openpyxl"}), 501
+    
+    return Response(
+        contenido,
+        mimetype=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="lote_{lote_id}.{formato}"'}
+    )
+
+
+def _descargar_zip(lote_id, resultados):
+    """
+    ZIP del lote (consolidado + artefactos de cada documento) generado al
+    vuelo; admite Range/If-Range para reanudar descargas grandes
+    """
+    archivo = ZipDeterminista(entradas_zip(lote_id, resultados))
+    etag = archivo.etag()
+    cabeceras = {
+        "Content-Disposition": f'attachment; filename="lote_{lote_id}.zip"',
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{etag}"',
+    }
+    
+    desde, hasta, estado = 0, archivo.tamano, 200
+    rango = request.range
+    # If-Range: si el archivo cambió (lote en curso) se entrega completo
+    if_range = request.headers.get('If-Range')
+    rango_vigente = not if_range or if_range.strip('"') == etag
+    # Varios rangos u otras unidades no se atienden: se entrega el archivo completo
+    rango_simple = rango is not None and rango.units == "bytes" and len(rango.ranges) == 1
+    if rango_simple and rango_vigente:
+        limites = rango.range_for_length(archivo.tamano)
+        if limites is None:
+            cabeceras["Content-Range"] = f"bytes */{archivo.tamano}"
+            return Response(status=416, headers=cabeceras)
+        desde, hasta = limites
+        estado = 206
+        cabeceras["Content-Range"] = f"bytes {desde}-{hasta - 1}/{archivo.tamano}"
+    
+    cabeceras["Content-Length"] = str(hasta - desde)
+    return Response(
+        archivo.generar(desde, hasta),
+        status=estado,
+        mimetype=FORMATOS_EXPORTACION['zip'],
+        headers=cabeceras
+    )
 
 
 @app.route('/api/health', methods=['GET'])
@@ -593,11 +923,60 @@ def health():
     """Endpoint de health check"""
     return jsonify({
         "status": "ok",
-        "consultas_activas": len([c for c in consultas_en_progreso.values() if c["estado"] not in ["completado", "error"]]),
-        "lotes_activos": len([l for l in consultas_masivas.values() if l["estado"] == "procesando"])
+        "consultas_activas": almacen.contar_activos(CONSULTA),
+        "lotes_activos": almacen.contar_activos(LOTE),
+        "almacen": almacen.estadisticas(),
+        "planificador": planificador.estadisticas(),
+        "limitador": limitador.estadisticas(),
+        "artefactos": dict(obtener_escritor().estadisticas(), almacen=obtener_artefactos().estadisticas()),
+        "pool_navegadores": estadisticas_pool(),
+        "captcha": estadisticas_captcha(),
+        "cache": obtener_cache().estadisticas(),
+        "coalescencia": consultas_coalescidas.estadisticas(),
+        "etapas": resumen_etapas(),
+        "localizadores": estadisticas_localizadores(),
+        "escritura": estadisticas_escritura()
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """
+    Métricas en formato Prometheus: histogramas por etapa y de las esperas,
+    consultas terminadas y el estado actual de colas, limitador y pool
+    """
+    stats_planificador = planificador.estadisticas()
+    stats_limitador = limitador.estadisticas()
+    stats_pool = estadisticas_pool()
+    stats_escritor = obtener_escritor().estadisticas()
+    
+    indicadores = [
+        ("consultas_activas", "Consultas individuales en curso", almacen.contar_activos(CONSULTA), None),
+        ("lotes_activos", "Lotes en curso", almacen.contar_activos(LOTE), None),
+        ("planificador_en_ejecucion", "Tareas ejecutándose en el planificador",
+         stats_planificador["en_ejecucion"], None),
+        ("limitador_tasa_por_minuto", "Tasa actual del limitador hacia ADRES",
+         stats_limitador["tasa_por_minuto"], None),
+        ("limitador_tokens", "Tokens disponibles en el limitador", stats_limitador["tokens"], None),
+        ("artefactos_pendientes", "Escrituras de artefactos en cola", stats_escritor["pendientes"], None),
+    ]
+    for prioridad, cantidad in stats_planificador["en_cola"].items():
+        indicadores.append((
+            "planificador_en_cola", "Tareas en cola del planificador por prioridad",
+            cantidad, {"prioridad": prioridad}
+        ))
+    if stats_pool.get("iniciado"):
+        for clave in ("libres", "prestados", "creando"):
+            indicadores.append((
+                "pool_navegadores", "Navegadores del pool por estado", stats_pool[clave], {"estado": clave}
+            ))
+    
+    return Response(
+        obtener_registro().exportar(indicadores),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == '__main__':
     print("=" * 60)
     print("SERVIDOR ADRES - API REST")
@@ -605,12 +984,20 @@ if __name__ == '__main__':
     print(f"URL: http://localhost:5000")
     print(f"Documentación API:")
     print(f"  POST   /api/consultar            - Consulta individual")
-    print(f"  POST   /api/consultar-lote       - Consulta masiva (Excel)")
+    print(f"  POST   /api/consultar-lote       - Consulta masiva (Excel/CSV/NDJSON)")
     print(f"  GET    /api/estado/<id>          - Estado consulta individual")
+    print(f"  POST   /api/reanudar-lote/<id>   - Reanudar lote interrumpido")
     print(f"  GET    /api/estado-lote/<id>     - Estado lote")
+    print(f"  GET    /api/eventos/<id>         - Eventos SSE consulta individual")
+    print(f"  GET    /api/eventos-lote/<id>    - Eventos SSE lote")
     print(f"  GET    /api/descargar/<doc>/<tipo> - Descargar archivo")
-    print(f"  GET    /api/descargar-lote/<id>  - Descargar consolidado")
+    print(f"  GET    /api/versiones/<tipo>/<num> - Historial de consultas de un documento")
+    print(f"  GET    /api/descargar-lote/<id>  - Descargar lote (?formato=json|ndjson|csv|xlsx|zip)")
+    print(f"  GET    /metrics                  - Métricas Prometheus por etapa")
     print("=" * 60)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # Solo el proceso hijo del reloader atiende peticiones: precalentar ahí
+        obtener_pool()
     app.run(debug=True, host='0.0.0.0', port=5000)
 
 
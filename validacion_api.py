@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# validacion_api.py
+"""Validación y normalización de documentos (individual y vectorizada por lotes)"""
+
+import numbers
+from array import array
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from config import VALIDACION_BLOQUE
+
+
+TIPOS_DOCUMENTO_VALIDOS = ['CC', 'TI', 'CE', 'PA', 'RC', 'NU', 'AS', 'MS', 'CD', 'CN', 'SC', 'PE', 'PT']
+
+MOTIVO_TIPO_INVALIDO = "Tipo de documento inválido"
+MOTIVO_NUMERO_INVALIDO = "Número de documento inválido"
+
+# Por encima de este valor un float ya no representa enteros exactos
+_MAX_ENTERO_FLOAT = 2 ** 53
+
+
+def normalizar_numero_documento(valor):
+    """Convierte el número de documento a una cadena solo con dígitos."""
+    if valor is None:
+        return ""
+
+    if isinstance(valor, numbers.Number):
+        try:
+            return str(int(valor))
+        except (ValueError, OverflowError):
+            pass
+
+    texto = str(valor).strip()
+    if not texto:
+        return ""
+
+    if texto.isdigit():
+        return texto
+
+    texto_normalizado = texto.replace(" ", "").replace(",", "")
+    if texto_normalizado.isdigit():
+        return texto_normalizado
+
+    try:
+        numero = float(texto_normalizado)
+        if numero.is_integer():
+            return str(int(numero))
+    except ValueError:
+        pass
+
+    solo_digitos = "".join(ch for ch in texto if ch.isdigit())
+    return solo_digitos
+
+
+def _enteros_como_texto(flotantes):
+    """
+    Serie de floats enteros y finitos -> texto sin decimales
+
+    Hasta 2**53 se convierte en bloque por int64; los mayores (raros) pasan
+    por int() uno a uno, igual que normalizar_numero_documento.
+    """
+    texto = pd.Series("", index=flotantes.index, dtype=object)
+    exactos = flotantes.abs() < _MAX_ENTERO_FLOAT
+    texto[exactos] = flotantes[exactos].astype(np.int64).astype(str)
+    texto[~exactos] = flotantes[~exactos].map(lambda valor: str(int(valor)))
+    return texto
+
+
+def _por_valores_unicos(serie, funcion):
+    """
+    Aplica una transformación de Serie -> Serie solo a los valores distintos
+
+    En un lote los tipos de documento se repiten casi siempre, y los números
+    a veces (filas duplicadas); factorize agrupa en C y la transformación
+    trabaja sobre los únicos. Los nulos quedan como cadena vacía.
+    """
+    codigos, unicos = pd.factorize(serie.astype(object))
+    transformados = funcion(pd.Series(unicos, dtype=object)).to_numpy(dtype=object)
+    valores = np.append(transformados, "")  # el código -1 (nulo) cae en el último
+    return pd.Series(valores[codigos], index=serie.index, dtype=object)
+
+
+def _normalizar_unicos(numeros):
+    resultado = pd.Series("", index=numeros.index, dtype=object)
+
+    # Valores numéricos (ej. columnas float de .xls o enteros de NDJSON)
+    es_numero = pd.Series(False, index=numeros.index)
+    if pd.api.types.infer_dtype(numeros, skipna=True) != "string":
+        es_numero = numeros.map(
+            lambda v: isinstance(v, numbers.Number) and not isinstance(v, str)
+        ).astype(bool)
+    if es_numero.any():
+        # Los enteros de Python no pasan por float: 10**17 conserva sus dígitos
+        enteros = numeros[es_numero].map(lambda v: isinstance(v, numbers.Integral)).astype(bool)
+        indices_enteros = enteros.index[enteros]
+        resultado[indices_enteros] = numeros[indices_enteros].map(lambda v: str(int(v)))
+
+        reales = numeros[es_numero][~enteros]
+        flotantes = pd.to_numeric(reales, errors="coerce").astype(float)
+        finitos = np.isfinite(flotantes)
+        resultado[flotantes.index[finitos]] = _enteros_como_texto(np.trunc(flotantes[finitos]))
+
+    texto = numeros[~es_numero].astype(str).str.strip()
+    directos = texto.str.isdigit()
+    resultado[texto.index[directos]] = texto[directos]
+
+    compacto = texto[~directos].str.replace(" ", "").str.replace(",", "")
+    compactos = compacto.str.isdigit()
+    resultado[compacto.index[compactos]] = compacto[compactos]
+
+    # "1006881471.0" o "1.006881471E9": enteros escritos como float
+    pendientes = compacto[~compactos & compacto.ne("")]
+    flotantes = pd.to_numeric(pendientes, errors="coerce").astype(float)
+    enteros = np.isfinite(flotantes) & (flotantes.fillna(0) % 1 == 0)
+    resultado[flotantes.index[enteros]] = _enteros_como_texto(flotantes[enteros])
+
+    restantes = pendientes.index[~enteros]
+    resultado[restantes] = texto[restantes].str.replace(r"\D", "", regex=True)
+    return resultado
+
+
+def normalizar_numeros(numeros):
+    """
+    Versión vectorizada de normalizar_numero_documento sobre una Serie
+
+    Aplica las mismas reglas que la versión escalar con operaciones de
+    cadena de pandas: números -> entero, texto solo dígitos, sin espacios ni
+    comas, notación decimal/científica entera y, por último, solo dígitos.
+
+    Args:
+        numeros: pd.Series con los valores tal como vienen del archivo
+
+    Returns:
+        pd.Series: Números normalizados (cadena vacía si no hay dígitos)
+    """
+    return _por_valores_unicos(numeros, _normalizar_unicos)
+
+
+def validar_bloque(tipos, numeros):
+    """
+    Normaliza y valida un bloque de filas de una sola vez
+
+    Args:
+        tipos: pd.Series con los tipos de documento sin normalizar
+        numeros: pd.Series con los números sin normalizar (mismo índice)
+
+    Returns:
+        pd.DataFrame: Columnas tipo_doc, numero_doc, numero_original y
+            motivo (None si la fila es válida), con el índice de entrada
+    """
+    tipo_doc = _por_valores_unicos(tipos, lambda unicos: unicos.astype(str).str.strip().str.upper())
+    numero_doc = normalizar_numeros(numeros)
+
+    motivo = pd.Series(None, index=tipos.index, dtype=object)
+    motivo[numero_doc.eq("")] = MOTIVO_NUMERO_INVALIDO
+    motivo[~tipo_doc.isin(TIPOS_DOCUMENTO_VALIDOS)] = MOTIVO_TIPO_INVALIDO
+
+    # El valor original solo se reporta en las filas rechazadas
+    rechazadas = motivo.notna()
+    numero_original = pd.Series("", index=tipos.index, dtype=object)
+    numero_original[rechazadas] = numeros[rechazadas].astype(object).fillna("").astype(str).str.strip()
+
+    return pd.DataFrame({
+        "tipo_doc": tipo_doc,
+        "numero_doc": numero_doc,
+        "numero_original": numero_original,
+        "motivo": motivo,
+    })
+
+
+class FilasAceptadas:
+    """
+    Filas válidas de un lote guardadas en forma compacta
+
+    En lugar de una tupla de objetos Python por fila se guardan arreglos
+    planos: el número de fila, el código del tipo de documento y los números
+    normalizados (UTF-8) concatenados en un solo buffer con sus offsets.
+    Así un lote de millones de filas ocupa unas decenas de bytes por fila
+    mientras se valida, y las tuplas se crean al despacharlas.
+    """
+
+    def __init__(self):
+        self._filas = array("q")
+        self._tipos = array("B")
+        self._fines = array("Q")
+        self._numeros = bytearray()
+
+    def agregar_bloque(self, filas, tipos, numeros):
+        """
+        Args:
+            filas: Lista de números de fila
+            tipos: Lista de tipos de documento (de TIPOS_DOCUMENTO_VALIDOS)
+            numeros: Lista de números normalizados (solo dígitos)
+        """
+        if not filas:
+            return
+        codificados = [numero.encode("utf-8") for numero in numeros]
+        fin = self._fines[-1] if self._fines else 0
+        self._filas.extend(filas)
+        self._tipos.extend(_CODIGOS_TIPO[tipo] for tipo in tipos)
+        self._fines.extend((fin + np.cumsum([len(numero) for numero in codificados])).tolist())
+        self._numeros += b"".join(codificados)
+
+    def __len__(self):
+        return len(self._filas)
+
+    def __iter__(self):
+        """Genera (fila, tipo_doc, numero_doc) en el orden del archivo"""
+        inicio = 0
+        for fila, codigo, fin in zip(self._filas, self._tipos, self._fines):
+            yield fila, TIPOS_DOCUMENTO_VALIDOS[codigo], self._numeros[inicio:fin].decode("utf-8")
+            inicio = fin
+
+
+_CODIGOS_TIPO = {tipo: codigo for codigo, tipo in enumerate(TIPOS_DOCUMENTO_VALIDOS)}
+
+
+def validar_documentos(documentos, tamano_bloque=VALIDACION_BLOQUE, al_avanzar=None):
+    """
+    Separa las filas de un lote en aceptadas y rechazadas antes de consultarlas
+
+    El iterable se consume en bloques de tamano_bloque filas; cada bloque se
+    valida con operaciones vectorizadas de pandas. Las aceptadas quedan en un
+    FilasAceptadas compacto y se recorren de forma perezosa al despacharlas.
+
+    Args:
+        documentos: Iterable de (tipo_identificacion, numero_identificacion)
+        tamano_bloque: Filas por bloque
+        al_avanzar: Callable(filas_leidas) opcional, llamado tras cada bloque
+
+    Returns:
+        tuple: (aceptadas, rechazadas): FilasAceptadas que genera tuplas
+            (fila, tipo_doc, numero_doc) y lista de tuplas
+            (fila, tipo_doc, numero_original, motivo)
+    """
+    documentos = iter(documentos)
+    tamano_bloque = max(1, tamano_bloque)
+    aceptadas = FilasAceptadas()
+    rechazadas = []
+    leidas = 0
+
+    while True:
+        bloque = list(islice(documentos, tamano_bloque))
+        if not bloque:
+            break
+
+        tipos, numeros = zip(*bloque)
+        indice = pd.RangeIndex(leidas, leidas + len(bloque))
+        validado = validar_bloque(
+            pd.Series(tipos, index=indice, dtype=object),
+            pd.Series(numeros, index=indice, dtype=object),
+        )
+        leidas += len(bloque)
+
+        validas = validado["motivo"].isna()
+        aceptadas.agregar_bloque(
+            validado.index[validas].tolist(),
+            validado["tipo_doc"][validas].tolist(),
+            validado["numero_doc"][validas].tolist(),
+        )
+        invalidas = validado[~validas]
+        rechazadas.extend(zip(
+            invalidas.index.tolist(),
+            invalidas["tipo_doc"].tolist(),
+            invalidas["numero_original"].tolist(),
+            invalidas["motivo"].tolist(),
+        ))
+
+        if al_avanzar:
+            al_avanzar(leidas)
+
+    return aceptadas, rechazadas
+
+
+def resumen_rechazos(rechazadas):
+    """Cuenta las filas rechazadas por motivo"""
+    motivos = {}
+    for _, _, _, motivo in rechazadas:
+        motivos[motivo] = motivos.get(motivo, 0) + 1
+    return motivos
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# vuelo_api.py
+"""Coalescencia de consultas idénticas concurrentes (single-flight)"""
+
+import threading
+from concurrent.futures import Future
+
+
+class _Llamada:
+    """Consulta en vuelo: el líder publica en el futuro y los seguidores lo esperan"""
+
+    def __init__(self, etiqueta):
+        self.etiqueta = etiqueta
+        self.futuro = Future()
+        self.seguidores = 0
+
+
+class VueloUnico:
+    """
+    Garantiza una sola ejecución en curso por clave
+
+    Si llega una segunda llamada con la misma clave mientras la primera sigue
+    en curso, no se ejecuta de nuevo: espera y recibe el mismo resultado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self._stats = {"lideres": 0, "compartidas": 0}
+
+    def unirse(self, clave, etiqueta=None):
+        """
+        Registra una llamada para la clave sin ejecutar nada
+
+        El primero en llegar queda como líder y se compromete a publicar el
+        resultado con terminar(); los demás reciben el futuro del líder y
+        pueden esperarlo donde no ocupen recursos (ej. fuera del planificador).
+
+        Args:
+            clave: Clave de coalescencia (ej. ("CC", "1006881471"))
+            etiqueta: Dato del líder visible para otros (ej. su consulta_id)
+
+        Returns:
+            tuple: (Future con el resultado, lider, etiqueta del líder) donde
+                lider indica si quien llama debe ejecutar y llamar terminar()
+        """
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            if llamada is not None:
+                llamada.seguidores += 1
+                self._stats["compartidas"] += 1
+                return llamada.futuro, False, llamada.etiqueta
+            llamada = _Llamada(etiqueta)
+            self._en_vuelo[clave] = llamada
+            self._stats["lideres"] += 1
+            return llamada.futuro, True, etiqueta
+
+    def terminar(self, clave, resultado=None, error=None):
+        """Publica el resultado (o el error) del líder y libera la clave"""
+        with self._lock:
+            llamada = self._en_vuelo.pop(clave, None)
+        if llamada is None:
+            return
+        if error is not None:
+            llamada.futuro.set_exception(error)
+        else:
+            llamada.futuro.set_result(resultado)
+
+    def hacer(self, clave, funcion, etiqueta=None):
+        """
+        Ejecuta funcion() una sola vez por clave concurrente
+
+        Args:
+            clave: Clave de coalescencia (ej. ("CC", "1006881471"))
+            funcion: Callable sin argumentos que produce el resultado
+            etiqueta: Dato del líder visible para otros (ej. su consulta_id)
+
+        Returns:
+            tuple: (resultado, compartido) donde compartido indica si el
+                resultado vino de otra llamada en curso
+        """
+        futuro, lider, _ = self.unirse(clave, etiqueta)
+        if not lider:
+            return futuro.result(), True
+
+        try:
+            resultado = funcion()
+        except Exception as e:
+            self.terminar(clave, error=e)
+            raise
+        self.terminar(clave, resultado)
+        return resultado, False
+
+    def etiqueta(self, clave):
+        """Etiqueta del líder en curso para la clave, o None si no hay ninguno"""
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            return llamada.etiqueta if llamada else None
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["en_vuelo"] = len(self._en_vuelo)
+        return stats
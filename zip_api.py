@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# zip_api.py
+"""ZIP determinista generado al vuelo (sin compresión, ZIP64) con soporte de rangos"""
+
+import zlib
+import bisect
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# Fecha DOS fija (1980-01-01 00:00): el mismo contenido da el mismo archivo
+_FECHA_DOS = (0 << 9) | (1 << 5) | 1
+_HORA_DOS = 0
+# Bit 3: CRC y tamaños en el descriptor posterior; bit 11: nombres UTF-8
+_FLAGS = 0x0808
+_LIMITE_32 = 0xFFFFFFFF
+_LIMITE_16 = 0xFFFF
+_BLOQUE_LECTURA = 256 * 1024
+
+# CRC32 de contenidos inmutables (objetos por hash) para no releerlos
+_CAPACIDAD_CRCS = 200000
+_crcs = OrderedDict()
+_crcs_lock = threading.Lock()
+
+
+def _crc_guardado(clave):
+    with _crcs_lock:
+        crc = _crcs.get(clave)
+        if crc is not None:
+            _crcs.move_to_end(clave)
+        return crc
+
+
+def _guardar_crc(clave, crc):
+    with _crcs_lock:
+        _crcs[clave] = crc
+        _crcs.move_to_end(clave)
+        while len(_crcs) > _CAPACIDAD_CRCS:
+            _crcs.popitem(last=False)
+
+
+class EntradaZip:
+    """
+    Archivo dentro del ZIP
+
+    Args:
+        nombre: Ruta dentro del ZIP
+        tamano: Tamaño exacto del contenido en bytes
+        abrir: Callable sin argumentos que devuelve un objeto con read(n)
+            (y opcionalmente seek) posicionado al inicio del contenido
+        clave_crc: Clave estable del contenido (ej. su hash) para reutilizar
+            el CRC32 ya calculado; None si el contenido puede cambiar
+        crc: CRC32 si ya se conoce
+    """
+
+    def __init__(self, nombre, tamano, abrir, clave_crc=None, crc=None):
+        self.nombre = nombre
+        self.nombre_bytes = nombre.encode("utf-8")
+        self.tamano = tamano
+        self.abrir = abrir
+        self.clave_crc = clave_crc
+        self.crc = crc
+
+
+class ZipDeterminista:
+    """
+    ZIP "stored" cuyo tamaño y offsets se conocen antes de leer los datos
+
+    Las entradas no se comprimen, así cada byte del archivo tiene una
+    posición fija: se puede generar cualquier rango (descargas reanudables)
+    leyendo solo los archivos que caen en él, con memoria constante. El CRC
+    va en el descriptor que sigue a cada entrada y se calcula mientras se
+    transmite su contenido (o leyéndolo aparte si el rango no lo incluye).
+    Se usan extensiones ZIP64 solo cuando los tamaños u offsets lo piden.
+    """
+
+    def __init__(self, entradas, zip64=None):
+        """
+        Args:
+            entradas: Lista de EntradaZip en el orden del archivo
+            zip64: True para forzar ZIP64 en todas las entradas, None = automático
+        """
+        self.entradas = list(entradas)
+        self._forzar_zip64 = bool(zip64)
+
+        # Inicio de cada entrada (cabecera local) y del directorio central
+        self._inicios = []
+        self._zip64 = []
+        posicion = 0
+        for entrada in self.entradas:
+            usa_zip64 = self._forzar_zip64 or entrada.tamano >= _LIMITE_32
+            self._inicios.append(posicion)
+            self._zip64.append(usa_zip64)
+            posicion += self._largo_local(entrada, usa_zip64) + entrada.tamano
+            posicion += 24 if usa_zip64 else 16
+        self._inicio_central = posicion
+
+        self._inicios_central = []
+        for indice, entrada in enumerate(self.entradas):
+            self._inicios_central.append(posicion)
+            posicion += 46 + len(entrada.nombre_bytes) + len(self._extra_central(indice))
+        self._fin_central = posicion
+
+        self._cierre_zip64 = (
+            self._forzar_zip64
+            or len(self.entradas) >= _LIMITE_16
+            or self._inicio_central >= _LIMITE_32
+            or self._fin_central - self._inicio_central >= _LIMITE_32
+        )
+        self.tamano = self._fin_central + (56 + 20 if self._cierre_zip64 else 0) + 22
+
+    # ------------------------------------------------------------------
+    # Estructuras
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _largo_local(entrada, usa_zip64):
+        return 30 + len(entrada.nombre_bytes) + (20 if usa_zip64 else 0)
+
+    def _cabecera_local(self, indice):
+        entrada = self.entradas[indice]
+        if self._zip64[indice]:
+            # Tamaños en 0 aquí y reales en el descriptor (de 8 bytes)
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            version, tamano = 45, _LIMITE_32
+        else:
+            extra, version, tamano = b"", 20, 0
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, version, _FLAGS, 0, _HORA_DOS, _FECHA_DOS,
+            0, tamano, tamano, len(entrada.nombre_bytes), len(extra),
+        ) + entrada.nombre_bytes + extra
+
+    def _descriptor(self, indice):
+        entrada = self.entradas[indice]
+        crc = self._crc(indice)
+        if self._zip64[indice]:
+            return struct.pack("<IIQQ", 0x08074B50, crc, entrada.tamano, entrada.tamano)
+        return struct.pack("<IIII", 0x08074B50, crc, entrada.tamano, entrada.tamano)
+
+    def _extra_central(self, indice):
+        entrada = self.entradas[indice]
+        campos = b""
+        if self._zip64[indice]:
+            campos += struct.pack("<QQ", entrada.tamano, entrada.tamano)
+        if self._forzar_zip64 or self._inicios[indice] >= _LIMITE_32:
+            campos += struct.pack("<Q", self._inicios[indice])
+        return struct.pack("<HH", 0x0001, len(campos)) + campos if campos else b""
+
+    def _registro_central(self, indice):
+        entrada = self.entradas[indice]
+        extra = self._extra_central(indice)
+        tamano = _LIMITE_32 if self._zip64[indice] else entrada.tamano
+        offset = _LIMITE_32 if (self._forzar_zip64 or self._inicios[indice] >= _LIMITE_32) else self._inicios[indice]
+        version = 45 if extra else 20
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, _FLAGS, 0, _HORA_DOS, _FECHA_DOS,
+            self._crc(indice), tamano, tamano, len(entrada.nombre_bytes), len(extra), 0, 0, 0, 0, offset,
+        ) + entrada.nombre_bytes + extra
+
+    def _cierre(self):
+        total = len(self.entradas)
+        largo_central = self._fin_central - self._inicio_central
+        bloques = b""
+        if self._cierre_zip64:
+            bloques += struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, total, total, largo_central, self._inicio_central,
+            )
+            bloques += struct.pack("<IIQI", 0x07064B50, 0, self._fin_central, 1)
+        bloques += struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, min(total, _LIMITE_16), min(total, _LIMITE_16),
+            min(largo_central, _LIMITE_32), min(self._inicio_central, _LIMITE_32), 0,
+        )
+        return bloques
+
+    # ------------------------------------------------------------------
+    # Contenido y CRC
+    # ------------------------------------------------------------------
+    def _leer(self, entrada, desde, hasta):
+        """Genera los bytes [desde, hasta) del contenido de una entrada"""
+        archivo = entrada.abrir()
+        try:
+            if desde:
+                if hasattr(archivo, "seek"):
+                    archivo.seek(desde)
+                else:
+                    saltar = desde
+                    while saltar:
+                        saltados = len(archivo.read(min(saltar, _BLOQUE_LECTURA)))
+                        if not saltados:
+                            break
+                        saltar -= saltados
+            restante = hasta - desde
+            while restante > 0:
+                bloque = archivo.read(min(restante, _BLOQUE_LECTURA))
+                if not bloque:
+                    raise IOError(f"{entrada.nombre}: el contenido es más corto de lo esperado")
+                restante -= len(bloque)
+                yield bloque
+        finally:
+            if hasattr(archivo, "close"):
+                archivo.close()
+
+    def _crc(self, indice):
+        entrada = self.entradas[indice]
+        if entrada.crc is None and entrada.clave_crc is not None:
+            entrada.crc = _crc_guardado(entrada.clave_crc)
+        if entrada.crc is None:
+            crc = 0
+            for bloque in self._leer(entrada, 0, entrada.tamano):
+                crc = zlib.crc32(bloque, crc)
+            self._recordar_crc(entrada, crc)
+        return entrada.crc
+
+    @staticmethod
+    def _recordar_crc(entrada, crc):
+        entrada.crc = crc
+        if entrada.clave_crc is not None:
+            _guardar_crc(entrada.clave_crc, crc)
+
+    # ------------------------------------------------------------------
+    # Generación por rangos
+    # ------------------------------------------------------------------
+    def etag(self):
+        """Identificador del archivo: cambia si cambia cualquier entrada"""
+        resumen = hashlib.sha1()
+        for entrada in self.entradas:
+            resumen.update(entrada.nombre_bytes + b"\0")
+            resumen.update(str(entrada.tamano).encode() + b"\0")
+            resumen.update(str(entrada.clave_crc if entrada.clave_crc is not None else entrada.crc).encode())
+            resumen.update(b"\n")
+        return resumen.hexdigest()
+
+    @staticmethod
+    def _recortar(datos, inicio_bloque, desde, hasta):
+        """Parte de un bloque en memoria que cae en [desde, hasta)"""
+        return datos[max(desde - inicio_bloque, 0):max(hasta - inicio_bloque, 0)]
+
+    def generar(self, desde=0, hasta=None):
+        """
+        Genera los bytes [desde, hasta) del ZIP
+
+        Args:
+            desde: Primer byte (incluido)
+            hasta: Último byte (excluido); None = hasta el final
+        """
+        hasta = self.tamano if hasta is None else min(hasta, self.tamano)
+        if desde >= hasta:
+            return
+
+        # Entradas: cabecera local, contenido, descriptor
+        primera = max(bisect.bisect_right(self._inicios, desde) - 1, 0)
+        for indice in range(primera, len(self.entradas)):
+            inicio = self._inicios[indice]
+            if inicio >= hasta:
+                return
+            entrada = self.entradas[indice]
+
+            cabecera = self._cabecera_local(indice)
+            parte = self._recortar(cabecera, inicio, desde, hasta)
+            if parte:
+                yield parte
+
+            inicio_datos = inicio + len(cabecera)
+            fin_datos = inicio_datos + entrada.tamano
+            a, b = max(desde, inicio_datos), min(hasta, fin_datos)
+            if a < b:
+                completo = a == inicio_datos and b == fin_datos and entrada.crc is None
+                crc = 0
+                for bloque in self._leer(entrada, a - inicio_datos, b - inicio_datos):
+                    if completo:
+                        crc = zlib.crc32(bloque, crc)
+                    yield bloque
+                if completo:
+                    self._recordar_crc(entrada, crc)
+
+            if fin_datos < hasta:
+                parte = self._recortar(self._descriptor(indice), fin_datos, desde, hasta)
+                if parte:
+                    yield parte
+
+        # Directorio central y cierre
+        if hasta <= self._inicio_central:
+            return
+        primera = max(bisect.bisect_right(self._inicios_central, desde) - 1, 0)
+        for indice in range(primera, len(self.entradas)):
+            inicio = self._inicios_central[indice]
+            if inicio >= hasta:
+                return
+            parte = self._recortar(self._registro_central(indice), inicio, desde, hasta)
+            if parte:
+                yield parte
+
+        parte = self._recortar(self._cierre(), self._fin_central, desde, hasta)
+        if parte:
+            yield parte